@@ -0,0 +1,260 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+import pandas as pd
+from apps.common.tracing import TRACE_LOG, aggregate_spans, span, trace
+
+# Headless batch runs of the keyword and topic pipelines, sharing the caches of the web app:
+#
+#   python -m apps.cli keywords "corpus/**/*.pdf" --keywords-file keywords.txt --output-dir results/keywords
+#   python -m apps.cli topics "responses/*.csv" --nr-topics 20 --output-dir results/topics
+#
+# Every completed stage leaves a marker in <output-dir>/.stages; running the same command again after an
+# interruption resumes after the last completed stage
+
+STAGE_DIR = ".stages"
+KEYWORD_LANGUAGES = ("English", "French", "Spanish", "Italian", "Portuguese", "Chinese", "Arabic")
+
+# Function to print a timestamped progress message
+def log(message):
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", file=sys.stderr, flush=True)
+
+# Function to build a progress callback(done, total) that logs at most every few seconds
+def progress_logger(label, every_seconds=30):
+    last = [0.0]
+    def report(done, total):
+        if done == total or time.monotonic() - last[0] >= every_seconds:
+            last[0] = time.monotonic()
+            log(f"{label} {done:,}/{total:,}")
+    return report
+
+# Function to fingerprint the inputs and parameters of a stage
+def fingerprint(*parts):
+    return hashlib.md5(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+# Markers of the stages completed in an output directory, each holding the fingerprint of the inputs and
+# parameters it ran with; a stage is only skipped when its fingerprint matches
+class StageMarkers:
+    def __init__(self, output_dir):
+        self.directory = os.path.join(output_dir, STAGE_DIR)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, stage):
+        return os.path.join(self.directory, f"{stage}.json")
+
+    # Function to get the marker of a completed stage, or None when it has to run (again)
+    def get(self, stage, stage_fingerprint):
+        try:
+            with open(self.path(stage), "r", encoding="utf-8") as marker_file:
+                marker = json.load(marker_file)
+        except (OSError, ValueError):
+            return None
+        return marker if marker.get("fingerprint") == stage_fingerprint else None
+
+    # Function to record a completed stage with details needed to resume after it
+    def mark(self, stage, stage_fingerprint, **details):
+        temp_path = f"{self.path(stage)}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as marker_file:
+            json.dump(dict(details, fingerprint=stage_fingerprint, finished=time.time()), marker_file)
+        os.replace(temp_path, self.path(stage))
+
+# Function to expand input globs into a sorted list of files, keeping the given extensions
+def expand_inputs(patterns, extensions):
+    paths = {path for pattern in patterns for path in glob.glob(pattern, recursive=True)}
+    paths = sorted(path for path in paths if os.path.isfile(path) and path.lower().endswith(extensions))
+    if not paths:
+        raise SystemExit(f"No {'/'.join(extensions)} files match {' '.join(patterns)}")
+    return paths
+
+# Function to read keywords or regular expressions from files, one per line
+def read_keyword_files(paths):
+    keywords = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as keyword_file:
+            keywords.extend(line.strip() for line in keyword_file if line.strip())
+    return keywords
+
+# Function to run the keyword pipeline: extraction and cleaning (served from the text cache), keyword
+# counting or n-gram discovery, then the tables and 4K word clouds written as files
+def run_keywords(args):
+    from apps.keywords.keyword_pipeline import file_content_key, iter_output_artifacts, load_cleaned_documents, run_keyword_analysis
+    from apps.keywords.text_cache import get_text_cache
+    from apps.keywords.zip_export import csv_payload, write_artifact_files
+
+    files = expand_inputs(args.inputs, (".pdf", ".csv"))
+    keywords = read_keyword_files(args.keywords_file) if args.keywords_file else None
+    markers = StageMarkers(args.output_dir)
+    run_fingerprint = fingerprint([(path, file_content_key(path)) for path in files], args.language, keywords,
+                                  None if keywords else args.top_n, args.colormap)
+    results_path = os.path.join(args.output_dir, "analysis_results.csv")
+
+    if markers.get("outputs", run_fingerprint):
+        log(f"Outputs for these inputs are already complete in {args.output_dir}.")
+        return
+
+    # Stage 1: analysis table
+    if markers.get("analysis", run_fingerprint) and os.path.exists(results_path):
+        result_df = pd.read_csv(results_path, dtype={"Features": str}, keep_default_na=False)
+        wordcloud_dir = os.path.join(args.output_dir, "wordclouds")
+        skip_entries = {f"wordclouds/{name}" for name in os.listdir(wordcloud_dir) if name.endswith(".png")} \
+            if os.path.isdir(wordcloud_dir) else set()
+        log(f"Resuming after the analysis stage; {len(skip_entries)} word clouds already written.")
+    else:
+        log(f"Extracting and cleaning {len(files)} files...")
+        with get_text_cache().pinned() as pins:
+            text_data = load_cleaned_documents(files, args.language, pins, on_error=log, max_workers=args.workers)
+            log("Counting keywords..." if keywords else f"Discovering the top {args.top_n} n-grams...")
+            result_df = run_keyword_analysis(text_data, args.language, keywords=keywords, top_n=args.top_n)
+        write_artifact_files([("analysis_results.csv", csv_payload(result_df))], args.output_dir)
+        markers.mark("analysis", run_fingerprint, files=len(files), features=len(result_df))
+        # Word clouds left by an earlier run with other inputs would be taken as finished on resume
+        wordcloud_dir = os.path.join(args.output_dir, "wordclouds")
+        for name in os.listdir(wordcloud_dir) if os.path.isdir(wordcloud_dir) else []:
+            if name.endswith("_wordcloud.png"):
+                os.remove(os.path.join(wordcloud_dir, name))
+        skip_entries = set()
+
+    # Stage 2: per-document tables and word clouds; finished word clouds are not rendered again
+    log("Writing tables and word clouds...")
+    with span("rendering", documents=len(result_df.columns) - 1):
+        written = write_artifact_files(iter_output_artifacts(result_df, args.colormap, skip_entries, args.workers), args.output_dir)
+    markers.mark("outputs", run_fingerprint, entries=len(written) + len(skip_entries))
+    log(f"Wrote {len(written)} files to {args.output_dir}.")
+
+# Function to read the 'text' column of CSV files, with a doc_id per text
+def read_topic_documents(files):
+    from apps.common.csv_reader import read_csv_columns, read_texts_with_ids
+    frames = []
+    for path in files:
+        if 'text' not in read_csv_columns(path):
+            log(f"Skipping {path}: the CSV file must contain a 'text' column.")
+            continue
+        frames.append(read_texts_with_ids(path))
+    if not frames:
+        raise SystemExit("No CSV file with a 'text' column to model.")
+    return pd.concat(frames, ignore_index=True)[['doc_id', 'text']]
+
+# Function to run the topic pipeline: embeddings (kept in the shared embedding store as they are
+# computed), the staged fit (saved by model ID and reloaded when it exists), labels and output tables
+def run_topics(args):
+    from apps.topic_modelling.embedding_backends import backend_options, register_embedding_backend
+    from apps.topic_modelling.embedding_pipeline import configure_cpu_threads
+    from apps.topic_modelling.model_registry import get_model_registry
+    from apps.topic_modelling.topic_pipeline import EXACT_PROBABILITY_MAX_DOCS, load_topic_model
+    from apps.topic_modelling.topic_runner import (embed_documents, fit_topic_model, label_topics, topic_model_settings,
+                                                   write_topic_outputs)
+
+    files = expand_inputs(args.inputs, (".csv",))
+    markers = StageMarkers(args.output_dir)
+    documents_df = read_topic_documents(files)
+    log(f"Read {len(documents_df):,} documents from {len(files)} files.")
+
+    embedding_backend_id = args.embedding_backend or backend_options(args.language)[0]
+    probability_mode = args.probabilities or ("approximate" if len(documents_df) > EXACT_PROBABILITY_MAX_DOCS else "exact")
+    api_key = os.environ.get("OPENAI_API_KEY") if args.labels == "openai" else None
+    if args.labels == "openai" and not api_key:
+        raise SystemExit("Set OPENAI_API_KEY to label topics with OpenAI.")
+    settings = topic_model_settings(
+        embedding_backend_id, args.seed,
+        probability_mode=probability_mode,
+        nr_topics=args.nr_topics,
+        language="english" if args.language == "English" else "multilingual",
+        outlier_threshold=None if args.no_outlier_reduction else args.outlier_threshold,
+        topic_labels={"openai": "openai", "local": "flan-t5-base", "none": None}[args.labels]
+    )
+    run_fingerprint = fingerprint(hashlib.md5("\n".join(documents_df['doc_id']).encode()).hexdigest(), settings)
+
+    if markers.get("outputs", run_fingerprint):
+        log(f"Outputs for these inputs are already complete in {args.output_dir}.")
+        return
+
+    # Stage 1: the fitted model, saved under its ID
+    fitted = markers.get("model", run_fingerprint)
+    if fitted:
+        topic_model, documents_df, _ = load_topic_model(fitted["model_id"])
+        model_id = fitted["model_id"]
+        log(f"Resuming with saved model `{model_id}`.")
+    else:
+        if args.workers:
+            configure_cpu_threads(args.workers)
+        registry = get_model_registry()
+        with registry.use(register_embedding_backend(embedding_backend_id)) as model:
+            log(f"Embedding documents with {embedding_backend_id}...")
+            embeddings = embed_documents(embedding_backend_id, model, documents_df['doc_id'].tolist(), documents_df['text'].tolist(),
+                                         progress_logger("Embedded new documents:"))
+
+            def labeler(topic_model):
+                if args.labels == "none":
+                    return
+                log("Generating topic labels...")
+                errors = label_topics(topic_model, api_key=api_key, base_url=args.openai_base_url)
+                if errors:
+                    log(f"{len(errors)} topics could not be labeled: {next(iter(errors.values()))}")
+                return errors
+
+            log("Fitting the topic model...")
+            topic_model, model_id = fit_topic_model(settings, documents_df, embeddings, model, labeler=labeler, log=log)
+        markers.mark("model", run_fingerprint, model_id=model_id, documents=len(documents_df))
+
+    # Stage 2: output tables
+    write_topic_outputs(topic_model, documents_df, args.output_dir)
+    markers.mark("outputs", run_fingerprint, model_id=model_id)
+    log(f"Wrote topic_info.csv and document_topics.csv for model `{model_id}` to {args.output_dir}.")
+
+# Function to build the command-line parser
+def build_parser():
+    from apps.topic_modelling.embedding_backends import EMBEDDING_BACKENDS
+    from apps.topic_modelling.topic_pipeline import PROBABILITY_MODES
+
+    parser = argparse.ArgumentParser(prog="python -m apps.cli", description="Run the TextViz Studio pipelines without the web app.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    keywords_parser = subparsers.add_parser("keywords", help="Keyword counts or n-gram discovery over PDF and CSV files")
+    keywords_parser.add_argument("inputs", nargs="+", help="Input files or glob patterns (PDF, or CSV with a 'text' column)")
+    keywords_parser.add_argument("--keywords-file", action="append", help="File with one keyword or regular expression per line; "
+                                                                          "without one, the top n-grams are discovered")
+    keywords_parser.add_argument("--top-n", type=int, default=10, help="Top terms to discover for each n-gram type")
+    keywords_parser.add_argument("--language", choices=KEYWORD_LANGUAGES, default="English")
+    keywords_parser.add_argument("--colormap", default=None, help="Matplotlib colormap of the word clouds")
+    keywords_parser.set_defaults(run=run_keywords)
+
+    topics_parser = subparsers.add_parser("topics", help="BERTopic topic model over CSV files")
+    topics_parser.add_argument("inputs", nargs="+", help="Input CSV files or glob patterns, with a 'text' column")
+    topics_parser.add_argument("--language", choices=("English", "Multilanguage"), default="English")
+    topics_parser.add_argument("--embedding-backend", choices=list(EMBEDDING_BACKENDS), help="Defaults to the fastest backend for the language")
+    topics_parser.add_argument("--seed", type=int, default=0, help="Seed of the UMAP reduction")
+    topics_parser.add_argument("--nr-topics", type=int, default=None, help="Number of topics; automatic when omitted")
+    topics_parser.add_argument("--outlier-threshold", type=float, default=0.1, help="c-TF-IDF threshold for outlier reduction")
+    topics_parser.add_argument("--no-outlier-reduction", action="store_true")
+    topics_parser.add_argument("--probabilities", choices=list(PROBABILITY_MODES),
+                               help="Defaults to exact, or approximate on large corpora")
+    topics_parser.add_argument("--labels", choices=("local", "openai", "none"), default="local",
+                               help="Topic labels from the local text2text model or OpenAI (reads OPENAI_API_KEY)")
+    topics_parser.add_argument("--openai-base-url", default=None, help="OpenAI-compatible API base URL")
+    topics_parser.set_defaults(run=run_topics)
+
+    for subparser in (keywords_parser, topics_parser):
+        subparser.add_argument("--output-dir", required=True, help="Directory for the results and the stage markers")
+        subparser.add_argument("--workers", type=int, default=None, help="Worker processes (threads for embeddings); all cores by default")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+    with trace(f"cli {args.command}") as run_trace:
+        args.run(args)
+    # Time and memory of each stage, also appended to the trace log
+    for row in aggregate_spans(run_trace.records())[1:]:
+        workers = f", {row['children_cpu_s']:.2f}s worker CPU" if row['children_cpu_s'] else ""
+        memory = f", peak memory +{row['peak_rss_delta_mb']:.0f} MB" if row['peak_rss_delta_mb'] is not None else ""
+        log(f"{'  ' * (row['depth'] - 1)}{row['stage']}: {row['wall_s']:.2f}s wall, {row['cpu_s']:.2f}s CPU{workers}{memory}"
+            + (f" ({row['count']} calls)" if row['count'] > 1 else ""))
+    if TRACE_LOG:
+        log(f"Stage timings appended to {TRACE_LOG}.")
+
+if __name__ == "__main__":
+    main()
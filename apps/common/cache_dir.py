@@ -0,0 +1,10 @@
+import os
+
+# Root directory of every on-disk cache (override with the TEXTVIZ_CACHE_DIR environment variable)
+CACHE_DIR = os.environ.get("TEXTVIZ_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "textviz_studio"))
+
+# Function to get (creating it if needed) a directory inside the cache root
+def cache_path(*parts):
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
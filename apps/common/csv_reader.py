@@ -0,0 +1,83 @@
+import hashlib
+import pandas as pd
+
+# Use pyarrow's multithreaded streaming CSV reader when it is installed
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+    pa_csv = None
+
+# Rows per chunk for the pandas reader, bytes per block for the pyarrow reader
+CHUNK_ROWS = 50_000
+BLOCK_BYTES = 16 * 1024 * 1024
+
+# Cells read as missing: pandas' default na_values, given to both readers so the documents kept (and so
+# their doc_ids) do not depend on whether pyarrow is installed
+NULL_VALUES = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+               "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+
+# Function to create unique identifiers for each document
+def create_unique_id(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+# Function to rewind an uploaded file or file object before reading it again
+def rewind(file):
+    if hasattr(file, "seek"):
+        file.seek(0)
+
+# Function to read only the header row of a CSV file
+def read_csv_columns(file):
+    rewind(file)
+    columns = list(pd.read_csv(file, nrows=0).columns)
+    rewind(file)
+    return columns
+
+# Function to read a CSV file in chunks, keeping only the requested columns (all when None);
+# the requested columns, or 'text' when reading everything, are always read as strings
+def iter_csv_chunks(file, columns=None, chunk_rows=CHUNK_ROWS):
+    rewind(file)
+    string_columns = list(columns) if columns else ["text"]
+    if pa_csv is not None:
+        convert_options = pa_csv.ConvertOptions(include_columns=list(columns) if columns else None,
+                                                column_types={column: pa.string() for column in string_columns},
+                                                null_values=NULL_VALUES, strings_can_be_null=True)
+        reader = pa_csv.open_csv(file, read_options=pa_csv.ReadOptions(block_size=BLOCK_BYTES), convert_options=convert_options)
+        for batch in reader:
+            yield batch.to_pandas()
+    else:
+        dtype = {column: str for column in string_columns}
+        for chunk in pd.read_csv(file, usecols=list(columns) if columns else None, dtype=dtype, chunksize=chunk_rows,
+                                 keep_default_na=False, na_values=NULL_VALUES):
+            yield chunk
+
+# Function to stream the 'text' column of a CSV file as one joined string per chunk
+def iter_csv_text_chunks(file, chunk_rows=CHUNK_ROWS):
+    for chunk in iter_csv_chunks(file, ["text"], chunk_rows):
+        texts = chunk['text'].dropna().tolist()
+        if texts:
+            yield " ".join(texts)
+
+# Function to read the 'text' column (plus an optional ID column) chunk by chunk and add a doc_id per text
+def read_texts_with_ids(file, id_column=None, chunk_rows=CHUNK_ROWS):
+    columns = ["text"] + ([id_column] if id_column else [])
+    frames = []
+    for chunk in iter_csv_chunks(file, columns, chunk_rows):
+        chunk = chunk.dropna(subset=['text'])
+        chunk.insert(0, 'doc_id', [create_unique_id(text) for text in chunk['text']])  # Create unique doc_id for each text
+        frames.append(chunk)
+    if not frames:
+        return pd.DataFrame(columns=['doc_id'] + columns)
+    return pd.concat(frames, ignore_index=True)
+
+# Function to write the original CSV with a doc_id column added, one chunk at a time
+def write_csv_with_ids(file, path, chunk_rows=CHUNK_ROWS):
+    with open(path, "w", encoding="utf-8", newline="") as output:
+        header = True
+        for chunk in iter_csv_chunks(file, None, chunk_rows):
+            chunk = chunk.dropna(subset=['text'])
+            chunk = chunk.assign(doc_id=[create_unique_id(text) for text in chunk['text']])
+            chunk.to_csv(output, index=False, header=header)
+            header = False
+    return path
@@ -0,0 +1,64 @@
+import os
+import re
+import time
+import uuid
+import streamlit as st
+from apps.common.jobs import FINISHED_STATES, job_artifacts, job_directory
+
+POLL_SECONDS = 2.0
+
+# Function to get the token identifying the jobs of this user. It is kept in the page URL (?owner=...),
+# so a reload or bookmark of the page keeps the jobs, while other sessions of the server never see them
+def job_owner_token():
+    if "job_owner" not in st.session_state:
+        token = st.experimental_get_query_params().get("owner", [""])[0]
+        st.session_state.job_owner = token if re.fullmatch(r"[0-9a-f]{32}", token) else uuid.uuid4().hex
+    query_params = st.experimental_get_query_params()
+    if query_params.get("owner", [""])[0] != st.session_state.job_owner:
+        st.experimental_set_query_params(**dict(query_params, owner=st.session_state.job_owner))  # Lost when switching pages
+    return st.session_state.job_owner
+
+# Function to show the status of a background job, once per run of the page; returns the job at whatever
+# status it has (or None for an unknown ID, or a job of another user). While it is unfinished, the page
+# calls rerun_while_running last, so everything else on it is rendered and usable between the polls
+def follow_job(runner, job_id):
+    job = runner.get(job_id, requester=job_owner_token())
+    if job is None:
+        st.error(f"No job with ID `{job_id}`.")
+        return None
+    if job["status"] in FINISHED_STATES:
+        return job
+    if job["status"] == "queued":
+        st.info(f"Job `{job_id}` is waiting for a free worker.")
+    else:
+        st.info(f"Job `{job_id}` is running. You can keep using the page, or come back later with the job ID.")
+    st.progress(job["progress"], text=job["message"] or "Starting...")
+    return job
+
+# Function to rerun the page after poll_seconds to refresh the status of an unfinished job. Call it at the
+# very end of the page: a widget interaction during the wait is handled by the rerun
+def rerun_while_running(job, poll_seconds=POLL_SECONDS):
+    if job is not None and job["status"] not in FINISHED_STATES:
+        time.sleep(poll_seconds)
+        st.experimental_rerun()  # Streamlit 1.24 has no st.rerun or st.fragment(run_every=...)
+
+# Function to offer the files written by a finished job for download
+def display_job_artifacts(job_id, key):
+    for name in job_artifacts(job_id):
+        with open(os.path.join(job_directory(job_id), name), "rb") as artifact:
+            st.download_button(label=f"Download {name}", data=artifact, file_name=os.path.basename(name), key=f"{key}_{name}")
+
+# Function to pick a job of this page by ID, among the user's recent ones or typed in; returns the ID or None
+def job_lookup(runner, kind, key):
+    recent = {job["id"]: job for job in runner.store.recent(kind, requester=job_owner_token())}
+    selected = st.selectbox(
+        "Recent jobs:",
+        [""] + list(recent),
+        format_func=lambda job_id: "" if not job_id else f"{job_id} · {recent[job_id]['status']} · "
+                                   f"submitted {time.strftime('%Y-%m-%d %H:%M', time.localtime(recent[job_id]['created']))}",
+        key=f"{key}_recent"
+    )
+    typed = st.text_input("Or enter a job ID:", "", key=f"{key}_typed")
+    if st.button("Open Job", key=f"{key}_open"):
+        return typed.strip() or selected or None
+    return None
@@ -0,0 +1,274 @@
+import importlib
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from apps.common.cache_dir import cache_path
+from apps.common.tracing import aggregate_spans, trace
+
+# Worker processes shared by every session of the server, and how long finished jobs are kept
+# (override with environment variables)
+JOB_WORKERS = int(os.environ.get("TEXTVIZ_JOB_WORKERS", "2"))
+JOB_RETENTION_DAYS = float(os.environ.get("TEXTVIZ_JOB_RETENTION_DAYS", "7"))
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+# Unfinished jobs carry a heartbeat, refreshed by the worker running them or the server that queued
+# them; a job whose heartbeat stops for HEARTBEAT_TIMEOUT_SECONDS lost its process and is failed
+HEARTBEAT_SECONDS = 10.0
+HEARTBEAT_TIMEOUT_SECONDS = 60.0
+
+# Handler of each job kind as "module:function", imported in the worker process only. A handler is
+# called as handler(params, secrets, directory, progress) and returns a JSON-serializable result
+JOB_HANDLERS = {
+    "keywords": "apps.keywords.keyword_jobs:run_keyword_job",
+    "topics": "apps.topic_modelling.topic_jobs:run_topic_job",
+}
+
+FINISHED_STATES = ("done", "failed")
+JSON_COLUMNS = ("params", "result")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    owner TEXT,
+    heartbeat REAL,
+    requester TEXT
+)
+"""
+
+# Columns added after the first version of the table, added to existing tables on open
+ADDED_COLUMNS = {"owner": "TEXT", "heartbeat": "REAL", "requester": "TEXT"}
+
+# Function to get the directory holding the inputs and artifacts of a job
+def job_directory(job_id):
+    return cache_path("jobs", job_id)
+
+# Function to list the artifacts a job wrote, relative to its directory (uploaded inputs excluded)
+def job_artifacts(job_id):
+    directory = job_directory(job_id)
+    return sorted(os.path.relpath(os.path.join(root, name), directory)
+                  for root, _, names in os.walk(directory) for name in names
+                  if os.path.relpath(root, directory).split(os.sep)[0] != "inputs")
+
+# SQLite table of jobs, shared by the server process and the worker processes; every call opens its own
+# connection so it can be used from any thread or process
+class JobStore:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_path("jobs"), "jobs.sqlite3")
+        with closing(sqlite3.connect(self.path, timeout=30)) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")  # Readers do not wait for the workers' progress writes
+            connection.execute(SCHEMA)
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in ADDED_COLUMNS.items():
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            connection.commit()
+
+    def execute(self, sql, parameters=()):
+        with closing(sqlite3.connect(self.path, timeout=30)) as connection:
+            connection.row_factory = sqlite3.Row
+            rows = connection.execute(sql, parameters).fetchall()
+            connection.commit()
+        return rows
+
+    # Function to add a queued job and create its directory; owner identifies the runner that queued it,
+    # requester the user who submitted it. Returns the job ID
+    def create(self, kind, params, owner=None, requester=None):
+        job_id = uuid.uuid4().hex[:12]
+        self.execute("INSERT INTO jobs (id, kind, status, params, created, owner, heartbeat, requester) "
+                     "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                     (job_id, kind, json.dumps(params), time.time(), owner, time.time(), requester))
+        job_directory(job_id)
+        return job_id
+
+    # Function to get a job as a dict, or None for an unknown ID; with requester, jobs submitted by
+    # anyone else are unknown too
+    def get(self, job_id, requester=None):
+        rows = self.execute("SELECT * FROM jobs WHERE id = ? AND (? IS NULL OR requester = ?)", (job_id, requester, requester))
+        if not rows:
+            return None
+        job = dict(rows[0])
+        for column in JSON_COLUMNS:
+            job[column] = json.loads(job[column]) if job[column] else None
+        return job
+
+    # Function to list the most recent jobs, optionally of one kind and of one requester
+    def recent(self, kind=None, requester=None, limit=20):
+        rows = self.execute("SELECT id FROM jobs WHERE (? IS NULL OR kind = ?) AND (? IS NULL OR requester = ?) "
+                            "ORDER BY created DESC LIMIT ?", (kind, kind, requester, requester, limit))
+        return [self.get(row["id"]) for row in rows]
+
+    def update(self, job_id, **fields):
+        fields = {column: json.dumps(value) if column in JSON_COLUMNS else value for column, value in fields.items()}
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        self.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    # Function to refresh the heartbeat of the jobs an owner still has queued
+    def beat_queued(self, owner):
+        self.execute("UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = 'queued'", (time.time(), owner))
+
+    # Function to fail the unfinished jobs whose heartbeat stopped: their server or worker process is gone.
+    # Jobs of other live server processes keep their heartbeat and are left alone
+    def interrupt_stale(self, timeout_seconds=HEARTBEAT_TIMEOUT_SECONDS):
+        self.execute("UPDATE jobs SET status = 'failed', error = 'Interrupted: the process running it stopped', finished = ? "
+                     "WHERE status NOT IN (?, ?) AND (heartbeat IS NULL OR heartbeat < ?)",
+                     (time.time(), *FINISHED_STATES, time.time() - timeout_seconds))
+
+    # Function to delete finished jobs older than max_age_seconds, with their artifacts
+    def purge(self, max_age_seconds):
+        rows = self.execute("SELECT id FROM jobs WHERE status IN (?, ?) AND finished < ?", (*FINISHED_STATES, time.time() - max_age_seconds))
+        for row in rows:
+            shutil.rmtree(job_directory(row["id"]), ignore_errors=True)
+            self.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+
+# Progress callback handed to job handlers: progress(fraction, message) records how far the job is,
+# fraction None keeps the last one. Writes are throttled, except the message of a new stage
+class ProgressReporter:
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.fraction = 0.0
+        self.message = None
+        self.last_write = 0.0
+
+    def __call__(self, fraction=None, message=None):
+        if fraction is not None:
+            self.fraction = min(max(float(fraction), 0.0), 1.0)
+        stage_changed = message is not None and message != self.message
+        self.message = message if message is not None else self.message
+        if stage_changed or time.monotonic() - self.last_write >= PROGRESS_INTERVAL_SECONDS:
+            self.store.update(self.job_id, progress=self.fraction, message=self.message)
+            self.last_write = time.monotonic()
+
+# Function to set up a worker process: the cores are split between the workers, so concurrent jobs
+# do not oversubscribe the CPU (read by configure_cpu_threads)
+def init_worker(threads):
+    os.environ.setdefault("TEXTVIZ_TORCH_THREADS", str(threads))
+
+# Function to refresh the heartbeat of a running job until stopped is set
+def beat_job(store, job_id, stopped):
+    while not stopped.wait(HEARTBEAT_SECONDS):
+        try:
+            store.update(job_id, heartbeat=time.time())
+        except sqlite3.Error:
+            pass  # The next beat tries again
+
+# Function to run one job in a worker process, recording its outcome in the job table. The time and memory
+# of its stages are added to the result under "trace" (see apps.common.tracing)
+def run_job(job_id, kind, params, secrets, database_path):
+    store = JobStore(database_path)
+    store.update(job_id, status="running", started=time.time(), heartbeat=time.time())
+    stopped = threading.Event()
+    threading.Thread(target=beat_job, args=(store, job_id, stopped), daemon=True).start()
+    try:
+        run_job_handler(store, job_id, kind, params, secrets)
+    finally:
+        stopped.set()
+
+# Function to call the handler of a job kind and store its result or error
+def run_job_handler(store, job_id, kind, params, secrets):
+    progress = ProgressReporter(store, job_id)
+    try:
+        module_name, function_name = JOB_HANDLERS[kind].split(":")
+        handler = getattr(importlib.import_module(module_name), function_name)
+        with trace(f"{kind} job", job_id=job_id) as job_trace:
+            result = handler(params, secrets or {}, job_directory(job_id), progress)
+        result = dict(result, trace=aggregate_spans(job_trace.records()))
+    except Exception as e:
+        store.update(job_id, status="failed", error=f"{type(e).__name__}: {e}", finished=time.time())
+        return
+    store.update(job_id, status="done", progress=1.0, message=None, result=result, finished=time.time())
+
+# Process pool running jobs in the background, so they survive reruns and closed tabs of the page that
+# submitted them. Jobs beyond the number of workers wait in the queue
+class JobRunner:
+    def __init__(self, store=None, max_workers=JOB_WORKERS):
+        self.store = store or JobStore()
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.executor = None
+        self.owner = uuid.uuid4().hex
+        self.store.interrupt_stale()
+        self.store.purge(JOB_RETENTION_DAYS * 86400)
+        threading.Thread(target=self.beat, daemon=True).start()
+
+    # Function to keep the jobs queued by this runner alive and fail the jobs whose process stopped meanwhile,
+    # run in a daemon thread for the life of the runner
+    def beat(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            try:
+                self.store.beat_queued(self.owner)
+                self.store.interrupt_stale()
+            except sqlite3.Error:
+                pass
+
+    def start_executor(self):
+        threads = max(1, (os.cpu_count() or 1) // self.max_workers)
+        # Spawned workers do not inherit the server's threads and open connections
+        return ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=init_worker, initargs=(threads,))
+
+    # Function to queue a job. inputs are (file_name, bytes) pairs written to the job directory, whose
+    # paths the handler gets in params["inputs"]; secrets (e.g. API keys) reach the worker but are not stored.
+    # requester identifies the user, who alone can see the job (see apps.common.job_panel)
+    def submit(self, kind, params, inputs=(), secrets=None, requester=None):
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = self.store.create(kind, params, owner=self.owner, requester=requester)
+        paths = []
+        for position, (file_name, data) in enumerate(inputs):
+            input_directory = os.path.join(job_directory(job_id), "inputs", str(position))
+            os.makedirs(input_directory, exist_ok=True)
+            paths.append(os.path.join(input_directory, os.path.basename(file_name)))
+            with open(paths[-1], "wb") as input_file:
+                input_file.write(data)
+        params = dict(params, inputs=paths)
+        self.store.update(job_id, params=params)
+        with self.lock:
+            if self.executor is None:
+                self.executor = self.start_executor()
+            try:
+                future = self.executor.submit(run_job, job_id, kind, params, secrets, self.store.path)
+            except BrokenProcessPool:
+                self.executor = self.start_executor()
+                future = self.executor.submit(run_job, job_id, kind, params, secrets, self.store.path)
+        future.add_done_callback(lambda future: self.check_worker(job_id, future))
+        return job_id
+
+    # Function to fail a job whose worker process died (e.g. killed for running out of memory)
+    def check_worker(self, job_id, future):
+        if not future.cancelled() and future.exception() is not None:
+            self.store.update(job_id, status="failed", error=f"The worker process stopped: {future.exception()}", finished=time.time())
+
+    def get(self, job_id, requester=None):
+        return self.store.get(job_id, requester)
+
+# Shared runner for the server process
+_job_runner = None
+_job_runner_lock = threading.Lock()
+
+# Function to get the process-wide job runner
+def get_job_runner():
+    global _job_runner
+    with _job_runner_lock:
+        if _job_runner is None:
+            _job_runner = JobRunner()
+        return _job_runner
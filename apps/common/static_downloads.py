@@ -0,0 +1,60 @@
+import os
+import shutil
+import time
+import uuid
+import streamlit as st
+
+# Large downloads are placed under Streamlit's static folder ("static" next to the app's entry script,
+# served when server.enableStaticServing is on), so the server streams them from disk instead of holding
+# them in memory. Links use an unguessable token and expire after DOWNLOAD_TTL_SECONDS
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+STATIC_DIR = os.environ.get("TEXTVIZ_STATIC_DIR", os.path.join(REPO_ROOT, "static"))
+DOWNLOAD_DIR = os.path.join(STATIC_DIR, "downloads")
+DOWNLOAD_TTL_SECONDS = 3600
+STATIC_FILE_MAX_BYTES = 200 * 1024 * 1024  # Larger files are refused by Streamlit's static route
+INLINE_DOWNLOAD_MAX_BYTES = 10 * 1024 * 1024  # Smaller files are simply sent with st.download_button
+
+# Function to delete the prepared downloads older than max_age_seconds
+def prune_downloads(max_age_seconds=DOWNLOAD_TTL_SECONDS):
+    if not os.path.isdir(DOWNLOAD_DIR):
+        return
+    for token in os.listdir(DOWNLOAD_DIR):
+        path = os.path.join(DOWNLOAD_DIR, token)
+        try:
+            if time.time() - os.stat(path).st_mtime > max_age_seconds:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            continue
+
+# Function to reserve the location of a new download; returns its relative URL and the path to write
+# the file to
+def new_download(file_name):
+    prune_downloads()
+    token = uuid.uuid4().hex
+    directory = os.path.join(DOWNLOAD_DIR, token)
+    os.makedirs(directory)
+    return f"app/static/downloads/{token}/{file_name}", os.path.join(directory, file_name)
+
+# Function to make a file on disk downloadable through the static route, without copying it where hard
+# links are available; returns its relative URL and path
+def publish_download(source_path, file_name):
+    url, path = new_download(file_name)
+    try:
+        os.link(source_path, path)
+    except OSError:
+        shutil.copyfile(source_path, path)  # Other file system, or no hard links
+    os.utime(path)  # Expires DOWNLOAD_TTL_SECONDS from now, not from when the source was written
+    return url, path
+
+# Function to offer a published download as a link streamed from disk. Files over the static route's
+# limit fall back to a download button, which reads them into the server's memory
+def display_download_link(url, path, label, file_name, key):
+    if os.path.getsize(path) <= STATIC_FILE_MAX_BYTES:
+        st.markdown(f'<a href="{url}" download="{file_name}">{label}</a>', unsafe_allow_html=True)
+        st.caption(f"The file is streamed from the server's disk. The link expires {DOWNLOAD_TTL_SECONDS // 60} minutes "
+                   f"after it was prepared.")
+        return
+    with open(path, "rb") as download_file:
+        st.download_button(label=label, data=download_file, file_name=file_name, key=key)
+    st.caption(f"The file is larger than the {STATIC_FILE_MAX_BYTES // 2 ** 20} MB the static route serves, so this "
+               f"download is read into the server's memory.")
@@ -0,0 +1,33 @@
+import pandas as pd
+import streamlit as st
+from apps.common.tracing import TRACE_LOG
+
+# Function to round a value of the panel, leaving values that were not measured empty
+def rounded(value, digits):
+    return None if value is None else round(value, digits)
+
+# Function to show where the last run spent its time and memory, in a collapsed panel of the sidebar.
+# rows are stage summaries from aggregate_spans; nested stages are indented under their parent
+def display_trace_panel(rows, title="Performance"):
+    with st.sidebar.expander(title, expanded=False):
+        if not rows:
+            st.caption("Run an analysis to see the time and memory each stage takes.")
+            return
+        # Memory and worker columns are empty on Windows, and for jobs traced before they were recorded
+        table = pd.DataFrame([{
+            "Stage": " " * row["depth"] + row["stage"],
+            "Calls": row["count"],
+            "Wall (s)": round(row["wall_s"], 3),
+            "Self (s)": round(row["self_s"], 3),
+            "CPU (s)": round(row["cpu_s"], 3),
+            "Memory Δ (MB)": rounded(row.get("rss_delta_mb"), 1),
+            "Peak Δ (MB)": rounded(row.get("peak_rss_delta_mb"), 1),
+            "Workers CPU (s)": rounded(row.get("children_cpu_s"), 3),
+            "Workers peak Δ (MB)": rounded(row.get("children_peak_rss_delta_mb"), 1),
+        } for row in rows])
+        st.dataframe(table, hide_index=True, use_container_width=True)
+        st.caption("CPU and memory cover the whole process, including other sessions running at the same time. Peak Δ is "
+                   "how far a stage raised the process's peak memory. The workers columns count the worker processes a "
+                   "stage started and shut down.")
+        if TRACE_LOG:
+            st.caption(f"Every span is also appended to `{TRACE_LOG}`.")
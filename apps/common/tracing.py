@@ -0,0 +1,154 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from apps.common.cache_dir import cache_path
+
+# Memory and worker process usage come from the resource module, which Windows lacks; spans then record
+# wall and CPU time only, and leave out RESOURCE_FIELDS
+try:
+    import resource
+except ImportError:
+    resource = None
+RESOURCE_FIELDS = ("rss_delta_mb", "peak_rss_delta_mb", "children_cpu_s", "children_peak_rss_delta_mb")
+PEAK_FIELDS = ("peak_rss_delta_mb", "children_peak_rss_delta_mb")  # Aggregated as the largest value, others summed
+
+# JSON-lines file every finished trace is appended to (set TEXTVIZ_TRACE_LOG to an empty value to turn
+# logging off), and the size at which it is rotated
+TRACE_LOG = os.environ.get("TEXTVIZ_TRACE_LOG", os.path.join(cache_path("traces"), "spans.jsonl"))
+TRACE_LOG_MAX_MB = int(os.environ.get("TEXTVIZ_TRACE_LOG_MB", "50"))
+
+_current_trace = contextvars.ContextVar("textviz_trace", default=None)
+_log_lock = threading.Lock()
+
+# Function to get the resident set size of this process in MB
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+# Function to get the peak resident set size this process has reached so far, in MB
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, KB elsewhere
+
+# Function to get the CPU time (user and system, in seconds) and the largest peak resident set size (MB)
+# of the child processes that ended and were waited for, e.g. the workers of a pool that was shut down
+def children_usage():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    peak = usage.ru_maxrss / 2 ** 20 if sys.platform == "darwin" else usage.ru_maxrss / 1024
+    return usage.ru_utime + usage.ru_stime, peak
+
+# Spans recorded while a trace is active in the current context (thread or task)
+class Trace:
+    def __init__(self, name, **attributes):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.attributes = attributes
+        self.started = time.time()
+        self.spans = []
+        self.stack = []
+
+    # Function to get the finished spans in start order, so parents come before their children
+    def records(self):
+        return [span for span in self.spans if "wall_s" in span]
+
+# Function to time a stage of the current trace: wall time, process CPU time, the change of resident
+# memory and how far the stage raised the process's peak memory. These cover the whole process, so on the
+# server they include the other sessions running meanwhile; records say so with scope "process". Worker
+# processes are counted separately, as the CPU time of the children that ended during the stage and how
+# far they raised the largest child peak memory. Workers still alive at the end of a stage (e.g. the
+# job runner's) are not counted. Spans nest, and are no-ops (bar a context variable lookup) when no
+# trace is active
+@contextmanager
+def span(name, **attributes):
+    current = _current_trace.get()
+    if current is None:
+        yield None
+        return
+    record = {"trace_id": current.id, "index": len(current.spans), "span": name,
+              "parent": current.stack[-1] if current.stack else None, "depth": len(current.stack),
+              "start_s": time.time() - current.started, "scope": "process", "attributes": attributes}
+    current.spans.append(record)
+    current.stack.append(record["index"])
+    if resource is not None:
+        rss_before, peak_before = current_rss_mb(), peak_rss_mb()
+        children_cpu_before, children_peak_before = children_usage()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["wall_s"] = time.perf_counter() - wall_start
+        record["cpu_s"] = time.process_time() - cpu_start
+        if resource is not None:
+            record["rss_delta_mb"] = current_rss_mb() - rss_before
+            record["peak_rss_delta_mb"] = peak_rss_mb() - peak_before
+            children_cpu, children_peak = children_usage()
+            record["children_cpu_s"] = children_cpu - children_cpu_before
+            record["children_peak_rss_delta_mb"] = children_peak - children_peak_before
+        current.stack.pop()
+
+# Function to record the spans of a whole run (a page action, a job or a CLI command) under one root
+# span; the trace is appended to the JSON-lines log when it ends
+@contextmanager
+def trace(name, log_path=None, **attributes):
+    current = Trace(name, **attributes)
+    token = _current_trace.set(current)
+    try:
+        with span(name, **attributes):
+            yield current
+    finally:
+        _current_trace.reset(token)
+        write_trace_log(current, TRACE_LOG if log_path is None else log_path)
+
+# Function to append the spans of a finished trace to the log, one JSON object per line
+def write_trace_log(current, log_path):
+    if not log_path:
+        return
+    lines = "".join(json.dumps(dict(record, trace=current.name, pid=os.getpid(), time=current.started + record["start_s"]),
+                               default=str) + "\n" for record in current.records())
+    with _log_lock:
+        try:
+            if os.path.exists(log_path) and os.path.getsize(log_path) > TRACE_LOG_MAX_MB * 2 ** 20:
+                os.replace(log_path, f"{log_path}.1")
+            with open(log_path, "a", encoding="utf-8") as log_file:
+                log_file.write(lines)  # A single append, so traces of several processes do not interleave
+        except OSError:
+            pass  # Tracing never fails a run
+
+# Function to sum the spans of the same stage (same chain of span names), keeping their first-seen order:
+# count, wall and CPU time and memory change are summed, the peak increases are the largest ones, and
+# self_s is the wall time not spent in child stages. Fields the spans did not record (see RESOURCE_FIELDS)
+# are None
+def aggregate_spans(records):
+    paths = {}
+    rows = {}
+    for record in records:
+        parent_path = paths.get((record["trace_id"], record["parent"]), ())
+        path = parent_path + (record["span"],)
+        paths[(record["trace_id"], record["index"])] = path
+        row = rows.setdefault(path, {"stage": record["span"], "depth": record["depth"], "count": 0, "wall_s": 0.0, "self_s": 0.0,
+                                     "cpu_s": 0.0, **dict.fromkeys(RESOURCE_FIELDS), "scope": record["scope"]})
+        row["count"] += 1
+        row["wall_s"] += record["wall_s"]
+        row["self_s"] += record["wall_s"]
+        row["cpu_s"] += record["cpu_s"]
+        for field in RESOURCE_FIELDS:
+            if field not in record:
+                continue
+            if row[field] is None:
+                row[field] = record[field]
+            else:
+                row[field] = max(row[field], record[field]) if field in PEAK_FIELDS else row[field] + record[field]
+        if parent_path:
+            rows[parent_path]["self_s"] -= record["wall_s"]
+    return list(rows.values())
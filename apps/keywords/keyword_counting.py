@@ -0,0 +1,199 @@
+import re
+from collections import deque
+import pandas as pd
+from apps.keywords.text_cache import iter_document_chunks
+
+# Use the C implementation of Aho-Corasick when pyahocorasick is installed
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Characters that turn a keyword into a regular expression
+REGEX_METACHARACTERS = frozenset(".^$*+?{}[]\\|()")
+
+# Constructs that cannot be combined into one alternation (backreferences, named groups, global flags)
+UNCOMBINABLE_PATTERN = re.compile(r"\\[1-9]|\(\?P[<=]|\(\?[aiLmsux]+\)")
+
+# Longest keyword match still counted when it crosses the boundary between two chunks of a document
+MATCH_OVERLAP_CHARS = 4096
+
+# Function to check whether a keyword is a plain literal rather than a regular expression
+def is_literal(keyword):
+    return not any(character in REGEX_METACHARACTERS for character in keyword)
+
+# Pure Python Aho-Corasick automaton, used when pyahocorasick is not available
+class AhoCorasickAutomaton:
+    def __init__(self, words):
+        self.transitions = [{}]
+        self.outputs = [[]]
+        for index, word in enumerate(words):
+            node = 0
+            for character in word:
+                next_node = self.transitions[node].get(character)
+                if next_node is None:
+                    next_node = len(self.transitions)
+                    self.transitions.append({})
+                    self.outputs.append([])
+                    self.transitions[node][character] = next_node
+                node = next_node
+            self.outputs[node].append((index, len(word)))
+
+        # Breadth-first construction of the failure links
+        self.failures = [0] * len(self.transitions)
+        queue = deque(self.transitions[0].values())
+        while queue:
+            node = queue.popleft()
+            for character, next_node in self.transitions[node].items():
+                queue.append(next_node)
+                failure = self.failures[node]
+                while failure and character not in self.transitions[failure]:
+                    failure = self.failures[failure]
+                candidate = self.transitions[failure].get(character, 0)
+                self.failures[next_node] = candidate if candidate != next_node else 0
+                self.outputs[next_node] = self.outputs[next_node] + self.outputs[self.failures[next_node]]
+
+    # Yield (end_index, word_index) for every (possibly overlapping) occurrence
+    def iter(self, text):
+        transitions = self.transitions
+        failures = self.failures
+        outputs = self.outputs
+        node = 0
+        for position, character in enumerate(text):
+            while node and character not in transitions[node]:
+                node = failures[node]
+            node = transitions[node].get(character, 0)
+            for index, _ in outputs[node]:
+                yield position, index
+
+# Counts every keyword of a list in a single scan per document
+class KeywordCounter:
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        patterns = [keyword.lower() for keyword in self.keywords]  # Case-insensitive matching
+        self.unique_patterns = list(dict.fromkeys(patterns))
+        self.positions = [self.unique_patterns.index(pattern) for pattern in patterns]
+
+        # Split the keywords into plain literals, combinable regexes and regexes that must run alone
+        self.literals = []
+        self.regexes = []
+        self.standalone = []
+        for index, pattern in enumerate(self.unique_patterns):
+            compiled = re.compile(pattern)  # Raises re.error for invalid expressions, as before
+            if compiled.match("") is not None:
+                self.standalone.append((index, compiled))
+            elif is_literal(pattern):
+                self.literals.append((index, pattern))
+            elif UNCOMBINABLE_PATTERN.search(pattern):
+                self.standalone.append((index, compiled))
+            else:
+                self.regexes.append((index, pattern))
+
+        self.automaton = self.build_automaton([pattern for _, pattern in self.literals])
+        self.literal_lengths = [len(pattern) for _, pattern in self.literals]
+        self.combined_regex = self.build_combined_regex()
+
+    def build_automaton(self, words):
+        if not words:
+            return None
+        if ahocorasick is None:
+            return AhoCorasickAutomaton(words)
+        automaton = ahocorasick.Automaton()
+        for index, word in enumerate(words):
+            automaton.add_word(word, index)
+        automaton.make_automaton()
+        return automaton
+
+    # One alternation of lookaheads: a match at each position where any regex starts,
+    # with a named group recording where each regex matching there ends
+    def build_combined_regex(self):
+        if not self.regexes:
+            return None
+        gate = "(?=" + "|".join(f"(?:{pattern})" for _, pattern in self.regexes) + ")"
+        groups = "".join(f"(?:(?=(?P<k{position}>{pattern})))?" for position, (_, pattern) in enumerate(self.regexes))
+        try:
+            return re.compile(gate + groups)
+        except re.error:
+            self.standalone.extend((index, re.compile(pattern)) for index, pattern in self.regexes)
+            self.regexes = []
+            return None
+
+    # Count the non-overlapping occurrences (like re.findall) of every unique pattern that start in
+    # [floor, limit) of a lowercased window, and no earlier than the end of the pattern's last counted
+    # match in last_end. Returns the counts and the updated last_end, both per unique pattern
+    def count_window(self, text, floor, limit, last_end):
+        counts = [0] * len(self.unique_patterns)
+        last_end = list(last_end)
+
+        # Literals: keep the leftmost non-overlapping occurrences of each word
+        if self.automaton is not None:
+            lengths = self.literal_lengths
+            literals = self.literals
+            for end_index, literal in self.automaton.iter(text):
+                index = literals[literal][0]
+                start = end_index - lengths[literal] + 1
+                if max(floor, last_end[index]) <= start < limit:
+                    counts[index] += 1
+                    last_end[index] = end_index + 1
+
+        # Regexes: one scan of the combined alternation, same non-overlapping rule per regex
+        if self.combined_regex is not None:
+            for match in self.combined_regex.finditer(text, floor):
+                start = match.start()
+                if start >= limit:
+                    break
+                for position, (index, _) in enumerate(self.regexes):
+                    end = match.end(f"k{position}")
+                    if end != -1 and start >= last_end[index]:
+                        counts[index] += 1
+                        last_end[index] = end
+
+        for index, compiled in self.standalone:
+            for match in compiled.finditer(text, max(floor, last_end[index])):
+                if match.start() >= limit:
+                    break
+                counts[index] += 1
+                last_end[index] = match.end()
+
+        return counts, last_end
+
+    # Count non-overlapping occurrences of every keyword in a document, in keyword order
+    def count(self, text):
+        text = text.lower()
+        counts, _ = self.count_window(text, 0, len(text) + 1, [0] * len(self.unique_patterns))  # + 1 for an empty match at the end
+        return [counts[position] for position in self.positions]
+
+    # Count a document held as a string or read in chunks, in keyword order. Each window is the tail of
+    # the previous one plus the next chunk; only matches starting overlap_chars before its end are counted
+    # there, the rest wait for the next window. Matches up to overlap_chars long that cross a chunk
+    # boundary are counted once, as in the whole document, and the kept tail gives lookbehinds and \b
+    # the text before the window
+    def count_document(self, document, overlap_chars=MATCH_OVERLAP_CHARS):
+        totals = [0] * len(self.unique_patterns)
+        last_end = [0] * len(self.unique_patterns)
+        window = ""
+        floor = 0
+        for chunk in iter_document_chunks(document):
+            window += chunk.lower()
+            limit = max(len(window) - overlap_chars, floor)
+            counts, last_end = self.count_window(window, floor, limit, last_end)
+            totals = [total + count for total, count in zip(totals, counts)]
+
+            # Keep overlap_chars of context before the first uncounted position
+            cut = max(limit - overlap_chars, 0)
+            window = window[cut:]
+            floor = limit - cut
+            last_end = [max(end - cut, floor) for end in last_end]
+        counts, _ = self.count_window(window, floor, len(window) + 1, last_end)  # + 1 for an empty match at the end
+        totals = [total + count for total, count in zip(totals, counts)]
+        return [totals[position] for position in self.positions]
+
+# Function to analyze custom keywords and generate the required dataframe
+def analyze_custom_keywords(text_data, keywords):
+    counter = KeywordCounter(keywords)  # Compile the keyword list once for all documents
+    keyword_freq = { "Features": keywords }
+    # Collect the frequency of each keyword in each document; large documents arrive in chunks
+    for file_name, document in text_data:
+        keyword_freq[file_name] = counter.count_document(document)
+    keyword_df = pd.DataFrame(keyword_freq)
+    return keyword_df
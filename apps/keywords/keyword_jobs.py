@@ -0,0 +1,26 @@
+import os
+from apps.common.tracing import span
+from apps.keywords.keyword_pipeline import iter_output_artifacts, load_cleaned_documents, run_keyword_analysis
+from apps.keywords.text_cache import get_text_cache
+from apps.keywords.zip_export import write_zip_archive
+
+RESULTS_NAME = "analysis_results.csv"
+ARCHIVE_NAME = "analysis_results.zip"
+
+# Function to run a keyword analysis as a background job (see apps.common.jobs): the uploaded files in
+# params["inputs"] are extracted and cleaned, analyzed, and the results table and the ZIP of every
+# output are written to the job directory
+def run_keyword_job(params, secrets, directory, progress):
+    errors = []
+    progress(0.05, f"Extracting and cleaning {len(params['inputs'])} files...")
+    # Cached documents are read while counting, so they stay pinned until then
+    with get_text_cache().pinned() as pins:
+        text_data = load_cleaned_documents(params["inputs"], params["language"], pins, on_error=errors.append)
+        progress(0.4, "Counting keywords..." if params.get("keywords") else "Discovering n-grams...")
+        result_df = run_keyword_analysis(text_data, params["language"], keywords=params.get("keywords"), top_n=params.get("top_n", 10))
+    result_df.to_csv(os.path.join(directory, RESULTS_NAME), index=False)
+    progress(0.6, "Rendering word clouds...")
+    with span("rendering", documents=len(result_df.columns) - 1):
+        zip_path = write_zip_archive(iter_output_artifacts(result_df, params.get("colormap")), directory=directory)
+    os.replace(zip_path, os.path.join(directory, ARCHIVE_NAME))
+    return {"results": RESULTS_NAME, "archive": ARCHIVE_NAME, "errors": errors}
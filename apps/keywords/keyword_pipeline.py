@@ -0,0 +1,116 @@
+import hashlib
+from apps.common.tracing import span
+from apps.common.csv_reader import read_csv_columns, iter_csv_text_chunks
+from apps.keywords.keyword_counting import analyze_custom_keywords
+from apps.keywords.ngram_discovery import discover_top_ngrams
+from apps.keywords.pdf_extraction import get_file_name, iter_indexed_text_from_pdfs
+from apps.keywords.text_cache import get_text_cache, create_content_key, cleaned_kind, iter_file_chunks
+from apps.keywords.text_cleaning import clean_text, iter_cleaned_chunks
+from apps.keywords.wordcloud_rendering import iter_wordcloud_pngs, frequencies_per_document, COMBINED_NAME, FULL_SIZE
+from apps.keywords.zip_export import csv_payload, output_stem
+
+HASH_BLOCK_BYTES = 1024 * 1024
+
+# Function to get the content key of an uploaded file, or of a path on disk read block by block
+def file_content_key(file):
+    if hasattr(file, "getvalue"):
+        return create_content_key(file.getvalue())
+    digest = hashlib.md5()
+    with open(file, "rb") as handle:
+        for block in iter(lambda: handle.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Function to tell PDFs from CSVs, for uploaded files and paths on disk
+def is_pdf(file):
+    if hasattr(file, "type"):
+        return file.type == "application/pdf"
+    return str(file).lower().endswith(".pdf")
+
+# Function to extract and clean files, serving both steps from the text cache when possible. Files are
+# uploaded files or paths on disk; CSVs without a 'text' column are reported through on_error. The cache
+# entries read are pinned in pins (from get_text_cache().pinned()), so the documents stay readable until
+# the run leaves that block even when the batch is larger than the cache.
+# Yields (index, file_name, document) where document is a string or a CachedDocument read in chunks
+def iter_cleaned_documents(files, selected_language, pins, on_error=None, max_workers=None):
+    cache = get_text_cache()
+    kind = cleaned_kind(selected_language)
+    raw_hits = []
+    pdf_misses = []
+    csv_misses = []
+    for index, file in enumerate(files):
+        key = file_content_key(file)
+        document = pins.document(key, kind)
+        raw_path = pins.pin(key, "raw") if document is None else None
+        if document is not None:
+            yield index, get_file_name(file), document
+        elif raw_path is not None:
+            raw_hits.append((index, key, get_file_name(file), raw_path))
+        else:
+            # Only files never seen before need to be parsed
+            (pdf_misses if is_pdf(file) else csv_misses).append((index, key, file))
+
+    # Files extracted before but not yet cleaned for this language are cleaned chunk by chunk
+    for index, key, file_name, raw_path in raw_hits:
+        with span("cleaning", file=file_name), cache.writer(key, kind, pins) as cleaned_writer:
+            for _, cleaned in iter_cleaned_chunks(iter_file_chunks(raw_path), selected_language, max_workers=max_workers):
+                cleaned_writer.write(cleaned)
+        yield index, file_name, pins.document(key, kind)
+
+    # Extract the remaining PDFs, cleaning each one as soon as its worker finishes
+    if pdf_misses:
+        for position, file_name, raw in iter_indexed_text_from_pdfs([file for _, _, file in pdf_misses], max_workers):
+            index, key, _ = pdf_misses[position]
+            cache.put(key, raw, "raw")
+            with span("cleaning", file=file_name):
+                cleaned = clean_text(raw, selected_language=selected_language)
+            cache.put(key, cleaned, kind)
+            yield index, file_name, cleaned
+
+    # Stream the 'text' column of the remaining CSVs through cleaning into the cache
+    for index, key, file in csv_misses:
+        if 'text' not in read_csv_columns(file):
+            if on_error is not None:
+                on_error(f"CSV file {get_file_name(file)} must contain a 'text' column.")
+            continue
+        # The CSV is read while its chunks are cleaned, so this span covers both steps
+        with span("cleaning", file=get_file_name(file)), cache.writer(key, "raw") as raw_writer, \
+                cache.writer(key, kind, pins) as cleaned_writer:
+            for raw, cleaned in iter_cleaned_chunks(iter_csv_text_chunks(file), selected_language, max_workers=max_workers):
+                raw_writer.write(raw)
+                cleaned_writer.write(cleaned)
+        yield index, get_file_name(file), pins.document(key, kind)
+
+# Function to load cleaned (file_name, document) pairs in input order; the documents are readable while
+# pins is open (see iter_cleaned_documents)
+def load_cleaned_documents(files, selected_language, pins, on_error=None, max_workers=None):
+    with span("extraction", files=len(files)):
+        results = sorted(iter_cleaned_documents(files, selected_language, pins, on_error, max_workers), key=lambda result: result[0])
+    return [(file_name, text) for _, file_name, text in results]
+
+# Function to run the keyword analysis: counts of the given keywords, or the top_n discovered n-grams
+def run_keyword_analysis(text_data, selected_language, keywords=None, top_n=10):
+    with span("counting", documents=len(text_data)):
+        if keywords:
+            return analyze_custom_keywords(text_data, keywords)
+        stop_words = "english" if selected_language == "English" else None
+        return discover_top_ngrams(text_data, top_n, stop_words=stop_words)
+
+# Function to list every output of an analysis as (entry_name, payload) pairs, rendering lazily;
+# skip_entries holds entries already written, whose word clouds are not rendered again
+def iter_output_artifacts(result_df, colormap, skip_entries=(), max_workers=None):
+    # Add DataFrame CSV to the ZIP
+    yield 'analysis_results.csv', csv_payload(result_df)
+
+    # Add one table per document
+    used_stems = set()
+    stems = {name: output_stem(name, used_stems) for name in [COMBINED_NAME] + list(result_df.columns[1:])}
+    for column in result_df.columns[1:]:
+        yield f"tables/{stems[column]}.csv", csv_payload(result_df[['Features', column]])
+
+    # Add WordCloud PNGs to the ZIP as each one finishes rendering (if they exist)
+    items = [(name, frequencies) for name, frequencies in frequencies_per_document(result_df)
+             if f"wordclouds/{stems[name]}_wordcloud.png" not in skip_entries]
+    for name, png in iter_wordcloud_pngs(items, colormap, size=FULL_SIZE, max_workers=max_workers):
+        if png is not None:
+            yield f"wordclouds/{stems[name]}_wordcloud.png", png
@@ -1,12 +1,13 @@
 import streamlit as st
 import pandas as pd
 import hashlib  # To create unique identifiers
-from PyPDF2 import PdfReader
-import re
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-from io import BytesIO
-import zipfile
+import os
+from apps.keywords.wordcloud_rendering import iter_wordcloud_pngs, frequencies_per_document
+from apps.common.job_panel import follow_job, job_lookup, job_owner_token, rerun_while_running
+from apps.common.jobs import get_job_runner, job_directory
+from apps.common.static_downloads import INLINE_DOWNLOAD_MAX_BYTES, display_download_link, publish_download
+from apps.common.trace_panel import display_trace_panel
+from apps.common.tracing import aggregate_spans, span, trace
 
 # Set the page layout option in Streamlit for wide format
 st.set_page_config(page_title='Text2Keywords', page_icon='🏷️', layout="wide", initial_sidebar_state="expanded")
@@ -25,96 +26,15 @@ st.sidebar.markdown("""
 if "uploaded_files" not in st.session_state:
     st.session_state.uploaded_files = None
     st.session_state.analysis_data = None
+    st.session_state.keyword_job_id = None  # Background job of the last analysis
+
+# Background jobs are shared by every session of the server
+job_runner = get_job_runner()
 
 # Function to create unique identifiers for each document
 def create_unique_id(text):
     return hashlib.md5(text.encode()).hexdigest()
 
-# Extract text from PDF files
-def extract_text_from_pdfs(files):
-    all_texts = []
-    for file in files:
-        reader = PdfReader(file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-        all_texts.append((file.name, text))  # Store file name and text as a tuple
-    return all_texts
-
-# Extract text from CSV files
-def extract_text_from_csvs(files):
-    all_texts = []
-    for file in files:
-        df = pd.read_csv(file)
-        if 'text' in df.columns:
-            text = " ".join(df['text'].dropna().tolist())
-            all_texts.append((file.name, text))  # Store file name and text as a tuple
-        else:
-            st.error(f"CSV file {file.name} must contain a 'text' column.")
-    return all_texts
-
-# Preprocessing functions for different languages
-def clean_text(text, selected_language="English"):
-    if selected_language == "English":
-        return clean_text_english(text)
-    elif selected_language == "French":
-        return clean_text_french(text)
-    elif selected_language == "Spanish":
-        return clean_text_spanish(text)
-    elif selected_language == "Italian":
-        return clean_text_italian(text)
-    elif selected_language == "Portuguese":
-        return clean_text_portuguese(text)
-    elif selected_language == "Chinese":
-        return clean_text_chinese(text)
-    elif selected_language == "Arabic":
-        return clean_text_arabic(text)
-    else:
-        return text
-
-# Function to clean English text
-def clean_text_english(text):
-    text = text.lower()
-    text = re.sub(r"[^a-z\s]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
-
-# Function to clean French text
-def clean_text_french(text):
-    text = text.lower()
-    text = re.sub(r"[^a-zàâäéèêëîïôùûüç\s]", " ", text).strip()
-    return text
-
-# Function to clean Spanish text
-def clean_text_spanish(text):
-    text = text.lower()
-    text = re.sub(r"[^a-záéíóúüñ\s]", " ", text).strip()
-    return text
-
-# Function to clean Italian text
-def clean_text_italian(text):
-    text = text.lower()
-    text = re.sub(r"[^a-zàèéìòù\s]", " ", text).strip()
-    return text
-
-# Function to clean Portuguese text
-def clean_text_portuguese(text):
-    text = text.lower()
-    text = re.sub(r"[^a-záàâãéêíóôõúç\s]", " ", text).strip()
-    return text
-
-# Function to clean Chinese text
-def clean_text_chinese(text):
-    text = re.sub(r"[^\u4e00-\u9fff\s]", " ", text)  # Remove non-Chinese characters
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
-
-# Function to clean Arabic text
-def clean_text_arabic(text):
-    text = re.sub(r"[^\u0600-\u06FF\s]", " ", text)  # Remove non-Arabic characters
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
-
 st.subheader("Import Data")
 
 # File uploader to handle CSV or PDF files
@@ -167,101 +87,102 @@ color_scheme = st.selectbox("Select WordCloud Color Scheme", options=list(colorm
 # Analysis button
 analyze_button = st.button("Run Analysis")
 
-# Function to analyze custom keywords and generate the required dataframe
-def analyze_custom_keywords(text_data, keywords):
-    keyword_freq = { "Features": keywords }
-    # Collect the frequency of each keyword in each document
-    for file_name, text in text_data:
-        keyword_counts = []
-        for keyword in keywords:
-            matches = re.findall(keyword.lower(), text.lower())  # Case-insensitive matching
-            count = len(matches)
-            keyword_counts.append(count)
-        keyword_freq[file_name] = keyword_counts
-    keyword_df = pd.DataFrame(keyword_freq)
-    return keyword_df
-
-# Function to generate word clouds and return as BytesIO object for display and download
-def generate_wordcloud(df, colormap):
-    if colormap:
-        wordcloud = WordCloud(width=3840, height=2160, background_color="white", colormap=colormap).generate_from_frequencies(dict(zip(df['Features'], df[df.columns[1]])))
-    else:
-        wordcloud = WordCloud(width=3840, height=2160, background_color="white").generate_from_frequencies(dict(zip(df['Features'], df[df.columns[1]])))
-    
-    # Save the word cloud image to a BytesIO buffer
-    buffer = BytesIO()
-    plt.figure(figsize=(16, 9), dpi=300)  # High-quality 4K-like resolution
-    plt.imshow(wordcloud, interpolation="bilinear")
-    plt.axis("off")
-    plt.savefig(buffer, format='png', bbox_inches='tight', pad_inches=0)
-    buffer.seek(0)
-    plt.close()
-    return buffer
-
-# Function to create a ZIP file of all outputs
-def create_zip_with_outputs(result_df):
-    zip_buffer = BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'a', zipfile.ZIP_DEFLATED) as zip_file:
-        # Add DataFrame CSV to the ZIP
-        csv_data = result_df.to_csv(index=False).encode('utf-8')
-        zip_file.writestr('analysis_results.csv', csv_data)
-        
-        # Add WordCloud PNGs to the ZIP (if they exist)
-        wordcloud_image = generate_wordcloud(result_df, colormap_options[color_scheme])
-        zip_file.writestr('custom_keyword_wordcloud.png', wordcloud_image.read())
-
-    zip_buffer.seek(0)
-    return zip_buffer
-
-# Function to display and download the results with all outputs bundled in a ZIP file
-def display_custom_keyword_results(keyword_df):
+# Function to display the results of an analysis job, with all outputs bundled in the job's ZIP file
+def display_custom_keyword_results(keyword_df, zip_path, label="Custom Keyword", colormap=None):
     # Create tabs for DataFrame and WordClouds
-    tab1, tab2 = st.tabs(["DataFrame", "Custom Keyword Word Cloud"])
+    tab1, tab2 = st.tabs(["DataFrame", f"{label} Word Clouds"])
     
     # Display DataFrame in the first tab
     with tab1:
-        st.subheader("Custom Keywords Analysis Results")
+        st.subheader(f"{label}s Analysis Results")
         st.dataframe(keyword_df)
 
-    # Display Custom Keyword Word Cloud in the second tab
+    # Display one Word Cloud for the whole corpus and one per document in the second tab,
+    # each appearing as soon as its worker finishes
     with tab2:
-        st.subheader("Custom Keyword Word Cloud")
-        wordcloud_image = generate_wordcloud(keyword_df, colormap_options[color_scheme])
-        st.image(wordcloud_image, use_column_width=True)
-
-    # Create ZIP file with all outputs
-    zip_file = create_zip_with_outputs(keyword_df)
-
-    # Provide download button for the ZIP file
-    st.download_button(
-        label="Download All Outputs (ZIP)",
-        data=zip_file,
-        file_name="analysis_results.zip",
-        mime="application/zip"
-    )
-
-# Run the analysis when the user clicks the button
+        st.subheader(f"{label} Word Clouds")
+        wordcloud_items = frequencies_per_document(keyword_df)
+        cloud_columns = st.columns(2)
+        placeholders = {}
+        for position, (name, _) in enumerate(wordcloud_items):
+            with cloud_columns[position % 2]:
+                st.caption(name)
+                placeholders[name] = st.empty()
+        with span("rendering previews", documents=len(wordcloud_items)):
+            for name, png in iter_wordcloud_pngs(wordcloud_items, colormap):
+                if png is not None:
+                    placeholders[name].image(png, use_column_width=True)
+                else:
+                    placeholders[name].info("No matches were found, so there is no word cloud to draw.")
+
+    # Provide the ZIP file the job wrote; it is kept with the job. Small archives are sent with a download
+    # button, larger ones are linked once through the static route, so the server streams them from disk
+    # instead of reading them into memory on every rerun
+    if os.path.getsize(zip_path) <= INLINE_DOWNLOAD_MAX_BYTES:
+        with open(zip_path, "rb") as zip_file:
+            st.download_button(
+                label="Download All Outputs (ZIP)",
+                data=zip_file,
+                file_name="analysis_results.zip",
+                mime="application/zip"
+            )
+        return
+    published = st.session_state.get("keyword_zip_download")
+    if published is None or published["source"] != zip_path or not os.path.exists(published["path"]):
+        url, path = publish_download(zip_path, "analysis_results.zip")
+        published = {"source": zip_path, "url": url, "path": path}
+        st.session_state.keyword_zip_download = published
+    display_download_link(published["url"], published["path"], "Download All Outputs (ZIP)", "analysis_results.zip",
+                          key="keyword_zip")
+
+# Submit the analysis as a background job when the user clicks the button; it keeps running through
+# reruns of the page and closed tabs, and its results can be opened again by job ID
 if analyze_button and st.session_state.uploaded_files is not None:
-    with st.spinner("Analyzing data..."):
-        text_data = []
-
-        # Separate PDFs and CSVs
-        pdf_files = [file for file in st.session_state.uploaded_files if file.type == "application/pdf"]
-        csv_files = [file for file in st.session_state.uploaded_files if file.type == "text/csv"]
-
-        # Extract text from files
-        if pdf_files:
-            pdf_texts = extract_text_from_pdfs(pdf_files)
-            text_data.extend(pdf_texts)
-        if csv_files:
-            csv_texts = extract_text_from_csvs(csv_files)
-            text_data.extend(csv_texts)
-
-        # Clean text based on language option
-        text_data = [(file_name, clean_text(text, selected_language=language_option)) for file_name, text in text_data]
-
-        if analysis_option == "Input Custom Keywords" and custom_keywords:
-            # Analyze custom keywords
-            keywords = custom_keywords.splitlines()
-            keyword_df = analyze_custom_keywords(text_data, keywords)
-            display_custom_keyword_results(keyword_df)
\ No newline at end of file
+    # Separate PDFs and CSVs
+    pdf_files = [file for file in st.session_state.uploaded_files if file.type == "application/pdf"]
+    csv_files = [file for file in st.session_state.uploaded_files if file.type == "text/csv"]
+
+    if analysis_option == "Input Custom Keywords" and custom_keywords:
+        # Analyze custom keywords
+        job_params = {"keywords": custom_keywords.splitlines(), "label": "Custom Keyword"}
+    elif analysis_option == "Discover Automatically":
+        # Discover the most frequent unigrams, bigrams and trigrams of each file
+        job_params = {"top_n": top_n, "label": "N-gram"}
+    else:
+        job_params = None
+
+    if job_params is not None:
+        job_params.update(language=language_option, colormap=colormap_options[color_scheme])
+        st.session_state.keyword_job_id = job_runner.submit("keywords", job_params,
+                                                            inputs=[(file.name, file.getvalue()) for file in pdf_files + csv_files],
+                                                            requester=job_owner_token())
+
+# Reopen the results of an earlier analysis
+with st.expander("Open an earlier analysis"):
+    opened_job_id = job_lookup(job_runner, "keywords", key="keyword_jobs")
+    if opened_job_id:
+        st.session_state.keyword_job_id = opened_job_id
+
+# Follow the current analysis job, and show its results once it is done
+trace_rows = []
+job = None
+if st.session_state.keyword_job_id:
+    job = follow_job(job_runner, st.session_state.keyword_job_id)
+    if job is not None and job["status"] == "failed":
+        st.error(f"The analysis failed: {job['error']}")
+    elif job is not None and job["status"] == "done":
+        for error in job["result"]["errors"]:
+            st.error(error)
+        job_path = job_directory(job["id"])
+        keyword_df = pd.read_csv(os.path.join(job_path, job["result"]["results"]), dtype={"Features": str}, keep_default_na=False)
+        st.caption(f"Analysis job `{job['id']}`")
+        with trace("keyword results", job_id=job["id"]) as page_trace:
+            display_custom_keyword_results(keyword_df, os.path.join(job_path, job["result"]["archive"]),
+                                           label=job["params"]["label"], colormap=job["params"]["colormap"])
+        trace_rows = job["result"].get("trace", []) + aggregate_spans(page_trace.records())
+
+# Time and memory of each stage of the job and of showing its results
+display_trace_panel(trace_rows)
+
+# Poll the job until it finishes
+rerun_while_running(job)
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import HashingVectorizer
+from scipy import sparse
+from sklearn.utils import murmurhash3_32
+from apps.keywords.text_cache import iter_document_chunks
+
+# N-gram orders discovered automatically
+NGRAM_ORDERS = (1, 2, 3)
+
+# Size of the hashed feature space; memory stays bounded no matter how large the vocabulary grows
+N_FEATURES = 2 ** 22
+
+# Function to build a hashing vectorizer that counts n-grams of a single order
+def build_ngram_vectorizer(order, stop_words=None):
+    return HashingVectorizer(ngram_range=(order, order), n_features=N_FEATURES, alternate_sign=False, norm=None, lowercase=False, stop_words=stop_words)
+
+# Function to map a term to its column in the hashed feature space
+def hash_term(term, n_features=N_FEATURES):
+    return abs(murmurhash3_32(term, seed=0)) % n_features
+
+# Function to select the top_n columns of every row of a sparse count matrix with argpartition
+def top_columns_per_row(matrix, top_n):
+    selected = []
+    for row in range(matrix.shape[0]):
+        start, stop = matrix.indptr[row], matrix.indptr[row + 1]
+        counts = matrix.data[start:stop]
+        columns = matrix.indices[start:stop]
+        if len(counts) > top_n:
+            keep = np.argpartition(-counts, top_n - 1)[:top_n]
+            counts, columns = counts[keep], columns[keep]
+        selected.append(columns[np.argsort(-counts, kind="stable")])
+    return selected
+
+# Function to count the hashed n-grams of one document, summing the rows of its chunks
+def count_document_ngrams(vectorizer, document):
+    row = sparse.csr_matrix((1, vectorizer.n_features))
+    for chunk in iter_document_chunks(document):
+        row = row + vectorizer.transform([chunk])
+    return row
+
+# Function to count exactly, with one more pass of the analyzer, the n-grams that hash to the selected
+# columns. Several n-grams can share a column, so each column is labelled with its most frequent one and
+# the other n-grams of the column are dropped. Returns {column: (term, counts per document)}
+def recover_terms(vectorizer, documents, wanted_columns):
+    analyzer = vectorizer.build_analyzer()
+    term_counts = {}
+    for position, document in enumerate(documents):
+        for chunk in iter_document_chunks(document):
+            for term in analyzer(chunk):
+                if term not in term_counts:
+                    column = hash_term(term)
+                    if column not in wanted_columns:
+                        term_counts[term] = None  # Remembered so the term is hashed once
+                        continue
+                    term_counts[term] = (column, np.zeros(len(documents), dtype=int))
+                if term_counts[term] is not None:
+                    term_counts[term][1][position] += 1
+    terms = {}
+    for term, entry in term_counts.items():
+        if entry is None:
+            continue
+        column, counts = entry
+        best = terms.get(column)
+        if best is None or (counts.sum(), best[0]) > (best[1].sum(), term):  # Ties go to the first term in sort order
+            terms[column] = (term, counts)
+    return terms
+
+# Function to discover the top_n unigrams, bigrams and trigrams of every document
+def discover_top_ngrams(text_data, top_n, stop_words=None):
+    file_names = [file_name for file_name, _ in text_data]
+    documents = [document for _, document in text_data]
+    features = []
+    feature_counts = []
+    for order in NGRAM_ORDERS:
+        vectorizer = build_ngram_vectorizer(order, stop_words)
+        # Sparse document-term matrix, one row per file
+        matrix = sparse.vstack([count_document_ngrams(vectorizer, document) for document in documents]).tocsr()
+
+        # Union of every file's top columns
+        selected = top_columns_per_row(matrix, top_n)
+        if not selected:
+            continue
+        columns = np.unique(np.concatenate(selected))
+        if len(columns) == 0:
+            continue
+
+        # Exact counts of the term behind each column, ordered by total frequency across files
+        terms = sorted(recover_terms(vectorizer, documents, set(columns.tolist())).values(),
+                       key=lambda item: (-item[1].sum(), item[0]))
+        if not terms:
+            continue
+        features.extend(term for term, _ in terms)
+        feature_counts.append(np.column_stack([counts for _, counts in terms]))
+
+    ngram_freq = { "Features": features }
+    if feature_counts:
+        all_counts = np.hstack(feature_counts)
+        for position, file_name in enumerate(file_names):
+            ngram_freq[file_name] = all_counts[position].tolist()
+    else:
+        for file_name in file_names:
+            ngram_freq[file_name] = []
+    ngram_df = pd.DataFrame(ngram_freq)
+    return ngram_df
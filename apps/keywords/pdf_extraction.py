@@ -0,0 +1,80 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+from itertools import chain
+from PyPDF2 import PdfReader
+
+# Number of pages handled by a single worker task; long judgments are split into several tasks
+PAGES_PER_TASK = 20
+
+# Function to read the raw bytes of an uploaded file, a file object or a path on disk
+def read_pdf_bytes(file):
+    if hasattr(file, "getvalue"):
+        return file.getvalue()
+    if hasattr(file, "read"):
+        file.seek(0)
+        return file.read()
+    with open(file, "rb") as handle:
+        return handle.read()
+
+# Function to get a display name for an uploaded file, a file object or a path on disk
+def get_file_name(file):
+    if hasattr(file, "name"):
+        return os.path.basename(file.name)
+    return os.path.basename(str(file))
+
+# Function to extract the text of pages [start, stop) from raw PDF bytes (runs in a worker process)
+def extract_page_range(pdf_bytes, start, stop):
+    reader = PdfReader(BytesIO(pdf_bytes))
+    return [reader.pages[page_number].extract_text() for page_number in range(start, stop)]
+
+# Function to split a PDF into page ranges of at most pages_per_task pages
+def split_page_ranges(num_pages, pages_per_task=PAGES_PER_TASK):
+    return [(start, min(start + pages_per_task, num_pages)) for start in range(0, num_pages, pages_per_task)]
+
+# Function to extract text from PDF files, yielding (index, file_name, text) as each file finishes
+def iter_indexed_text_from_pdfs(files, max_workers=None, pages_per_task=PAGES_PER_TASK):
+    jobs = []
+    for index, file in enumerate(files):
+        pdf_bytes = read_pdf_bytes(file)
+        num_pages = len(PdfReader(BytesIO(pdf_bytes)).pages)
+        jobs.append((index, get_file_name(file), pdf_bytes, split_page_ranges(num_pages, pages_per_task)))
+
+    # Small batches are not worth the cost of starting worker processes
+    if sum(len(page_ranges) for _, _, _, page_ranges in jobs) <= 1:
+        for index, file_name, pdf_bytes, page_ranges in jobs:
+            pages = [extract_page_range(pdf_bytes, start, stop) for start, stop in page_ranges]
+            yield index, file_name, "".join(chain.from_iterable(pages))
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        parts = {}
+        remaining = {}
+        for index, file_name, pdf_bytes, page_ranges in jobs:
+            if not page_ranges:
+                yield index, file_name, ""
+                continue
+            parts[index] = [None] * len(page_ranges)
+            remaining[index] = len(page_ranges)
+            for position, (start, stop) in enumerate(page_ranges):
+                future = executor.submit(extract_page_range, pdf_bytes, start, stop)
+                futures[future] = (index, file_name, position)
+
+        # Join the page texts of a file only once all of its ranges are back
+        for future in as_completed(futures):
+            index, file_name, position = futures.pop(future)
+            parts[index][position] = future.result()
+            remaining[index] -= 1
+            if remaining[index] == 0:
+                yield index, file_name, "".join(chain.from_iterable(parts.pop(index)))
+
+# Function to extract text from PDF files, yielding (file_name, text) in completion order
+def iter_text_from_pdfs(files, max_workers=None, pages_per_task=PAGES_PER_TASK):
+    for _, file_name, text in iter_indexed_text_from_pdfs(files, max_workers, pages_per_task):
+        yield file_name, text
+
+# Extract text from PDF files, returned in upload order
+def extract_text_from_pdfs(files, max_workers=None):
+    results = sorted(iter_indexed_text_from_pdfs(files, max_workers), key=lambda result: result[0])
+    return [(file_name, text) for _, file_name, text in results]
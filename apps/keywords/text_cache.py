@@ -0,0 +1,252 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from apps.common.cache_dir import cache_path
+from apps.keywords.text_cleaning import CLEANER_VERSION
+
+# Size budget of the on-disk text cache (override with an environment variable)
+MAX_CACHE_MB = int(os.environ.get("TEXTVIZ_TEXT_CACHE_MB", "1024"))
+
+# Function to create a content-addressed key from the raw bytes of a file
+def create_content_key(data):
+    return hashlib.md5(data).hexdigest()
+
+# Function to name the cache entry holding text cleaned for a given language; text cleaned by older
+# cleaning rules is never served and ages out of the cache
+def cleaned_kind(selected_language):
+    return f"clean-v{CLEANER_VERSION}-{selected_language.lower()}"
+
+# Characters per chunk when a cached document is read back
+CHUNK_CHARS = 8 * 1024 * 1024
+
+# Subdirectory of the cache holding the entries pinned by running analyses (see PinnedEntries), and the
+# age after which the pins of a run that never finished (e.g. a killed process) are removed
+PINS_DIRECTORY = "pins"
+STALE_PIN_SECONDS = 2 * 86400
+
+# Function to read a text file in chunks of about chunk_chars characters that join back into the file.
+# Chunks end after a space so no word is cut; text with no space in a whole block is cut at the block,
+# which keeps every chunk under twice chunk_chars
+def iter_file_chunks(path, chunk_chars=CHUNK_CHARS):
+    with open(path, "r", encoding="utf-8") as handle:
+        leftover = ""
+        while True:
+            block = handle.read(chunk_chars)
+            if not block:
+                break
+            block = leftover + block
+            split_at = block.rfind(" ")  # leftover holds no space, so this is in the new block
+            if split_at < 0:
+                leftover = ""
+                yield block
+                continue
+            leftover = block[split_at + 1:]
+            yield block[:split_at + 1]
+        if leftover:
+            yield leftover
+
+# Size-bounded LRU cache of extracted and cleaned document text stored on disk
+class TextCache:
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or cache_path("text")
+        self.max_bytes = max_bytes if max_bytes is not None else MAX_CACHE_MB * 1024 * 1024
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key, kind="raw"):
+        return os.path.join(self.directory, key[:2], f"{key}.{kind}.txt")
+
+    # Return the cached text, or None on a miss; a hit refreshes the entry's LRU position
+    def get(self, key, kind="raw"):
+        path = self.path(key, kind)
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                text = handle.read()
+        except (FileNotFoundError, UnicodeDecodeError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return text
+
+    # Store text atomically so concurrent sessions never read a half-written entry; with pins, the entry
+    # is pinned before the eviction its size may cause
+    def put(self, key, text, kind="raw", pins=None):
+        path = self.path(key, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(handle, "w", encoding="utf-8") as temp_file:
+            temp_file.write(text)
+        os.replace(temp_path, path)
+        if pins is not None:
+            pins.pin(key, kind)
+        self.evict()
+
+    # Return True when an entry exists, refreshing its LRU position
+    def contains(self, key, kind="raw"):
+        try:
+            os.utime(self.path(key, kind))
+            return True
+        except OSError:
+            return False
+
+    # Read an entry in chunks (see iter_file_chunks)
+    def iter_chunks(self, key, kind="raw", chunk_chars=CHUNK_CHARS):
+        return iter_file_chunks(self.path(key, kind), chunk_chars)
+
+    # Pin the entries a run reads until it finishes: use as "with cache.pinned() as pins:"
+    def pinned(self):
+        return PinnedEntries(self)
+
+    # Write an entry piece by piece; pieces are joined with single spaces, and the entry
+    # only becomes visible once the writer is closed without error (pinned first, with pins)
+    def writer(self, key, kind="raw", pins=None):
+        return CacheEntryWriter(self, key, kind, pins)
+
+    # Remove least recently used entries until the cache fits in its size budget; pinned copies are
+    # neither counted nor removed
+    def evict(self):
+        entries = []
+        total_bytes = 0
+        for root, directory_names, file_names in os.walk(self.directory):
+            if root == self.directory and PINS_DIRECTORY in directory_names:
+                directory_names.remove(PINS_DIRECTORY)
+            for file_name in file_names:
+                if not file_name.endswith(".txt"):
+                    continue
+                path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_bytes += stat.st_size
+        if total_bytes <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue  # Removed by another process, or open on Windows
+            total_bytes -= size
+            if total_bytes <= self.max_bytes:
+                break
+
+# Streaming writer for one cache entry
+class CacheEntryWriter:
+    def __init__(self, cache, key, kind, pins=None):
+        self.cache = cache
+        self.key = key
+        self.kind = kind
+        self.pins = pins
+        self.path = cache.path(key, kind)
+        self.handle = None
+        self.temp_path = None
+        self.empty = True
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        handle, self.temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        self.handle = os.fdopen(handle, "w", encoding="utf-8")
+        return self
+
+    def write(self, text):
+        if not text:
+            return
+        if not self.empty:
+            self.handle.write(" ")
+        self.handle.write(text)
+        self.empty = False
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.handle.close()
+        if exc_type is not None:
+            os.remove(self.temp_path)
+            return False
+        os.replace(self.temp_path, self.path)
+        if self.pins is not None:
+            self.pins.pin(self.key, self.kind)
+        self.cache.evict()
+        return False
+
+# Hard links to the cache entries a run reads, in a directory of the cache that eviction skips. An entry
+# evicted while the run still needs it, by the run's own writes or by another process sharing the cache,
+# stays readable through its link until the run ends. Pinned entries may take the cache over its size
+# budget for as long as the run lasts
+class PinnedEntries:
+    def __init__(self, cache):
+        self.cache = cache
+        self.directory = None
+
+    def __enter__(self):
+        pins_root = os.path.join(self.cache.directory, PINS_DIRECTORY)
+        os.makedirs(pins_root, exist_ok=True)
+        remove_stale_pins(pins_root)
+        self.directory = tempfile.mkdtemp(dir=pins_root)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        return False
+
+    # Function to pin an entry, refreshing its LRU position; returns the path of its pinned copy, or None
+    # when the entry is not in the cache
+    def pin(self, key, kind="raw"):
+        link = os.path.join(self.directory, f"{key}.{kind}.txt")
+        if os.path.exists(link):
+            return link
+        path = self.cache.path(key, kind)
+        try:
+            os.utime(path)
+            os.link(path, link)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            try:
+                shutil.copyfile(path, link)  # File systems without hard links
+            except FileNotFoundError:
+                return None
+        return link
+
+    # Function to pin an entry and get it as a CachedDocument; returns None when it is not in the cache
+    def document(self, key, kind):
+        link = self.pin(key, kind)
+        return CachedDocument(link) if link is not None else None
+
+# Function to remove the pins left by runs that did not finish
+def remove_stale_pins(pins_root):
+    for name in os.listdir(pins_root):
+        path = os.path.join(pins_root, name)
+        try:
+            if time.time() - os.path.getmtime(path) > STALE_PIN_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            continue
+
+# Cleaned text of a document kept on disk (a pinned cache entry) and read back in chunks, so that large
+# files never have to be held in memory at once
+class CachedDocument:
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        return iter_file_chunks(self.path)
+
+# Function to iterate over the text of a document held either as a string or as chunks
+def iter_document_chunks(document):
+    if isinstance(document, str):
+        yield document
+    else:
+        yield from document
+
+# Shared cache instance for the current process
+_text_cache = None
+
+# Function to get the process-wide text cache
+def get_text_cache():
+    global _text_cache
+    if _text_cache is None:
+        _text_cache = TextCache()
+    return _text_cache
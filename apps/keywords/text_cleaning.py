@@ -0,0 +1,86 @@
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+
+# Version of the cleaning rules, part of the cache key of cleaned text; bump it whenever LANGUAGE_TABLE
+# or TextNormalizer change what a language's cleaned text looks like
+CLEANER_VERSION = 2
+
+# Characters kept for each language; every run of other characters (whitespace included)
+# collapses to a single space
+LANGUAGE_TABLE = {
+    "English": {"lowercase": True, "characters": "a-z"},
+    "French": {"lowercase": True, "characters": "a-zàâäéèêëîïôùûüç"},
+    "Spanish": {"lowercase": True, "characters": "a-záéíóúüñ"},
+    "Italian": {"lowercase": True, "characters": "a-zàèéìòù"},
+    "Portuguese": {"lowercase": True, "characters": "a-záàâãéêíóôõúç"},
+    "Chinese": {"lowercase": False, "characters": "\u4e00-\u9fff"},  # Remove non-Chinese characters
+    "Arabic": {"lowercase": False, "characters": "\u0600-\u06FF"},  # Remove non-Arabic characters
+}
+
+# Below this many characters a batch is cleaned in-process rather than in worker processes
+PARALLEL_MIN_CHARACTERS = 2_000_000
+
+# Chunks of a stream submitted ahead per worker process, which bounds the text held in memory
+PREFETCH_PER_WORKER = 2
+
+# Precompiled normalizer for one language: lowercasing, character filtering and
+# whitespace collapsing with a single regex pass
+class TextNormalizer:
+    def __init__(self, characters, lowercase=True):
+        self.lowercase = lowercase
+        self.pattern = re.compile(f"[^{characters}]+")
+
+    def __call__(self, text):
+        if self.lowercase:
+            text = text.lower()
+        return self.pattern.sub(" ", text).strip()
+
+# Normalizers are compiled once per process
+NORMALIZERS = {language: TextNormalizer(**settings) for language, settings in LANGUAGE_TABLE.items()}
+
+# Preprocessing function for different languages
+def clean_text(text, selected_language="English"):
+    normalizer = NORMALIZERS.get(selected_language)
+    if normalizer is None:
+        return text
+    return normalizer(text)
+
+# Function to clean a list of documents, spreading large batches across worker processes
+def clean_texts(texts, selected_language="English", max_workers=None):
+    texts = list(texts)
+    if len(texts) < 2 or sum(len(text) for text in texts) < PARALLEL_MIN_CHARACTERS:
+        return [clean_text(text, selected_language) for text in texts]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(clean_text, texts, repeat(selected_language)))
+
+# Function to clean a stream of text chunks, yielding (chunk, cleaned_chunk) pairs in order. Streams with
+# little text are cleaned in-process; larger ones share one pool of worker processes, with at most
+# PREFETCH_PER_WORKER chunks per worker read ahead of the consumer
+def iter_cleaned_chunks(chunks, selected_language="English", max_workers=None):
+    chunks = iter(chunks)
+    head = []
+    head_characters = 0
+    for chunk in chunks:
+        head.append(chunk)
+        head_characters += len(chunk)
+        if len(head) >= 2 and head_characters >= PARALLEL_MIN_CHARACTERS:
+            break
+    else:
+        for chunk in head:
+            yield chunk, clean_text(chunk, selected_language)
+        return
+
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chain(head, chunks):
+            pending.append((chunk, executor.submit(clean_text, chunk, selected_language)))
+            if len(pending) >= workers * PREFETCH_PER_WORKER:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
@@ -0,0 +1,148 @@
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+from wordcloud import WordCloud
+
+# The word layout is computed once at LAYOUT_SIZE and drawn at any multiple of it
+LAYOUT_SIZE = (1280, 720)
+PREVIEW_SIZE = (1280, 720)
+FULL_SIZE = (3840, 2160)  # 4K export
+
+# Name of the word cloud drawn from the whole corpus
+COMBINED_NAME = "All documents"
+
+# Bounded LRU dict, limited by number of items and optionally by total size in bytes
+class LRUCache:
+    def __init__(self, max_items, max_bytes=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, value):
+        with self.lock:
+            if key in self.items:
+                self.total_bytes -= self.size_of(self.items.pop(key))
+            self.items[key] = value
+            self.total_bytes += self.size_of(value)
+            while self.items and (len(self.items) > self.max_items or (self.max_bytes is not None and self.total_bytes > self.max_bytes)):
+                _, evicted = self.items.popitem(last=False)
+                self.total_bytes -= self.size_of(evicted)
+
+    def size_of(self, value):
+        return len(value) if isinstance(value, bytes) else 0
+
+_layouts = LRUCache(max_items=128)
+_images = LRUCache(max_items=256, max_bytes=64 * 1024 * 1024)
+
+# Function to turn a DataFrame column into a word -> frequency dict, dropping absent words
+def frequencies_from_df(df, column):
+    return {str(word): float(count) for word, count in zip(df['Features'], df[column]) if count > 0}
+
+# Function to list the word clouds of a result table: the combined corpus first, then one per document
+def frequencies_per_document(df):
+    file_columns = list(df.columns[1:])
+    combined = df[['Features']].assign(**{COMBINED_NAME: df[file_columns].sum(axis=1)})
+    items = [(COMBINED_NAME, frequencies_from_df(combined, COMBINED_NAME))]
+    items.extend((column, frequencies_from_df(df, column)) for column in file_columns)
+    return items
+
+# Function to hash a frequency dict so identical inputs share one rendered image
+def hash_frequencies(frequencies):
+    payload = json.dumps(sorted((str(word), float(count)) for word, count in frequencies.items()))
+    return hashlib.md5(payload.encode()).hexdigest()
+
+# Function to compute the word layout for a set of frequencies
+def build_wordcloud_layout(frequencies, colormap):
+    options = {"width": LAYOUT_SIZE[0], "height": LAYOUT_SIZE[1], "background_color": "white"}
+    if colormap:
+        options["colormap"] = colormap
+    return WordCloud(**options).generate_from_frequencies(frequencies)
+
+# Function to draw a word cloud layout straight to PNG bytes at the requested size
+def draw_wordcloud_png(layout, size):
+    scaled_layout = copy.copy(layout)  # Cached layouts are shared between sessions
+    scaled_layout.scale = size[0] / LAYOUT_SIZE[0]
+    image = scaled_layout.to_image()
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+# Function to compute a layout and draw it (runs in a worker process)
+def build_and_draw_wordcloud(frequencies, colormap, size):
+    layout = build_wordcloud_layout(frequencies, colormap)
+    return layout, draw_wordcloud_png(layout, size)
+
+# Function to render one uncached word cloud, reusing its layout when one is cached
+def render_uncached(frequencies, frequencies_hash, colormap, size, executor=None):
+    layout = _layouts.get((frequencies_hash, colormap))
+    submit = executor.submit if executor is not None else (lambda function, *args: function(*args))
+    if layout is not None:
+        return submit(draw_wordcloud_png, layout, size)
+    return submit(build_and_draw_wordcloud, frequencies, colormap, size)
+
+# Function to keep a freshly rendered layout and image for later requests
+def store_rendered(result, frequencies_hash, colormap, size):
+    if isinstance(result, tuple):
+        layout, png = result
+        _layouts.put((frequencies_hash, colormap), layout)
+    else:
+        png = result
+    # Export-sized images are streamed to the ZIP once; keeping them would hold megabytes per cloud
+    if size[0] * size[1] <= PREVIEW_SIZE[0] * PREVIEW_SIZE[1]:
+        _images.put((frequencies_hash, colormap, tuple(size)), png)
+    return png
+
+# Function to get a word cloud PNG, reusing the cached layout and preview when available
+def render_wordcloud_png(frequencies, colormap, size=PREVIEW_SIZE):
+    if not frequencies:
+        return None
+    frequencies_hash = hash_frequencies(frequencies)
+    png = _images.get((frequencies_hash, colormap, tuple(size)))
+    if png is None:
+        png = store_rendered(render_uncached(frequencies, frequencies_hash, colormap, size), frequencies_hash, colormap, size)
+    return png
+
+# Function to render many word clouds in a process pool, yielding (name, png) as each one finishes
+def iter_wordcloud_pngs(items, colormap, size=PREVIEW_SIZE, max_workers=None):
+    pending = OrderedDict()
+    for name, frequencies in items:
+        if not frequencies:
+            yield name, None
+            continue
+        frequencies_hash = hash_frequencies(frequencies)
+        png = _images.get((frequencies_hash, colormap, tuple(size)))
+        if png is not None:
+            yield name, png
+            continue
+        # Identical clouds (e.g. a single document and the combined corpus) are rendered once
+        pending.setdefault(frequencies_hash, (frequencies, []))[1].append(name)
+
+    if len(pending) == 1:
+        frequencies_hash, (frequencies, names) = next(iter(pending.items()))
+        png = store_rendered(render_uncached(frequencies, frequencies_hash, colormap, size), frequencies_hash, colormap, size)
+        for name in names:
+            yield name, png
+        return
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {render_uncached(frequencies, frequencies_hash, colormap, size, executor): (frequencies_hash, names)
+                       for frequencies_hash, (frequencies, names) in pending.items()}
+            for future in as_completed(futures):
+                frequencies_hash, names = futures.pop(future)
+                png = store_rendered(future.result(), frequencies_hash, colormap, size)
+                for name in names:
+                    yield name, png
@@ -0,0 +1,68 @@
+import io
+import os
+import re
+import tempfile
+import time
+import zipfile
+
+# Entries that are already compressed and are stored as-is instead of being deflated again
+STORED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".zip", ".gz")
+
+# Function to turn a file name into a safe, unique name for an entry of a ZIP file
+def output_stem(name, used_stems):
+    stem = re.sub(r"[^\w\-. ]", "_", os.path.splitext(os.path.basename(str(name)))[0]) or "document"
+    candidate, suffix = stem, 2
+    while candidate in used_stems:
+        candidate, suffix = f"{stem}_{suffix}", suffix + 1
+    used_stems.add(candidate)
+    return candidate
+
+# Function to build a payload that streams a DataFrame as CSV straight into a ZIP entry
+def csv_payload(df):
+    def write(stream):
+        text_stream = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        df.to_csv(text_stream, index=False)
+        text_stream.flush()
+        text_stream.detach()  # Leave closing the entry to the ZIP writer
+    return write
+
+# Function to write one artifact: payload is either bytes or a callable writing to a binary stream
+def write_zip_entry(zip_file, entry_name, payload):
+    info = zipfile.ZipInfo(entry_name, date_time=time.localtime(time.time())[:6])
+    info.external_attr = 0o644 << 16
+    info.compress_type = zipfile.ZIP_STORED if entry_name.lower().endswith(STORED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+    if callable(payload):
+        with zip_file.open(info, "w", force_zip64=True) as entry:
+            payload(entry)
+    else:
+        zip_file.writestr(info, payload)
+
+# Function to write (entry_name, payload) artifacts one at a time into a ZIP file on disk
+# and return its path; only the artifact being written is held in memory
+def write_zip_archive(artifacts, directory=None):
+    handle = tempfile.NamedTemporaryFile(prefix="textviz_", suffix=".zip", dir=directory, delete=False)
+    try:
+        with handle, zipfile.ZipFile(handle, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            for entry_name, payload in artifacts:
+                write_zip_entry(zip_file, entry_name, payload)
+    except BaseException:
+        os.remove(handle.name)
+        raise
+    return handle.name
+
+# Function to write (entry_name, payload) artifacts as files under a directory instead of a ZIP file;
+# each file is written under a temporary name and renamed once complete. Returns the entries written
+def write_artifact_files(artifacts, directory):
+    written = []
+    for entry_name, payload in artifacts:
+        path = os.path.join(directory, *entry_name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as output:
+            if callable(payload):
+                payload(output)
+            else:
+                output.write(payload)
+        os.replace(temp_path, path)
+        written.append(entry_name)
+    return written
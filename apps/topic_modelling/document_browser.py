@@ -0,0 +1,88 @@
+import math
+import os
+import numpy as np
+import streamlit as st
+from apps.common.static_downloads import display_download_link, new_download
+
+PAGE_SIZES = (25, 50, 100, 250)
+PREVIEW_CHARS = 200
+DOWNLOAD_CHUNK_ROWS = 50000
+
+# Columns holding lists per document; they are shown joined, and the representative documents of the
+# topic (repeated on every row) are left to the full download
+LIST_COLUMNS = ('Representation', 'Unique Keywords', 'GPT Topic Label', 'T2T Topic Label')
+DOWNLOAD_ONLY_COLUMNS = ('Representative_Docs',)
+
+# Function to select the documents matching the browser filters, as a boolean mask
+def filter_documents(doc_info_df, topics=None, min_probability=0.0, search=""):
+    mask = np.ones(len(doc_info_df), dtype=bool)
+    if topics:
+        mask &= doc_info_df["Topic"].isin(topics).to_numpy()
+    if min_probability > 0 and "Probability" in doc_info_df.columns:
+        mask &= (doc_info_df["Probability"].to_numpy() >= min_probability)
+    if search:
+        mask &= doc_info_df["Document"].str.contains(search, case=False, regex=False, na=False).to_numpy()
+    return mask
+
+# Function to build the rows of one page, with text previews and list columns joined
+def page_rows(doc_info_df, mask, page, page_size):
+    positions = np.flatnonzero(mask)[page * page_size:(page + 1) * page_size]
+    page_df = doc_info_df.iloc[positions].drop(columns=[col for col in DOWNLOAD_ONLY_COLUMNS if col in doc_info_df.columns])
+    page_df["Document"] = page_df["Document"].map(lambda text: text if len(text) <= PREVIEW_CHARS else text[:PREVIEW_CHARS] + "…")
+    for column in LIST_COLUMNS:
+        if column in page_df.columns:
+            page_df[column] = page_df[column].map(lambda values: ", ".join(value for value in values if value) if isinstance(values, (list, tuple)) else values)
+    return page_df
+
+# Function to write the complete document table to a CSV file, chunk by chunk
+def write_document_table_csv(doc_info_df, path, chunk_rows=DOWNLOAD_CHUNK_ROWS):
+    with open(path, "w", encoding="utf-8", newline="") as csv_file:
+        for start in range(0, len(doc_info_df), chunk_rows):
+            doc_info_df.iloc[start:start + chunk_rows].to_csv(csv_file, index=False, header=start == 0)
+
+# Function to write the complete document table where the static route serves it; returns its relative
+# URL and path. The file only appears under its final name once completely written
+def prepare_document_download(doc_info_df, file_name="document_topics.csv"):
+    url, path = new_download(file_name)
+    write_document_table_csv(doc_info_df, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    return url, path
+
+# Function to display the paginated document browser; only the visible page is sent to the browser
+def display_document_browser(doc_info_df, key="documents"):
+    filter_col, probability_col, search_col = st.columns([2, 1, 2])
+    with filter_col:
+        topics = st.multiselect("Filter by topic:", sorted(doc_info_df["Topic"].unique().tolist()), key=f"{key}_topics")
+    with probability_col:
+        min_probability = st.slider("Minimum probability:", 0.0, 1.0, 0.0, 0.05, key=f"{key}_probability") \
+            if "Probability" in doc_info_df.columns else 0.0
+    with search_col:
+        search = st.text_input("Search documents:", "", key=f"{key}_search")
+
+    mask = filter_documents(doc_info_df, topics, min_probability, search)
+    matches = int(mask.sum())
+    size_col, page_col, count_col = st.columns([1, 1, 2])
+    with size_col:
+        page_size = st.selectbox("Rows per page:", PAGE_SIZES, key=f"{key}_page_size")
+    page_count = max(math.ceil(matches / page_size), 1)
+    with page_col:
+        page = st.number_input("Page:", min_value=1, max_value=page_count, value=1, step=1, key=f"{key}_page")
+    with count_col:
+        st.write(f"{matches:,} of {len(doc_info_df):,} documents · page {min(page, page_count)} of {page_count}")
+
+    st.dataframe(page_rows(doc_info_df, mask, min(page, page_count) - 1, page_size))
+
+    # The complete table is written to disk only when asked for, and streamed from there by the static
+    # route; the link is kept through reruns until the table changes or the file expires
+    prepared = st.session_state.get(f"{key}_prepared")  # Not the button's key: widget keys cannot be set
+    if prepared is not None and (prepared["table"] != id(doc_info_df) or not os.path.exists(prepared["path"])):
+        prepared = None
+    if st.button("Prepare full table download", key=f"{key}_prepare"):
+        with st.spinner("Writing the document table..."):
+            url, path = prepare_document_download(doc_info_df)
+        prepared = {"table": id(doc_info_df), "url": url, "path": path}
+    st.session_state[f"{key}_prepared"] = prepared
+    if prepared is not None:
+        display_download_link(prepared["url"], prepared["path"], "Download document-topic table", "document_topics.csv",
+                              key=f"{key}_download")
+        st.caption("The download stays on the page until the table changes.")
@@ -0,0 +1,101 @@
+from apps.topic_modelling.model_registry import get_model_registry
+
+# Embedding backends offered in Text2Topics. Throughput is an approximate figure for short survey
+# answers on an 8-core CPU without a GPU; memory is the approximate resident size once loaded.
+EMBEDDING_BACKENDS = {
+    "minilm-l6-onnx-int8": {
+        "label": "MiniLM-L6, int8 ONNX (English, fastest)",
+        "model_name": "sentence-transformers/all-MiniLM-L6-v2",
+        "runtime": "onnx",
+        "onnx_file": "onnx/model_quint8_avx2.onnx",
+        "multilingual": False,
+        "parameters": "22M",
+        "docs_per_second": 2000,
+        "memory_mb": 150,
+    },
+    "minilm-l6": {
+        "label": "MiniLM-L6 (English)",
+        "model_name": "sentence-transformers/all-MiniLM-L6-v2",
+        "runtime": "torch",
+        "multilingual": False,
+        "parameters": "22M",
+        "docs_per_second": 1000,
+        "memory_mb": 300,
+    },
+    "mpnet-base": {
+        "label": "MPNet base (English, higher quality)",
+        "model_name": "sentence-transformers/all-mpnet-base-v2",
+        "runtime": "torch",
+        "multilingual": False,
+        "parameters": "110M",
+        "docs_per_second": 150,
+        "memory_mb": 700,
+    },
+    "multilingual-minilm-l12-onnx-int8": {
+        "label": "Multilingual MiniLM-L12, int8 ONNX (50+ languages, fastest)",
+        "model_name": "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+        "runtime": "onnx",
+        "onnx_file": "onnx/model_quint8_avx2.onnx",
+        "multilingual": True,
+        "parameters": "118M",
+        "docs_per_second": 900,
+        "memory_mb": 350,
+    },
+    "multilingual-minilm-l12": {
+        "label": "Multilingual MiniLM-L12 (50+ languages)",
+        "model_name": "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+        "runtime": "torch",
+        "multilingual": True,
+        "parameters": "118M",
+        "docs_per_second": 400,
+        "memory_mb": 800,
+    },
+    "sfr-embedding-2": {
+        "label": "SFR-Embedding-2_R (7B, GPU recommended)",
+        "model_name": "Salesforce/SFR-Embedding-2_R",
+        "runtime": "torch",
+        "multilingual": True,
+        "parameters": "7.1B",
+        "docs_per_second": 0.5,
+        "memory_mb": 29000,
+    },
+}
+
+# Function to list the backends that fit the selected language, fastest first
+def backend_options(language_option):
+    if language_option == "English":
+        return list(EMBEDDING_BACKENDS)
+    return [backend_id for backend_id, backend in EMBEDDING_BACKENDS.items() if backend["multilingual"]]
+
+# Function to format the cost of a backend for display next to the model picker
+def describe_backend(backend_id, n_docs=None):
+    backend = EMBEDDING_BACKENDS[backend_id]
+    memory = f"{backend['memory_mb'] / 1024:.1f} GB" if backend["memory_mb"] >= 1024 else f"{backend['memory_mb']} MB"
+    description = f"{backend['parameters']} parameters · ~{backend['docs_per_second']:g} docs/s on CPU · ~{memory} RAM"
+    if n_docs:
+        seconds = n_docs / backend["docs_per_second"]
+        estimate = f"{seconds / 3600:.1f} h" if seconds >= 3600 else f"{seconds / 60:.1f} min" if seconds >= 60 else f"{seconds:.0f} s"
+        description += f" · about {estimate} to embed {n_docs:,} new documents"
+    return description
+
+# Function to name the embedding store of a backend; quantized runtimes produce slightly different vectors
+def embedding_store_name(backend_id):
+    backend = EMBEDDING_BACKENDS[backend_id]
+    if backend["runtime"] == "onnx":
+        return f"{backend['model_name']}@{backend['onnx_file']}"
+    return backend["model_name"]
+
+# Function to load the SentenceTransformer behind a backend
+def load_embedding_backend(backend_id):
+    from sentence_transformers import SentenceTransformer
+    backend = EMBEDDING_BACKENDS[backend_id]
+    if backend["runtime"] == "onnx":
+        # Needs sentence-transformers >= 3.2 with optimum[onnxruntime]
+        return SentenceTransformer(backend["model_name"], backend="onnx", model_kwargs={"file_name": backend["onnx_file"]})
+    return SentenceTransformer(backend["model_name"])
+
+# Function to get (registering if needed) the model registry key of a backend
+def register_embedding_backend(backend_id):
+    key = f"embedding:{backend_id}"
+    get_model_registry().register(key, lambda: load_embedding_backend(backend_id))
+    return key
@@ -0,0 +1,68 @@
+import os
+import threading
+import numpy as np
+
+# Padded tokens processed per forward pass; batch sizes adapt so each batch stays near this budget
+TOKENS_PER_BATCH = int(os.environ.get("TEXTVIZ_TOKENS_PER_BATCH", "16384"))
+MIN_BATCH_SIZE = 1
+MAX_BATCH_SIZE = 256
+
+_threads_configured = False
+_threads_lock = threading.Lock()
+
+# Function to tune torch's intra-op and inter-op thread pools for CPU-only hosts (once per process)
+def configure_cpu_threads(num_threads=None, interop_threads=None):
+    global _threads_configured
+    import torch
+    with _threads_lock:
+        if _threads_configured or torch.cuda.is_available():
+            return
+        num_threads = num_threads or int(os.environ.get("TEXTVIZ_TORCH_THREADS", "0")) or os.cpu_count() or 1
+        torch.set_num_threads(num_threads)
+        try:
+            # One batch runs at a time, so a small inter-op pool avoids oversubscribing the cores
+            torch.set_num_interop_threads(interop_threads or max(1, min(4, num_threads // 4)))
+        except RuntimeError:
+            pass  # Torch only allows this before its first parallel operation
+        _threads_configured = True
+
+# Function to count the tokens of each document, as the model will see them after truncation
+def count_tokens(model, texts):
+    tokenizer = getattr(model, "tokenizer", None)
+    max_length = getattr(model, "max_seq_length", None) or 512
+    if tokenizer is None:
+        return [min(len(text.split()) * 4 // 3 + 2, max_length) for text in texts]
+    encoded = tokenizer(list(texts), add_special_tokens=True, truncation=True, max_length=max_length)
+    return [len(input_ids) for input_ids in encoded["input_ids"]]
+
+# Function to group documents into length buckets: documents are sorted by token length and each
+# batch takes as many documents as fit in the token budget at the length of its longest document
+def plan_batches(lengths, tokens_per_batch=TOKENS_PER_BATCH):
+    order = np.argsort(lengths, kind="stable")[::-1]
+    batches = []
+    start = 0
+    while start < len(order):
+        longest = max(int(lengths[order[start]]), 1)
+        batch_size = min(max(tokens_per_batch // longest, MIN_BATCH_SIZE), MAX_BATCH_SIZE)
+        batches.append(order[start:start + batch_size])
+        start += batch_size
+    return batches
+
+# Function to embed documents in length-bucketed batches, reporting (done, total) to progress_callback
+def encode_documents(model, texts, progress_callback=None, tokens_per_batch=TOKENS_PER_BATCH):
+    texts = list(texts)
+    configure_cpu_threads()
+    embeddings = None
+    done = 0
+    for batch in plan_batches(count_tokens(model, texts), tokens_per_batch):
+        vectors = model.encode([texts[position] for position in batch], batch_size=len(batch),
+                               show_progress_bar=False, convert_to_numpy=True)
+        if embeddings is None:
+            embeddings = np.zeros((len(texts), vectors.shape[1]), dtype=np.float32)
+        embeddings[batch] = vectors
+        done += len(batch)
+        if progress_callback is not None:
+            progress_callback(done, len(texts))
+    if embeddings is None:
+        return np.zeros((0, 0), dtype=np.float32)
+    return embeddings
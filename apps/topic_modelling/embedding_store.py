@@ -0,0 +1,124 @@
+import json
+import os
+import re
+import threading
+import numpy as np
+from apps.common.cache_dir import cache_path
+
+# File locks keep several server processes from appending to the same store at once
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# On-disk store of document embeddings for one model: an append-only float16 matrix that is
+# memory-mapped for reading, plus a doc_id index with one line per matrix row
+class EmbeddingStore:
+    def __init__(self, model_name, directory=None):
+        self.model_name = model_name
+        self.directory = directory or cache_path("embeddings", re.sub(r"[^\w\-.]", "_", model_name))
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors_path = os.path.join(self.directory, "vectors.f16")
+        self.index_path = os.path.join(self.directory, "doc_ids.txt")
+        self.meta_path = os.path.join(self.directory, "meta.json")
+        self.lock = threading.Lock()
+        self.index = {}
+        self.dimension = None
+        self.rows = 0
+        self.reload()
+
+    def read_meta(self):
+        if self.dimension is None and os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as meta_file:
+                self.dimension = json.load(meta_file)["dimension"]
+
+    # Function to read the doc_ids of the rows stored in both files. Vectors are appended before their
+    # doc_ids, so a writer that died in between leaves vector rows without a doc_id, or an unfinished
+    # last line; neither counts
+    def read_doc_ids(self):
+        if self.dimension is None or not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path, "rb") as index_file:
+            lines = index_file.read().split(b"\n")[:-1]
+        stored_rows = os.path.getsize(self.vectors_path) // (2 * self.dimension) if os.path.exists(self.vectors_path) else 0
+        return [line.decode("utf-8") for line in lines[:stored_rows]]
+
+    def set_index(self, doc_ids):
+        self.rows = len(doc_ids)
+        self.index = {doc_id: row for row, doc_id in enumerate(doc_ids)}
+
+    # Read the index and matrix shape written so far (possibly by another process)
+    def reload(self):
+        with self.lock:
+            self.read_meta()
+            self.set_index(self.read_doc_ids())
+
+    def __len__(self):
+        return self.rows
+
+    def __contains__(self, doc_id):
+        return doc_id in self.index
+
+    # Function to read the stored embeddings of known doc_ids as a float32 matrix
+    def read(self, doc_ids):
+        rows = np.fromiter((self.index[doc_id] for doc_id in doc_ids), dtype=np.int64, count=len(doc_ids))
+        if len(rows) == 0:
+            return np.zeros((0, self.dimension or 0), dtype=np.float32)
+        vectors = np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(self.rows, self.dimension))
+        return np.asarray(vectors[rows], dtype=np.float32)
+
+    # Function to append new embeddings; doc_ids already stored, by this or another process, are skipped.
+    # Under the file lock, the files are first cut back to the rows a crashed writer completed, so every
+    # doc_id keeps pointing at its own vector
+    def add(self, doc_ids, embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float16)
+        with self.lock, open(self.vectors_path, "ab") as vectors_file:
+            if fcntl is not None:
+                fcntl.flock(vectors_file, fcntl.LOCK_EX)
+            try:
+                self.read_meta()
+                if self.dimension is None:
+                    self.dimension = int(embeddings.shape[1])
+                    with open(f"{self.meta_path}.tmp", "w", encoding="utf-8") as meta_file:
+                        json.dump({"model_name": self.model_name, "dimension": self.dimension}, meta_file)
+                    os.replace(f"{self.meta_path}.tmp", self.meta_path)
+                stored_doc_ids = self.read_doc_ids()
+                self.set_index(stored_doc_ids)
+                vectors_file.truncate(len(stored_doc_ids) * 2 * self.dimension)
+                with open(self.index_path, "ab") as index_file:
+                    index_file.truncate(sum(len(doc_id.encode("utf-8")) + 1 for doc_id in stored_doc_ids))
+
+                new_rows = [position for position, doc_id in enumerate(doc_ids) if doc_id not in self.index]
+                new_rows = list({doc_ids[position]: position for position in new_rows}.values())  # One row per doc_id
+                if not new_rows:
+                    return
+                vectors_file.write(np.ascontiguousarray(embeddings[new_rows]).tobytes())
+                vectors_file.flush()
+                with open(self.index_path, "ab") as index_file:
+                    index_file.write("".join(f"{doc_ids[position]}\n" for position in new_rows).encode("utf-8"))
+                self.set_index(stored_doc_ids + [doc_ids[position] for position in new_rows])
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(vectors_file, fcntl.LOCK_UN)
+
+    # Function to get embeddings for every document, encoding only the ones not stored yet
+    def get_embeddings(self, doc_ids, texts, encode):
+        doc_ids = list(doc_ids)
+        missing = {}
+        for doc_id, text in zip(doc_ids, texts):
+            if doc_id not in self.index and doc_id not in missing:
+                missing[doc_id] = text
+        if missing:
+            self.add(list(missing.keys()), encode(list(missing.values())))
+        return self.read(doc_ids)
+
+# One store per embedding model for the current process
+_stores = {}
+_stores_lock = threading.Lock()
+
+# Function to get the process-wide embedding store of a model
+def get_embedding_store(model_name):
+    with _stores_lock:
+        if model_name not in _stores:
+            _stores[model_name] = EmbeddingStore(model_name)
+        return _stores[model_name]
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from apps.common.cache_dir import cache_path
+
+# Function to hash the representative documents of a topic
+def hash_documents(documents):
+    digest = hashlib.md5()
+    for document in documents or []:
+        digest.update(document.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+# Function to build the cache key of a topic label from the labeler, its prompt template, the topic
+# keywords and its representative documents
+def label_cache_key(labeler, template, keywords, documents):
+    payload = json.dumps([labeler, template, list(keywords), hash_documents(documents)])
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+# On-disk cache of generated topic labels, one small file per label, with an in-memory copy
+class LabelCache:
+    def __init__(self, directory=None):
+        self.directory = directory or cache_path("topic_labels")
+        self.memory = {}
+        self.lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.txt")
+
+    # Return the cached label, or None on a miss
+    def get(self, key):
+        with self.lock:
+            if key in self.memory:
+                return self.memory[key]
+        try:
+            with open(self.path(key), "r", encoding="utf-8") as handle:
+                label = handle.read()
+        except (FileNotFoundError, UnicodeDecodeError):
+            return None
+        with self.lock:
+            self.memory[key] = label
+        return label
+
+    # Store a label atomically so concurrent sessions never read a half-written entry
+    def put(self, key, label):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(handle, "w", encoding="utf-8") as temp_file:
+            temp_file.write(label)
+        os.replace(temp_path, path)
+        with self.lock:
+            self.memory[key] = label
+
+_label_cache = None
+_label_cache_lock = threading.Lock()
+
+# Function to get the process-wide label cache
+def get_label_cache():
+    global _label_cache
+    with _label_cache_lock:
+        if _label_cache is None:
+            _label_cache = LabelCache()
+        return _label_cache
+
+# Function to get the keywords and representative documents each labeler describes a topic with
+def topic_label_inputs(topic_model, topic):
+    keywords = [word for word, _ in topic_model.get_topic(topic) or []]
+    documents = topic_model.get_representative_docs(topic) or []
+    return keywords, documents
+
+# Function to store labels as a topic aspect, in the format of BERTopic's own label representations,
+# so they show up in get_topic_info and are saved with the model
+def set_topic_labels(topic_model, aspect, labels):
+    if not getattr(topic_model, "topic_aspects_", None):
+        topic_model.topic_aspects_ = {}
+    topic_model.topic_aspects_[aspect] = {topic: [(label, 1)] + [("", 0)] * 9 for topic, label in labels.items()}
@@ -0,0 +1,45 @@
+import os
+from apps.topic_modelling.label_cache import get_label_cache, label_cache_key, set_topic_labels, topic_label_inputs
+from apps.topic_modelling.model_registry import get_model_registry, register_text2text_pipeline
+
+# Local label model and generation settings (override with environment variables)
+LOCAL_LABEL_MODEL = os.environ.get("TEXTVIZ_LOCAL_LABEL_MODEL", "google/flan-t5-base")
+LABEL_BATCH_SIZE = int(os.environ.get("TEXTVIZ_LABEL_BATCH_SIZE", "32"))
+MAX_LABEL_TOKENS = 16
+
+LABEL_PROMPT = "I have a topic described by the following keywords: [KEYWORDS]. Based on the previous keywords, tell me in few words what is this topic about?"
+
+# Function to generate labels for many prompts in padded batches, with greedy decoding and a token cap
+def generate_labels(generator, prompts, batch_size=LABEL_BATCH_SIZE, max_new_tokens=MAX_LABEL_TOKENS):
+    outputs = generator(list(prompts), batch_size=batch_size, max_new_tokens=max_new_tokens,
+                        do_sample=False, num_beams=1)
+    return [output[0]["generated_text"].replace(prompt, "").strip() if isinstance(output, list) else
+            output["generated_text"].replace(prompt, "").strip()
+            for prompt, output in zip(prompts, outputs)]
+
+# Function to label every topic of a fitted model with the local text2text model. Labels are memoized by
+# model, prompt template and keywords, so after a merge or update_topics only topics whose keywords changed
+# are generated, and the model is only loaded when some label is missing. The labels are stored as the
+# "T2T Topic Label" aspect
+def label_topics_locally(topic_model, model_name=LOCAL_LABEL_MODEL, template=LABEL_PROMPT, cache=None):
+    cache = cache or get_label_cache()
+    labels = {}
+    pending = {}
+    for topic in sorted(topic_model.get_topics()):
+        keywords, _ = topic_label_inputs(topic_model, topic)
+        key = label_cache_key(f"text2text:{model_name}", template, keywords, [])
+        label = cache.get(key)
+        if label is not None:
+            labels[topic] = label
+        else:
+            pending[topic] = (key, template.replace("[KEYWORDS]", ", ".join(keywords)))
+
+    if pending:
+        with get_model_registry().use(register_text2text_pipeline(model_name)) as generator:
+            generated = generate_labels(generator, [prompt for _, prompt in pending.values()])
+        for (topic, (key, _)), label in zip(pending.items(), generated):
+            labels[topic] = label
+            cache.put(key, label)
+
+    set_topic_labels(topic_model, "T2T Topic Label", labels)
+    return labels
@@ -0,0 +1,146 @@
+import gc
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+# Models nobody is using are dropped after this many idle seconds (override with an environment variable)
+IDLE_SECONDS = int(os.environ.get("TEXTVIZ_MODEL_IDLE_SECONDS", "1800"))
+SWEEP_SECONDS = 60
+
+# Function to build the registry key of a sentence-transformers embedding model
+def sentence_transformer_key(model_name):
+    return f"sentence-transformer:{model_name}"
+
+# Function to build the registry key of a Hugging Face text2text generation pipeline
+def text2text_key(model_name):
+    return f"text2text:{model_name}"
+
+# Function to load a sentence-transformers model
+def load_sentence_transformer(model_name, **kwargs):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, **kwargs)
+
+# Function to load a text2text generation pipeline
+def load_text2text_pipeline(model_name):
+    from transformers import pipeline
+    return pipeline('text2text-generation', model=model_name)
+
+# Process-wide registry that loads each model once, counts the sessions using it and
+# drops models that have been idle for too long
+class ModelRegistry:
+    def __init__(self, idle_seconds=IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self.loaders = {}
+        self.models = {}
+        self.references = {}
+        self.last_used = {}
+        self.evicted = {}  # Weak references to evicted models still held elsewhere (e.g. a fitted BERTopic)
+        self.lock = threading.RLock()
+        self.load_locks = {}
+        self.sweeper = None
+
+    # Register how to load a model; nothing is loaded until the model is first acquired
+    def register(self, key, loader):
+        with self.lock:
+            self.loaders.setdefault(key, loader)
+            self.load_locks.setdefault(key, threading.Lock())
+
+    def is_loaded(self, key):
+        with self.lock:
+            return key in self.models
+
+    # Get a model, loading it on first use, and count one more user of it
+    def acquire(self, key):
+        with self.lock:
+            if key not in self.loaders:
+                raise KeyError(f"No loader registered for model '{key}'")
+            load_lock = self.load_locks[key]
+        # Loading happens outside the registry lock so other models stay available meanwhile
+        with load_lock:
+            with self.lock:
+                model = self.models.get(key)
+                if model is None and key in self.evicted:
+                    model = self.evicted.pop(key)()
+                    if model is not None:
+                        self.models[key] = model
+            if model is None:
+                model = self.loaders[key]()
+                with self.lock:
+                    self.models[key] = model
+            with self.lock:
+                self.references[key] = self.references.get(key, 0) + 1
+                self.last_used[key] = time.monotonic()
+        self.start_sweeper()
+        return model
+
+    # Count one user less; the model stays loaded until it has been idle for idle_seconds
+    def release(self, key):
+        with self.lock:
+            if self.references.get(key, 0) > 0:
+                self.references[key] -= 1
+            self.last_used[key] = time.monotonic()
+
+    @contextmanager
+    def use(self, key):
+        model = self.acquire(key)
+        try:
+            yield model
+        finally:
+            self.release(key)
+
+    # Drop models nobody has used for idle_seconds
+    def evict_idle(self):
+        now = time.monotonic()
+        evicted = False
+        with self.lock:
+            for key in list(self.models):
+                if self.references.get(key, 0) == 0 and now - self.last_used.get(key, now) > self.idle_seconds:
+                    model = self.models.pop(key)
+                    try:
+                        self.evicted[key] = weakref.ref(model)
+                    except TypeError:
+                        pass
+                    del model
+                    evicted = True
+        if evicted:
+            gc.collect()
+        return evicted
+
+    # Background thread that sweeps idle models even when no session is active
+    def start_sweeper(self):
+        with self.lock:
+            if self.sweeper is not None:
+                return
+            self.sweeper = threading.Thread(target=self.sweep_forever, name="model-registry-sweeper", daemon=True)
+            self.sweeper.start()
+
+    def sweep_forever(self):
+        while True:
+            time.sleep(SWEEP_SECONDS)
+            self.evict_idle()
+
+# Shared registry for the current process; Streamlit sessions run as threads of one process
+_registry = None
+_registry_lock = threading.Lock()
+
+# Function to get the process-wide model registry
+def get_model_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
+
+# Function to get (registering if needed) the registry key of a sentence-transformers model
+def register_sentence_transformer(model_name, **kwargs):
+    key = sentence_transformer_key(model_name)
+    get_model_registry().register(key, lambda: load_sentence_transformer(model_name, **kwargs))
+    return key
+
+# Function to get (registering if needed) the registry key of a text2text generation pipeline
+def register_text2text_pipeline(model_name):
+    key = text2text_key(model_name)
+    get_model_registry().register(key, lambda: load_text2text_pipeline(model_name))
+    return key
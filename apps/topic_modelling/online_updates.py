@@ -0,0 +1,115 @@
+from collections import Counter
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from apps.topic_modelling.topic_merging import get_topic_term_counts, refresh_aspects, representative_docs, top_words
+from apps.topic_modelling.topic_pipeline import get_stage_cache
+
+MAX_NEW_REPRESENTATIVE_CANDIDATES = 500  # New documents per topic considered as representative documents
+
+# Function to keep the documents of a batch whose doc_id is not in the model yet, once each
+def deduplicate_batch(documents_df, batch_df):
+    batch_df = batch_df[~batch_df["doc_id"].isin(set(documents_df["doc_id"]))]
+    return batch_df.drop_duplicates("doc_id").reset_index(drop=True)
+
+# Function to assign new documents to the topics of a fitted model, through the UMAP and HDBSCAN stages
+# it was fitted with (HDBSCAN's approximate_predict) when they are still cached, otherwise to the topic
+# with the most similar topic embedding. Returns the topics and the probability of each assignment
+def assign_topics(topic_model, embeddings, stage_keys):
+    cache = get_stage_cache()
+    umap_model = cache.load_model("umap", stage_keys["umap"]) if stage_keys.get("umap") else None
+    hdbscan_model = cache.load_model("hdbscan", stage_keys["hdbscan"]) if stage_keys.get("hdbscan") else None
+    if umap_model is not None and hdbscan_model is not None:
+        import hdbscan
+        labels, strengths = hdbscan.approximate_predict(hdbscan_model, umap_model.transform(embeddings))
+        mapping = topic_model.topic_mapper_.get_mappings(original_topics=True)  # Includes later merges
+        return np.array([mapping.get(int(label), -1) for label in labels]), np.asarray(strengths, dtype=float)
+
+    from sklearn.metrics.pairwise import cosine_similarity
+    order = sorted(set(topic_model.topics_))
+    topics = [topic for topic in order if topic != -1]
+    similarity = cosine_similarity(embeddings, np.asarray(topic_model.topic_embeddings_)[[order.index(topic) for topic in topics]])
+    return np.array(topics)[similarity.argmax(axis=1)], similarity.max(axis=1)
+
+# Function to append probability rows for new documents, holding the probability of the assigned topic
+def append_probabilities(probabilities, topics, strengths):
+    if probabilities is None:
+        return None
+    if np.ndim(probabilities) == 1:
+        return np.concatenate([probabilities, strengths])
+    assigned = np.flatnonzero((topics >= 0) & (topics < probabilities.shape[1]))  # One column per topic, outliers excluded
+    new_rows = sp.csr_matrix((strengths[assigned], (assigned, topics[assigned])), shape=(len(topics), probabilities.shape[1]))
+    if sp.issparse(probabilities):
+        return sp.vstack([probabilities, new_rows], format="csr")
+    return np.vstack([probabilities, new_rows.toarray()])
+
+# Function to add a batch of new documents to a fitted model in place, without refitting: documents are
+# assigned to the existing topics, and c-TF-IDF rows, representations, aspects, topic embeddings and
+# representative documents are refreshed only for topics that received documents. The vocabulary and
+# idf weights stay those of the original fit. Returns the documents of the updated model and the
+# topics that changed
+def update_topic_model(topic_model, documents_df, batch_df, embeddings, stage_keys, outlier_threshold=None):
+    batch_texts = batch_df["text"].tolist()
+    batch_topics, strengths = assign_topics(topic_model, embeddings, stage_keys)
+    if outlier_threshold is not None and (batch_topics == -1).any():
+        # Same outlier reduction as the original fit, on the new documents only
+        batch_topics = topic_model.reduce_outliers(batch_texts, batch_topics.tolist(), strategy="c-tf-idf", threshold=outlier_threshold)
+        batch_topics = np.asarray(topic_model.reduce_outliers(batch_texts, batch_topics, strategy="distributions"))
+
+    old_topics = np.asarray(topic_model.topics_)
+    old_order = sorted(set(old_topics))
+    counts = get_topic_term_counts(topic_model, documents_df["text"].tolist())
+    new_order = sorted(set(old_order) | set(batch_topics.tolist()))
+    new_rows = {topic: row for row, topic in enumerate(new_order)}
+    old_rows = {topic: row for row, topic in enumerate(old_order)}
+
+    # Term counts of the batch, grouped per topic as BERTopic does, added to the kept per-topic counts
+    batch_per_topic = pd.Series(batch_texts).groupby(batch_topics).agg(" ".join)
+    changed = batch_per_topic.index.tolist()
+    expand = sp.csr_matrix((np.ones(len(old_order)), ([new_rows[topic] for topic in old_order], range(len(old_order)))),
+                           shape=(len(new_order), len(old_order)))
+    place = sp.csr_matrix((np.ones(len(changed)), ([new_rows[topic] for topic in changed], range(len(changed)))),
+                          shape=(len(new_order), len(changed)))
+    new_counts = sp.csr_matrix(expand @ counts + place @ topic_model.vectorizer_model.transform(batch_per_topic.tolist()))
+
+    changed_ctfidf = {topic: sp.csr_matrix(topic_model.ctfidf_model.transform(new_counts[new_rows[topic]].copy().astype(float)))
+                      for topic in changed}
+    old_ctfidf = sp.csr_matrix(topic_model.c_tf_idf_)
+    topic_model.c_tf_idf_ = sp.vstack([changed_ctfidf[topic] if topic in changed_ctfidf else old_ctfidf[old_rows[topic]]
+                                       for topic in new_order], format="csr")
+    topic_model.ctfidf_model.topic_term_counts_ = new_counts
+
+    # Topic embeddings: running mean over the old and new documents of each changed topic
+    old_sizes = Counter(old_topics.tolist())
+    if topic_model.topic_embeddings_ is not None and len(topic_model.topic_embeddings_) == len(old_order):
+        old_embeddings = np.asarray(topic_model.topic_embeddings_)
+        topic_embeddings = np.zeros((len(new_order), old_embeddings.shape[1]))
+        for topic in new_order:
+            mask = batch_topics == topic
+            total = old_embeddings[old_rows[topic]] * old_sizes[topic] if topic in old_rows else 0
+            topic_embeddings[new_rows[topic]] = (total + embeddings[mask].sum(axis=0)) / max(old_sizes[topic] + mask.sum(), 1)
+        topic_model.topic_embeddings_ = topic_embeddings
+
+    # Main representation and representative documents of the changed topics
+    if topic_model.representative_docs_ is None:
+        topic_model.representative_docs_ = {}
+    words = topic_model.vectorizer_model.get_feature_names_out()
+    for topic in changed:
+        topic_model.topic_representations_[topic] = top_words(changed_ctfidf[topic], words, topic_model.top_n_words)
+        new_candidates = [text for text, batch_topic in zip(batch_texts, batch_topics) if batch_topic == topic]
+        candidates = topic_model.representative_docs_.get(topic, []) + new_candidates[:MAX_NEW_REPRESENTATIVE_CANDIDATES]
+        topic_model.representative_docs_[topic] = representative_docs(topic_model, candidates, changed_ctfidf[topic])
+        topic_model.topic_labels_[topic] = f"{topic}_" + "_".join(word for word, _ in topic_model.topic_representations_[topic][:4])
+    topic_model.topic_representations_ = dict(sorted(topic_model.topic_representations_.items()))
+
+    # Document assignments, sizes and probabilities
+    all_topics = np.concatenate([old_topics, batch_topics])
+    topic_model.topics_ = all_topics.tolist()
+    topic_model.topic_sizes_ = Counter(topic_model.topics_)
+    topic_model.probabilities_ = append_probabilities(topic_model.probabilities_, batch_topics, strengths)
+
+    all_documents_df = pd.concat([documents_df[["doc_id", "text"]], batch_df[["doc_id", "text"]]], ignore_index=True)
+    carried = {topic: topic for topic in new_order if topic not in changed_ctfidf}
+    refresh_aspects(topic_model, all_documents_df["text"].to_numpy(dtype=object), all_topics, changed_ctfidf,
+                    topic_model.topic_representations_, carried)
+    return all_documents_df, changed
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import random
+import time
+from apps.topic_modelling.label_cache import get_label_cache, label_cache_key, set_topic_labels, topic_label_inputs
+
+# Model, concurrency and rate limits of the labeling requests (override with environment variables)
+OPENAI_MODEL = os.environ.get("TEXTVIZ_OPENAI_MODEL", "gpt-4o")
+MAX_CONCURRENCY = int(os.environ.get("TEXTVIZ_OPENAI_CONCURRENCY", "8"))
+REQUESTS_PER_MINUTE = float(os.environ.get("TEXTVIZ_OPENAI_RPM", "500"))
+TOKENS_PER_MINUTE = float(os.environ.get("TEXTVIZ_OPENAI_TPM", "30000"))
+# OpenAI-compatible server used when no base_url is given. It is server configuration only: the API key
+# is sent to this host, so it is never taken from the page
+OPENAI_BASE_URL = os.environ.get("TEXTVIZ_OPENAI_BASE_URL") or None
+BURST_SECONDS = 10  # The buckets start full with this many seconds of budget
+MAX_RETRIES = 5
+MAX_BACKOFF_SECONDS = 60
+MAX_LABEL_TOKENS = 32
+MAX_DOC_CHARS = 1000  # Representative documents are cut to this length in prompts
+
+LABEL_PROMPT = """
+I have a topic that contains the following documents:
+[DOCUMENTS]
+The topic is described by the following keywords: [KEYWORDS]
+
+Based on the information above, extract a short topic label in the following format:
+topic: <topic label>
+"""
+
+# Token bucket rate limiter: holds up to capacity tokens, refilled at rate tokens per second
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    # Wait until amount tokens are available and take them; waiters are served in order
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+# Function to fill the prompt template of a topic, as BERTopic's OpenAI representation does
+def build_prompt(template, keywords, documents):
+    documents_text = "".join(f"- {document[:MAX_DOC_CHARS]}\n" for document in documents)
+    return template.replace("[KEYWORDS]", ", ".join(keywords)).replace("[DOCUMENTS]", documents_text)
+
+# Function to roughly estimate the tokens a request uses, for the tokens-per-minute bucket
+def estimate_tokens(prompt):
+    return len(prompt) // 4 + MAX_LABEL_TOKENS
+
+def parse_label(content):
+    return (content or "").strip().replace("topic: ", "")
+
+# Function to pick how long to wait before retrying: the server's Retry-After when given,
+# otherwise exponential backoff with jitter
+def retry_delay(error, attempt):
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return min(float(retry_after), MAX_BACKOFF_SECONDS)
+    except (TypeError, ValueError):
+        return min(2 ** attempt, MAX_BACKOFF_SECONDS) * (0.5 + random.random() / 2)
+
+# Function to request the label of one prompt, retrying rate limits, timeouts and server errors
+async def request_label(client, prompt, model, request_bucket, token_bucket, semaphore):
+    import openai
+    for attempt in range(MAX_RETRIES + 1):
+        await request_bucket.acquire()
+        await token_bucket.acquire(estimate_tokens(prompt))
+        async with semaphore:
+            try:
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=MAX_LABEL_TOKENS
+                )
+                return parse_label(response.choices[0].message.content)
+            except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) as error:
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = retry_delay(error, attempt)
+        await asyncio.sleep(delay)
+
+# Function to label many prompts concurrently; returns a label or the exception raised, per prompt.
+# base_url points the client at any OpenAI-compatible server, e.g. a local stand-in for testing (by default
+# OPENAI_BASE_URL)
+async def label_prompts(prompts, api_key, base_url=None, model=OPENAI_MODEL, max_concurrency=MAX_CONCURRENCY,
+                        requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE):
+    from openai import AsyncOpenAI
+    client = AsyncOpenAI(api_key=api_key, base_url=base_url or OPENAI_BASE_URL, max_retries=0)  # Retries are handled by request_label
+    request_bucket = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60 * BURST_SECONDS))
+    token_bucket = TokenBucket(tokens_per_minute / 60, max(1.0, tokens_per_minute / 60 * BURST_SECONDS))
+    semaphore = asyncio.Semaphore(max_concurrency)
+    try:
+        return await asyncio.gather(
+            *(request_label(client, prompt, model, request_bucket, token_bucket, semaphore) for prompt in prompts),
+            return_exceptions=True
+        )
+    finally:
+        await client.close()
+
+# Function to label every topic of a fitted model with OpenAI; labels are cached by prompt template,
+# keywords and representative documents, so only new or changed topics are sent. The labels are stored
+# as the "GPT Topic Label" aspect; returns the labels and the errors of topics that could not be labeled
+def label_topics_with_openai(topic_model, api_key, base_url=None, model=OPENAI_MODEL, template=LABEL_PROMPT, cache=None):
+    cache = cache or get_label_cache()
+    labels = {}
+    pending = {}
+    for topic in sorted(topic_model.get_topics()):
+        keywords, documents = topic_label_inputs(topic_model, topic)
+        key = label_cache_key(f"openai:{model}", template, keywords, documents)
+        label = cache.get(key)
+        if label is not None:
+            labels[topic] = label
+        else:
+            pending[topic] = (key, build_prompt(template, keywords, documents))
+
+    errors = {}
+    if pending:
+        results = asyncio.run(label_prompts([prompt for _, prompt in pending.values()], api_key, base_url, model))
+        for (topic, (key, _)), result in zip(pending.items(), results):
+            if isinstance(result, Exception):
+                labels[topic] = ""
+                errors[topic] = result
+            else:
+                labels[topic] = result
+                cache.put(key, result)
+
+    set_topic_labels(topic_model, "GPT Topic Label", labels)
+    return labels, errors
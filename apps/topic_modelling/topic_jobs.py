@@ -0,0 +1,48 @@
+from apps.common.csv_reader import read_csv_columns, read_texts_with_ids
+from apps.topic_modelling.embedding_backends import register_embedding_backend
+from apps.topic_modelling.model_registry import get_model_registry
+from apps.topic_modelling.topic_pipeline import read_model_metadata
+from apps.topic_modelling.topic_runner import embed_documents, fit_topic_model, label_topics, update_saved_model, write_topic_outputs
+
+# Function to fit a topic model as a background job (see apps.common.jobs) on the uploaded CSV in
+# params["inputs"], with the settings in params["settings"]; with params["update_model_id"], the new
+# documents of the CSV are added to that saved model instead. The model is saved under its ID, which the
+# page loads once the job is done, and the topic and document tables are written to the job directory
+def run_topic_job(params, secrets, directory, progress):
+    csv_path = params["inputs"][0]
+    if 'text' not in read_csv_columns(csv_path):
+        raise ValueError("The CSV file must contain a 'text' column.")
+    documents_df = read_texts_with_ids(csv_path)[['doc_id', 'text']]
+    update_model_id = params.get("update_model_id")
+    settings = read_model_metadata(update_model_id)["settings"] if update_model_id else params["settings"]
+    messages = []
+
+    def log(message):
+        messages.append(message)
+        progress(None, message)
+
+    def labeler(topic_model):
+        progress(0.85, "Generating topic labels...")
+        errors = label_topics(topic_model, api_key=secrets.get("api_key"))
+        if errors:
+            messages.append(f"{len(errors)} topics could not be labeled: {next(iter(errors.values()))}")
+        return errors
+
+    # Worker processes keep their models loaded in their own registry between jobs
+    with get_model_registry().use(register_embedding_backend(settings["embedding_backend"])) as model:
+        if update_model_id:
+            progress(0.0, "Embedding new documents...")
+            topic_model, documents_df, model_id = update_saved_model(update_model_id, documents_df, model, labeler=labeler, log=log,
+                                                                     progress_callback=lambda done, total: progress(0.5 * done / total))
+        else:
+            progress(0.0, "Embedding documents...")
+            embeddings = embed_documents(settings["embedding_backend"], model, documents_df['doc_id'].tolist(), documents_df['text'].tolist(),
+                                         lambda done, total: progress(0.5 * done / total))
+            progress(0.5, "Running topic model...")
+            topic_model, model_id = fit_topic_model(settings, documents_df, embeddings, model, labeler=labeler, log=log)
+
+    if model_id is None:
+        return {"model_id": None, "messages": messages, "files": []}  # Nothing new to add to the saved model
+    progress(0.95, "Writing topic tables...")
+    files = write_topic_outputs(topic_model, documents_df, directory)
+    return {"model_id": model_id, "messages": messages, "files": files}
@@ -0,0 +1,169 @@
+from collections import Counter
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from bertopic.vectorizers import ClassTfidfTransformer
+from apps.topic_modelling.topic_pipeline import map_probability_columns
+
+NR_REPRESENTATIVE_DOCS = 3  # As saved by BERTopic
+
+# c-TF-IDF transformer that keeps the per-topic term counts it was last fitted on (BERTopic fits it on
+# the counts of every topic, during fitting and every update_topics), so merges can reuse them
+class TermCountingClassTfidfTransformer(ClassTfidfTransformer):
+    def fit(self, X, multiplier=None):
+        self.topic_term_counts_ = sp.csr_matrix(X, copy=True)
+        return super().fit(X, multiplier)
+
+# Function to get the topic ids in c-TF-IDF row order (sorted, outliers first)
+def topic_row_order(topic_model):
+    return sorted(set(topic_model.topics_))
+
+# Function to get the per-topic term counts, vectorizing the documents per topic only when the model was
+# not fitted with TermCountingClassTfidfTransformer (e.g. a reloaded model)
+def get_topic_term_counts(topic_model, documents):
+    counts = getattr(topic_model.ctfidf_model, "topic_term_counts_", None)
+    if counts is not None and counts.shape[0] == len(topic_row_order(topic_model)):
+        return counts
+    documents_df = pd.DataFrame({"Document": documents, "Topic": topic_model.topics_})
+    documents_per_topic = documents_df.groupby("Topic", sort=True)["Document"].agg(" ".join)
+    counts = sp.csr_matrix(topic_model.vectorizer_model.transform(documents_per_topic.tolist()))
+    topic_model.ctfidf_model.topic_term_counts_ = counts
+    return counts
+
+# Function to build the old topic -> new topic mapping of a merge, renumbering topics by size as BERTopic does
+def merge_mapping(topics, topics_to_merge):
+    known_topics = set(topics)
+    mapping = {topic: topic for topic in known_topics}
+    for topic_group in topics_to_merge:
+        missing = [topic for topic in topic_group if topic not in known_topics]
+        if missing:
+            raise ValueError(f"Unknown topics: {missing}")
+        for topic in topic_group:
+            mapping[topic] = topic_group[0]
+    sizes = pd.Series(topics).map(mapping).value_counts()
+    ordered = sorted((topic for topic in sizes.index if topic != -1), key=lambda topic: (-sizes[topic], topic))
+    renumbered = {topic: new_topic for new_topic, topic in enumerate(ordered)}
+    renumbered[-1] = -1
+    return {old_topic: renumbered[target] for old_topic, target in mapping.items()}
+
+# Function to get the n highest-scoring words of a c-TF-IDF row, padded like BERTopic's representations
+def top_words(row, words, top_n):
+    row = sp.csr_matrix(row)
+    order = np.argsort(-row.data, kind="stable")[:top_n]
+    representation = [(words[row.indices[position]], float(row.data[position])) for position in order if row.data[position] > 0]
+    return representation + [("", 0.00001)] * (top_n - len(representation))
+
+# Function to pick the representative documents of a merged topic among those of the topics it merges
+def representative_docs(topic_model, candidates, c_tf_idf_row):
+    from sklearn.metrics.pairwise import cosine_similarity
+    candidates = list(dict.fromkeys(candidates))
+    if len(candidates) <= NR_REPRESENTATIVE_DOCS:
+        return candidates
+    candidate_ctfidf = topic_model.ctfidf_model.transform(topic_model.vectorizer_model.transform(candidates))
+    similarity = cosine_similarity(candidate_ctfidf, c_tf_idf_row).ravel()
+    return [candidates[position] for position in np.argsort(-similarity, kind="stable")[:NR_REPRESENTATIVE_DOCS]]
+
+# Function to update the topic aspects after topics changed: unchanged topics carry their values over
+# (carried maps each new topic number to its old one) and the aspect models of the page, such as
+# KeyBERTInspired, run on the changed topics only (changed_ctfidf maps each of them to its c-TF-IDF row)
+def refresh_aspects(topic_model, documents, topics, changed_ctfidf, representations, carried):
+    changed = sorted(changed_ctfidf)
+    aspect_models = topic_model.representation_model if isinstance(topic_model.representation_model, dict) else {}
+    if changed and any(aspect in aspect_models for aspect in topic_model.topic_aspects_):
+        changed_mask = np.isin(topics, changed)
+        changed_documents = pd.DataFrame({"Document": np.asarray(documents, dtype=object)[changed_mask],
+                                          "ID": np.flatnonzero(changed_mask), "Topic": np.asarray(topics)[changed_mask],
+                                          "Image": None}, index=np.flatnonzero(changed_mask))
+        changed_rows = sp.vstack([changed_ctfidf[topic] for topic in changed], format="csr")
+    for aspect, values in list(topic_model.topic_aspects_.items()):
+        aspect_values = {topic: values[old_topic] for topic, old_topic in carried.items() if old_topic in values}
+        if changed and aspect in aspect_models:
+            aspect_values.update(aspect_models[aspect].extract_topics(topic_model, changed_documents, changed_rows,
+                                                                      {topic: representations[topic] for topic in changed}))
+        elif changed:
+            aspect_values.update({topic: [("", 0)] * 10 for topic in changed})  # Label aspects are regenerated by the labeling stage
+        topic_model.topic_aspects_[aspect] = dict(sorted(aspect_values.items()))
+
+# Function to merge topics in place, recomputing c-TF-IDF rows, representations, aspects, topic embeddings,
+# representative documents and map positions for the merged topics only. Other topics keep their values
+# under their new numbers, and the c-TF-IDF idf weights stay those of the last fit
+def merge_topics_incrementally(topic_model, documents, topics_to_merge):
+    old_topics = np.asarray(topic_model.topics_)
+    old_order = topic_row_order(topic_model)
+    counts = get_topic_term_counts(topic_model, documents)
+    mapping = merge_mapping(old_topics, topics_to_merge)
+    new_order = sorted(set(mapping.values()))
+    old_rows = {topic: row for row, topic in enumerate(old_order)}
+    new_rows = {topic: row for row, topic in enumerate(new_order)}
+    sources = {new_topic: [old_topic for old_topic in old_order if mapping[old_topic] == new_topic] for new_topic in new_order}
+    merged = [new_topic for new_topic in new_order if len(sources[new_topic]) > 1]
+
+    # Aggregation matrix: new topic rows x old topic rows
+    aggregation = sp.csr_matrix(
+        (np.ones(len(old_order)), ([new_rows[mapping[topic]] for topic in old_order], range(len(old_order)))),
+        shape=(len(new_order), len(old_order))
+    )
+    new_counts = sp.csr_matrix(aggregation @ counts)
+    old_sizes = pd.Series(old_topics).value_counts().to_dict()
+
+    # c-TF-IDF: untouched topics keep their rows, merged topics are recomputed from their summed counts
+    merged_ctfidf = {topic: sp.csr_matrix(topic_model.ctfidf_model.transform(new_counts[new_rows[topic]].copy()))
+                     for topic in merged}
+    old_ctfidf = sp.csr_matrix(topic_model.c_tf_idf_)
+    c_tf_idf = sp.vstack([merged_ctfidf[topic] if topic in merged_ctfidf else old_ctfidf[old_rows[sources[topic][0]]]
+                          for topic in new_order], format="csr")
+
+    # Main representation and representative documents
+    words = topic_model.vectorizer_model.get_feature_names_out() if merged else None
+    representations = {}
+    repr_docs = {}
+    old_repr_docs = topic_model.representative_docs_ or {}
+    for topic in new_order:
+        if topic in merged_ctfidf:
+            representations[topic] = top_words(merged_ctfidf[topic], words, topic_model.top_n_words)
+            candidates = [doc for old_topic in sources[topic] for doc in old_repr_docs.get(old_topic, [])]
+            repr_docs[topic] = representative_docs(topic_model, candidates, merged_ctfidf[topic])
+        else:
+            representations[topic] = topic_model.topic_representations_[sources[topic][0]]
+            if sources[topic][0] in old_repr_docs:
+                repr_docs[topic] = old_repr_docs[sources[topic][0]]
+
+    # Topic embeddings: size-weighted mean of the merged topics' embeddings
+    if topic_model.topic_embeddings_ is not None and len(topic_model.topic_embeddings_) == len(old_order):
+        weights = aggregation.toarray() * np.array([max(old_sizes[topic], 1) for topic in old_order])[None, :]
+        weights /= weights.sum(axis=1, keepdims=True)
+        topic_model.topic_embeddings_ = weights @ topic_model.topic_embeddings_
+
+    # Document assignments, sizes and probabilities (one column per topic, outliers excluded)
+    new_topics = pd.Series(old_topics).map(mapping).to_numpy()
+    topic_model.topics_ = new_topics.tolist()
+    topic_model.topic_sizes_ = Counter({topic: sum(old_sizes[old_topic] for old_topic in sources[topic]) for topic in new_order})
+    probabilities = topic_model.probabilities_
+    if probabilities is not None and np.ndim(probabilities) == 2 and probabilities.shape[1] == len(set(old_order) - {-1}):
+        topic_model.probabilities_ = map_probability_columns(probabilities, mapping)
+
+    topic_model.c_tf_idf_ = c_tf_idf
+    topic_model.ctfidf_model.topic_term_counts_ = new_counts
+    topic_model.topic_representations_ = representations
+    topic_model.representative_docs_ = repr_docs
+    topic_model.topic_labels_ = {topic: f"{topic}_" + "_".join(word for word, _ in values[:4]) for topic, values in representations.items()}
+    topic_model.custom_labels_ = None
+
+    # Aspects: renumber, and rerun the aspect models of the page (e.g. KeyBERTInspired) on merged topics only
+    carried = {topic: sources[topic][0] for topic in new_order if topic not in merged_ctfidf}
+    refresh_aspects(topic_model, documents, new_topics, merged_ctfidf, representations, carried)
+
+    # Intertopic map positions: merged topics sit at the size-weighted mean of the topics they merge
+    positions = getattr(topic_model, "topic_positions_", None)
+    if positions is not None:
+        topic_model.topic_positions_ = {
+            topic: tuple(np.average([positions[old_topic] for old_topic in sources[topic]], axis=0,
+                                    weights=[max(old_sizes[old_topic], 1) for old_topic in sources[topic]]))
+            for topic in new_order if topic != -1 and all(old_topic in positions for old_topic in sources[topic])
+        }
+
+    try:
+        topic_model.topic_mapper_.add_mappings(mapping, topic_model=topic_model)
+    except TypeError:  # Older BERTopic versions take the mapping only
+        topic_model.topic_mapper_.add_mappings(mapping)
+    return topic_model.topics_
@@ -2,15 +2,28 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import random
-import openai
-from bertopic import BERTopic
-from bertopic.representation import KeyBERTInspired, OpenAI, TextGeneration
-from sentence_transformers import SentenceTransformer
-from umap import UMAP
-from sklearn.feature_extraction.text import CountVectorizer
+from bertopic.representation import KeyBERTInspired
 import ast  # To safely evaluate string input to list format
 import hashlib  # To create unique identifiers
-from transformers import pipeline
+import os
+import tempfile
+from apps.common.csv_reader import read_csv_columns, read_texts_with_ids, write_csv_with_ids
+from apps.topic_modelling.document_browser import display_document_browser
+from apps.topic_modelling.embedding_store import get_embedding_store
+from apps.topic_modelling.local_labeling import label_topics_locally
+from apps.topic_modelling.openai_labeling import label_topics_with_openai
+from apps.topic_modelling.model_registry import get_model_registry
+from apps.topic_modelling.embedding_backends import EMBEDDING_BACKENDS, backend_options, describe_backend, embedding_store_name, register_embedding_backend
+from apps.topic_modelling.topic_merging import merge_topics_incrementally
+from apps.topic_modelling.topic_outputs import document_info_table, document_map, intertopic_map, topic_info_table
+from apps.topic_modelling.topic_pipeline import (APPROXIMATE_TOP_K, EXACT_PROBABILITY_MAX_DOCS, MAX_MODEL_CACHE_MB, PROBABILITY_MODES,
+                                                 delete_topic_model, list_saved_models, load_topic_model, read_model_metadata,
+                                                 saved_model_exists)
+from apps.topic_modelling.topic_runner import topic_model_settings
+from apps.common.job_panel import display_job_artifacts, follow_job, job_lookup, job_owner_token, rerun_while_running
+from apps.common.jobs import get_job_runner
+from apps.common.trace_panel import display_trace_panel
+from apps.common.tracing import aggregate_spans, span, trace
 
 # Set the page layout option in Streamlit for wide format
 st.set_page_config(page_title='Text2Topics', page_icon='🗂️', layout="wide", initial_sidebar_state="expanded")
@@ -35,9 +48,17 @@ st.sidebar.markdown("[Documentation](https://your-docs-url.com)")
 if "BERTmodel" not in st.session_state:
     st.session_state.BERTmodel = None
     st.session_state.topics = None
-    st.session_state.text_data = None
+    st.session_state.text_data = None  # Documents of the model shown on the page, not of the uploaded CSV
     st.session_state.doc_ids = None  # To track document IDs
-    st.session_state.original_csv_with_ids = None  # Store original CSV with doc_ids
+    st.session_state.original_csv_with_ids = None  # Original CSV, written out with doc_ids on download
+    st.session_state.model_id = None  # ID of the saved model, for reloading it later
+    st.session_state.topic_job_id = None  # Background job of the last topic model run
+    st.session_state.loaded_job_id = None  # Finished job already loaded (or reported) in the session
+    st.session_state.job_trace_rows = []  # Stage timings of the job that fitted the current model
+    st.session_state.output_trace_rows = []  # Stage timings of the last display of the outputs
+
+# Background jobs are shared by every session of the server
+job_runner = get_job_runner()
 
 # Function to create unique identifiers for each document
 def create_unique_id(text):
@@ -48,16 +69,18 @@ st.subheader("Import Data")
 uploaded_file = st.file_uploader("Upload a CSV file", type=["csv"])
 st.warning("**Instructions:** For CSV files, ensure that the text data is in a column named 'text'.")
 
-# Function to extract text from CSV file and add unique identifiers (doc_id)
+# Function to extract text from CSV file and add unique identifiers (doc_id), reading only the
+# 'text' column in chunks
 def extract_text_from_csv(file):
-    df = pd.read_csv(file)
-    if 'text' in df.columns:
-        df = df.dropna(subset=['text'])
-        df['doc_id'] = df['text'].apply(create_unique_id)  # Create unique doc_id for each text
-        return df[['doc_id', 'text']].reset_index(drop=True), df
+    if 'text' in read_csv_columns(file):
+        return read_texts_with_ids(file)
     else:
         st.error("The CSV file must contain a 'text' column.")
-        return None, None
+        return None
+
+# Documents of the uploaded CSV, for a new fit or an update; the documents of the model shown on the page
+# stay in st.session_state.text_data and doc_ids, and are replaced only when another model is shown
+df = extract_text_from_csv(uploaded_file) if uploaded_file is not None else None
 
 st.subheader("Set Model Parameters")
 
@@ -75,6 +98,20 @@ language_option = st.selectbox(
 # Set the language for BERTopic
 language = "english" if language_option == "English" else "multilingual"
 
+# Embedding model selection, with what each choice costs on a CPU-only server
+embedding_backend_id = st.selectbox(
+    "Select the embedding model:",
+    backend_options(language_option),
+    format_func=lambda backend_id: EMBEDDING_BACKENDS[backend_id]["label"]
+)
+new_doc_count = None
+if df is not None:
+    backend_store = get_embedding_store(embedding_store_name(embedding_backend_id))
+    new_doc_count = sum(doc_id not in backend_store for doc_id in df['doc_id'].unique())
+st.caption(describe_backend(embedding_backend_id, new_doc_count))
+if new_doc_count == 0:
+    st.caption("All uploaded documents are already embedded with this model.")
+
 # Select topic generation mode
 topic_option = st.selectbox(
     "Select how you want the number of topics to be handled:",
@@ -93,6 +130,15 @@ if reduce_outliers_option:
     c_tf_idf_threshold = st.slider("Set c-TF-IDF Threshold for Outlier Reduction", 0.0, 1.0, 0.1)
     st.info("**Tip:** You can set a threshold (between 0.0 and 1.0), which determines how strict or lenient the reassignment of outlier documents will be. A lower threshold (closer to 0.0) will reassign more outliers to topics, while a higher threshold (closer to 1.0) will reassign fewer documents.")
 
+# Probability mode: HDBSCAN's exact soft clustering gets slow and memory-hungry on large corpora
+probability_mode = st.selectbox(
+    "Select how document-topic probabilities are calculated:",
+    list(PROBABILITY_MODES),
+    format_func=PROBABILITY_MODES.get,
+    index=1 if df is not None and len(df) > EXACT_PROBABILITY_MAX_DOCS else 0
+)
+st.info(f"**Tip:** Exact probabilities take longer than the rest of the fit past about {EXACT_PROBABILITY_MAX_DOCS:,} documents. The approximate mode keeps each document's {APPROXIMATE_TOP_K} closest topics, and 'Assigned topic only' keeps the probability of the document's own topic.")
+
 # Option for OpenAI API use
 use_openai_option = st.checkbox("Use OpenAI's GPT-4o API for Topic Labels?")
 st.success("**Note:** OpenAI's GPT-4o can be used to generate topic labels based on the documents and keywords provided. You must provide an OpenAI API key to use this feature.")
@@ -116,153 +162,186 @@ with run_col:
 with merge_col:
     merge_topics_btn = st.button("Merge Topics")
 
+# Reload a previously fitted model by ID instead of fitting it again
+with st.expander("Load a saved model"):
+    saved_models = {metadata["model_id"]: metadata for metadata in list_saved_models()}
+    selected_model_id = st.selectbox(
+        "Select a saved model:",
+        [""] + list(saved_models),
+        format_func=lambda model_id: "" if not model_id else f"{model_id} · {saved_models[model_id]['n_docs']:,} documents · "
+                                     f"{saved_models[model_id]['n_topics']} topics · saved {pd.Timestamp(saved_models[model_id]['created'], unit='s'):%Y-%m-%d %H:%M}"
+    )
+    typed_model_id = st.text_input("Or enter a model ID:", "")
+    load_col, delete_col = st.columns([1, 1])
+    with load_col:
+        load_model_btn = st.button("Load Model")
+    with delete_col:
+        delete_model_btn = st.button("Delete Model")
+    st.info(f"**Note:** Saved models keep a copy of their documents. Past {MAX_MODEL_CACHE_MB:,} MB in total, the least recently used ones are deleted.")
+
+# Add a new batch of documents to a saved model without refitting it
+with st.expander("Update a saved model with new documents"):
+    update_model_id = st.selectbox(
+        "Select the saved model to update:",
+        [""] + list(saved_models),
+        format_func=lambda model_id: "" if not model_id else f"{model_id} · {saved_models[model_id]['n_docs']:,} documents · "
+                                     f"{saved_models[model_id]['n_topics']} topics · saved {pd.Timestamp(saved_models[model_id]['created'], unit='s'):%Y-%m-%d %H:%M}"
+    )
+    st.info("**Tip:** Upload the new batch as the CSV file above. Documents whose doc_id is already in the model are skipped, the others are assigned to the existing topics, and only topics that receive documents are refreshed. The updated model is saved under a new ID.")
+    update_model_btn = st.button("Update Saved Model")
+
 # Define function to display outputs (reused after both model fitting and topic merging)
 def display_outputs(BERTmodel, text_data, doc_ids):
-    # Use the built-in method to fetch topic info
-    topic_info_df = BERTmodel.get_topic_info()  # This will include topic numbers, counts, and possibly labels
-    
-    # Remove "Name" column if it exists
-    columns_to_remove = ['Name', 'Representation']
-    topic_info_df = topic_info_df.drop(columns=[col for col in columns_to_remove if col in topic_info_df.columns], errors='ignore')
-    
-    # Show the identified topics and intertopic distance map
-    topic_col, map_col = st.columns([1, 1])
-    with topic_col:
-        st.write("Identified Topics:")
-        st.dataframe(topic_info_df)
-
-    with map_col:
-        st.write("Intertopic Distance Map:")
-        intertopic_map = BERTmodel.visualize_topics()
-        st.plotly_chart(intertopic_map)
-
-    # Show document-topic probabilities with doc_id
-    st.write("Document-Topic Probabilities:")
-    doc_info_df = BERTmodel.get_document_info(text_data)
-
-    # Add the doc_id to document-topic probabilities for easy merging later
-    doc_info_df['doc_id'] = doc_ids['doc_id'].tolist()
-
-    # Remove unnecessary columns
-    columns_to_remove = ['Name', 'Top_n_words', 'Representative Docs', 'Representative_document']
-    doc_info_df = doc_info_df.drop(columns=[col for col in columns_to_remove if col in doc_info_df.columns])
-
-    st.dataframe(doc_info_df)
+    with trace("topic outputs", documents=len(text_data)) as output_trace:
+        # Show the identified topics and intertopic distance map
+        topic_col, map_col = st.columns([1, 1])
+        with topic_col:
+            st.write("Identified Topics:")
+            st.dataframe(topic_info_table(BERTmodel))
+
+        with map_col:
+            st.write("Intertopic Distance Map:")
+            with span("visualization", figure="intertopic map"):
+                st.plotly_chart(intertopic_map(BERTmodel))  # Topic positions are computed once and kept up to date by merges
+
+        # Show the documents on the reduced embeddings of the fit, downsampled per topic to a fixed point budget
+        st.write("Document Map:")
+        with span("visualization", figure="document map"):
+            document_figure = document_map(BERTmodel, text_data)
+        if document_figure is not None:
+            st.plotly_chart(document_figure)
+        else:
+            st.caption("The document map needs the cached UMAP reduction of this model's fit.")
+
+        # Show document-topic probabilities with doc_id, one page at a time; the table is rebuilt only when
+        # the model's assignments or probabilities change
+        st.write("Document-Topic Probabilities:")
+        table_key = (id(BERTmodel), id(BERTmodel.topics_), id(BERTmodel.probabilities_))
+        if st.session_state.get("document_table_key") != table_key:
+            with span("document table"):
+                st.session_state.document_table = document_info_table(BERTmodel, text_data, doc_ids)
+            st.session_state.document_table_key = table_key
+        display_document_browser(st.session_state.document_table)
+    st.session_state.output_trace_rows = aggregate_spans(output_trace.records())
+
+# Function to label topics with OpenAI when selected, otherwise with the local text2text model
+def apply_topic_labels(BERTmodel):
+    if use_openai_option and api_key:
+        with st.spinner("Generating topic labels with OpenAI..."):
+            try:
+                labels, errors = label_topics_with_openai(BERTmodel, api_key)
+            except Exception as e:
+                st.error(f"Failed to generate topic labels with OpenAI: {e}")
+                return
+        if errors:
+            st.warning(f"{len(errors)} of {len(labels)} topics could not be labeled: {next(iter(errors.values()))}")
+    else:
+        with st.spinner("Generating topic labels..."):
+            try:
+                label_topics_locally(BERTmodel)
+            except Exception as e:
+                st.error(f"Failed to generate topic labels with the Text2Text generation model: {e}")
 
 # Function to create download link for DataFrame as CSV
 def create_download_link(df, filename, link_text):
     csv = df.to_csv(index=False)
     st.download_button(label=link_text, data=csv, file_name=filename)
 
+# Function to create download link for the original CSV with doc_ids, written chunk by chunk to a temporary file
+def create_csv_with_ids_download_link(file, filename, link_text):
+    handle, path = tempfile.mkstemp(suffix=".csv")
+    os.close(handle)
+    try:
+        write_csv_with_ids(file, path)
+        with open(path, "rb") as csv_file:
+            st.download_button(label=link_text, data=csv_file, file_name=filename)
+    finally:
+        os.remove(path)
+
+# Function to show another model on the page, with the documents it was fitted or updated on; merges
+# and the outputs use these documents until another model is shown
+def set_current_model(BERTmodel, documents_df, model_id):
+    st.session_state.BERTmodel = BERTmodel  # Store the model in session state
+    st.session_state.topics = BERTmodel.topics_  # Store topics in session state
+    st.session_state.text_data = documents_df['text'].tolist()
+    st.session_state.doc_ids = documents_df[['doc_id']]
+    st.session_state.model_id = model_id
+
 # Run the topic model functionality
 if uploaded_file is not None:
     # Ensure the uploaded file is CSV only
     st.write("CSV file uploaded.")
-    df, original_csv = extract_text_from_csv(uploaded_file)
-    text_data = df['text'].tolist()
-    doc_ids = df[['doc_id']]  # Store doc_id for reference
-    st.session_state.doc_ids = doc_ids  # Store doc_ids in session_state
-    st.session_state.original_csv_with_ids = original_csv  # Store the original CSV with doc_ids
+    st.session_state.original_csv_with_ids = uploaded_file  # The CSV with doc_ids is written on download
 
     # Proceed if text data was successfully extracted
-    if text_data:
-        st.session_state.text_data = text_data  # Store the text data for later use
-
+    if df is not None and not df.empty:
+        # Submit the topic model as a background job; it keeps running through reruns of the page and
+        # closed tabs, and jobs of several users share the server's worker processes
         if run_model_btn:
-            with st.spinner("Running topic model..."):
-                
-                # Generate a random seed if the user didn't provide one
-                if umap_random_state is None:
-                    umap_random_state = random.randint(1, 10000)  # Random seed between 1 and 10000
-                    st.write(f"No seed provided, using random seed: {umap_random_state}")
-                else:
-                    st.write(f"Using user-provided seed: {umap_random_state}")
-                
-                # Initialize SentenceTransformer, UMAP, and CountVectorizer models
-                model = SentenceTransformer("Salesforce/SFR-Embedding-2_R")
-                umap_model = UMAP(n_neighbors=10,
-                                  n_components=5,
-                                  min_dist=0.0,
-                                  metric='cosine',
-                                  random_state=umap_random_state)  # Use either the user-defined or random seed
-                vectorizer_model = CountVectorizer(stop_words='english',
-                                                   min_df=5,
-                                                   ngram_range=(1, 3))
-
-                # Use KeyBERTInspired for keywords representation
-                representation_model = {"Unique Keywords": KeyBERTInspired()}
-
-                # Check if user wants to use OpenAI for topic labels    
-                if use_openai_option and api_key:
-                    try:
-                        # Set up OpenAI API client
-                        client = openai.OpenAI(api_key=api_key)
-                        
-                        label_prompt = """
-                        I have a topic that contains the following documents: 
-                        [DOCUMENTS]
-                        The topic is described by the following keywords: [KEYWORDS]
-
-                        Based on the information above, extract a short topic label in the following format:
-                        topic: <topic label>
-                        """
-                
-                        # Create OpenAI representation model
-                        openai_model = OpenAI(client=client, prompt=label_prompt)
-                        # Add OpenAI to the representation model
-                        representation_model["GPT Topic Label"] = openai_model
-                    except Exception as e:
-                        st.error(f"Failed to initialize OpenAI API: {e}")
-                        representation_model = {"Unique Keywords": KeyBERTInspired()}  # Fallback to KeyBERT only
-                else:
-                    # Fallback to Hugging Face text2text generation (TextGeneration model)
-                    try:
-                        prompt = "I have a topic described by the following keywords: [KEYWORDS]. Based on the previous keywords, tell me in few words what is this topic about?"
-                        generator = pipeline('text2text-generation', model='google/flan-t5-base')
-                        text2text_model = TextGeneration(generator)
-                        representation_model["T2T Topic Label"] = text2text_model
-                    except Exception as e:
-                        st.error(f"Failed to initialize Text2Text generation model: {e}")
-                        representation_model = {"Unique Keywords": KeyBERTInspired()}  # Fallback to KeyBERT only
-                
-                # Initialize BERTopic model with the selected representation models
-                BERTmodel = BERTopic(
-                    representation_model=representation_model,
-                    umap_model=umap_model,
-                    embedding_model=model,
-                    vectorizer_model=vectorizer_model,
-                    top_n_words=10,  # Set top_n_words to avoid issues
-                    nr_topics=nr_topics,  # Use the chosen number of topics
-                    language=language,  # Use selected language option (English or Multilanguage)
-                    calculate_probabilities=True,
-                    verbose=True
-                )
-                
-                # Fit and transform the topic model
-                topics, probs = BERTmodel.fit_transform(text_data)
-                st.session_state.BERTmodel = BERTmodel  # Store the model in session state
-                st.session_state.topics = topics  # Store topics in session state
-                
-                # Apply outlier reduction if the option was selected
-                if reduce_outliers_option:
-                    # First, reduce outliers using the "c-tf-idf" strategy with the chosen threshold
-                    new_topics = BERTmodel.reduce_outliers(text_data, topics, strategy="c-tf-idf", threshold=c_tf_idf_threshold)
-                    # Then, reduce remaining outliers with the "distributions" strategy
-                    new_topics = BERTmodel.reduce_outliers(text_data, new_topics, strategy="distributions")
-                    st.write(f"Outliers reduced using c-TF-IDF threshold {c_tf_idf_threshold} and distributions strategy.")
-                    
-                    # Update topic representations based on the new topics
-                    BERTmodel.update_topics(text_data, topics=new_topics)
-                    st.session_state.topics = new_topics
-                    st.write("Topics and their representations have been updated based on the new outlier-free documents.")
-
-                # Display the outputs (topics table, intertopic map, probabilities)
-                display_outputs(BERTmodel, text_data, st.session_state.doc_ids)
-
-                # Provide download link for original CSV with unique IDs
-                st.write("Download your original CSV with unique document IDs:")
-                create_download_link(st.session_state.original_csv_with_ids, "original_csv_with_ids.csv", "Download CSV with IDs")
-                st.info("**Tip:** Download the CSV file to keep a record of the unique document IDs assigned to each text document. This will help you merge topics with the original documents later for further analysis.")
+            # Generate a random seed if the user didn't provide one
+            if umap_random_state is None:
+                umap_random_state = random.randint(1, 10000)  # Random seed between 1 and 10000
+                st.write(f"No seed provided, using random seed: {umap_random_state}")
+            else:
+                st.write(f"Using user-provided seed: {umap_random_state}")
+
+            # Every setting that shapes the fitted model; a run with the same embeddings and settings
+            # reloads the saved model instead of fitting it again
+            model_settings = topic_model_settings(
+                embedding_backend_id, umap_random_state,
+                probability_mode=probability_mode,
+                nr_topics=nr_topics,
+                language=language,
+                outlier_threshold=c_tf_idf_threshold if reduce_outliers_option else None,
+                topic_labels="openai" if use_openai_option and api_key else "flan-t5-base"
+            )
+            st.session_state.topic_job_id = job_runner.submit(
+                "topics", {"settings": model_settings},
+                inputs=[(uploaded_file.name, uploaded_file.getvalue())],
+                secrets={"api_key": api_key} if use_openai_option and api_key else None,
+                requester=job_owner_token()
+            )
+
+# Reopen the results of an earlier topic model job
+with st.expander("Open an earlier topic model run"):
+    opened_job_id = job_lookup(job_runner, "topics", key="topic_jobs")
+    if opened_job_id:
+        st.session_state.topic_job_id = opened_job_id
+
+# Follow the current topic model job; once it is done, the model it saved is loaded into the session
+outputs_shown = False
+job = None
+if st.session_state.topic_job_id and st.session_state.topic_job_id != st.session_state.loaded_job_id:
+    job = follow_job(job_runner, st.session_state.topic_job_id)
+    if job is not None and job["status"] == "failed":
+        st.error(f"An error occurred while running the topic model: {job['error']}")
+        st.session_state.loaded_job_id = job["id"]  # Reported once
+    elif job is not None and job["status"] == "done" and job["result"]["model_id"] is None:
+        for message in job["result"]["messages"]:
+            st.info(message)
+        st.session_state.loaded_job_id = job["id"]
+    elif job is not None and job["status"] == "done":
+        for message in job["result"]["messages"]:
+            st.write(message)
+        # The embedding model is attached so that the loaded model can merge and update its topics
+        job_backend_id = read_model_metadata(job["result"]["model_id"])["settings"]["embedding_backend"]
+        with get_model_registry().use(register_embedding_backend(job_backend_id)) as model:
+            BERTmodel, documents_df, _ = load_topic_model(job["result"]["model_id"], embedding_model=model,
+                                                          representation_model={"Unique Keywords": KeyBERTInspired()})
+        set_current_model(BERTmodel, documents_df, job["result"]["model_id"])
+        st.session_state.loaded_job_id = job["id"]
+        st.session_state.job_trace_rows = job["result"].get("trace", [])
+        st.write(f"Topic model job `{job['id']}` finished; the model is saved with ID `{st.session_state.model_id}`.")
+
+        # Display the outputs (topics table, intertopic map, probabilities)
+        display_outputs(BERTmodel, st.session_state.text_data, st.session_state.doc_ids)
+        outputs_shown = True
+        display_job_artifacts(job["id"], key="topic_job")
+
+        # Provide download link for original CSV with unique IDs
+        st.write("Download your original CSV with unique document IDs:")
+        create_csv_with_ids_download_link(job["params"]["inputs"][0], "original_csv_with_ids.csv", "Download CSV with IDs")
+        st.info("**Tip:** Download the CSV file to keep a record of the unique document IDs assigned to each text document. This will help you merge topics with the original documents later for further analysis.")
 
 # Manual topic merge functionality
 if merge_topics_btn and st.session_state.BERTmodel is not None and st.session_state.topics is not None:
@@ -271,12 +350,11 @@ if merge_topics_btn and st.session_state.BERTmodel is not None and st.session_st
         
         # Ensure it's a list of lists
         if isinstance(topics_to_merge, list) and all(isinstance(pair, list) for pair in topics_to_merge):
-            merged_topics = st.session_state.BERTmodel.merge_topics(st.session_state.text_data, topics_to_merge)
+            # Only the c-TF-IDF rows, representations and map positions of the merged topics are recomputed
+            merged_topics = merge_topics_incrementally(st.session_state.BERTmodel, st.session_state.text_data, topics_to_merge)
             st.success("Topics have been successfully merged!")
-            
-            # Update topic representations after merging
-            st.session_state.BERTmodel.update_topics(st.session_state.text_data, topics=merged_topics)
             st.session_state.topics = merged_topics
+            apply_topic_labels(st.session_state.BERTmodel)
             
             # Re-display the outputs (topics table, intertopic map, probabilities)
             display_outputs(st.session_state.BERTmodel, st.session_state.text_data, st.session_state.doc_ids)
@@ -284,3 +362,62 @@ if merge_topics_btn and st.session_state.BERTmodel is not None and st.session_st
             st.error("Invalid input. Please provide a list of lists in the format `[[1, 2], [3, 4]]`.")
     except Exception as e:
         st.error(f"An error occurred while merging topics: {e}")
+
+# Reload a saved model with its documents; the embedding model is attached for later topic updates
+if load_model_btn:
+    load_model_id = typed_model_id.strip() or selected_model_id
+    if not load_model_id:
+        st.error("Select or enter the ID of a saved model.")
+    elif not saved_model_exists(load_model_id):
+        st.error(f"No saved model with ID `{load_model_id}`.")
+    else:
+        with st.spinner("Loading saved model..."):
+            registry = get_model_registry()
+            embedding_backend_id = saved_models.get(load_model_id, {}).get("settings", {}).get("embedding_backend", embedding_backend_id)
+            with registry.use(register_embedding_backend(embedding_backend_id)) as model:
+                BERTmodel, documents_df, _ = load_topic_model(load_model_id, embedding_model=model,
+                                                              representation_model={"Unique Keywords": KeyBERTInspired()})
+        # The loaded model's own documents are kept for display and merges, whatever CSV is uploaded
+        set_current_model(BERTmodel, documents_df, load_model_id)
+        st.session_state.job_trace_rows = []
+        st.success(f"Loaded saved model `{load_model_id}`.")
+        display_outputs(BERTmodel, st.session_state.text_data, st.session_state.doc_ids)
+
+# Delete a saved model and its copy of the documents; a model loaded in the session stays usable
+if delete_model_btn:
+    delete_model_id = typed_model_id.strip() or selected_model_id
+    if not delete_model_id:
+        st.error("Select or enter the ID of a saved model.")
+    elif not saved_model_exists(delete_model_id):
+        st.error(f"No saved model with ID `{delete_model_id}`.")
+    else:
+        delete_topic_model(delete_model_id)
+        st.success(f"Deleted saved model `{delete_model_id}`. It leaves the list of saved models on the next interaction with the page.")
+
+# Update a saved model with the uploaded batch in a background job: new documents are assigned to the
+# existing topics, and the updated model is loaded like a fitted one once the job is done
+if update_model_btn:
+    if not update_model_id:
+        st.error("Select the saved model to update.")
+    elif uploaded_file is None or df is None:
+        st.error("Upload a CSV file with the new documents.")
+    else:
+        st.session_state.topic_job_id = job_runner.submit(
+            "topics", {"update_model_id": update_model_id},
+            inputs=[(uploaded_file.name, uploaded_file.getvalue())],
+            secrets={"api_key": api_key} if use_openai_option and api_key else None,
+            requester=job_owner_token()
+        )
+        st.info(f"Updating saved model `{update_model_id}` in job `{st.session_state.topic_job_id}`.")
+
+# Keep showing the current model when the page reruns for other reasons (e.g. browsing documents)
+if (not (outputs_shown or merge_topics_btn or load_model_btn)
+        and st.session_state.BERTmodel is not None and st.session_state.text_data is not None
+        and len(st.session_state.text_data) == len(st.session_state.BERTmodel.topics_)):
+    display_outputs(st.session_state.BERTmodel, st.session_state.text_data, st.session_state.doc_ids)
+
+# Time and memory of each stage of the fitting job and of the last display of the outputs
+display_trace_panel(st.session_state.job_trace_rows + st.session_state.output_trace_rows)
+
+# Poll the job until it finishes
+rerun_while_running(job)
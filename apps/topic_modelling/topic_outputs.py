@@ -0,0 +1,155 @@
+import os
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from apps.topic_modelling.topic_pipeline import get_stage_cache, hash_embeddings, stage_key
+
+# Point budget of the document map, and the documents each topic keeps at least when downsampled
+MAX_DOCUMENT_POINTS = int(os.environ.get("TEXTVIZ_MAX_DOCUMENT_POINTS", "20000"))
+MIN_POINTS_PER_TOPIC = 20
+
+# Columns of the topic and document tables that are not shown
+HIDDEN_TOPIC_COLUMNS = ['Name', 'Representation']
+
+# Function to build the topic table shown on the page
+def topic_info_table(topic_model):
+    topic_info_df = topic_model.get_topic_info()  # This will include topic numbers, counts, and possibly labels
+    return topic_info_df.drop(columns=[col for col in HIDDEN_TOPIC_COLUMNS if col in topic_info_df.columns], errors='ignore')
+
+# Function to build the document table: the topic-level columns are computed once per topic and
+# gathered per document, instead of merging tables over every document
+def document_info_table(topic_model, text_data, doc_ids):
+    topics = np.asarray(topic_model.topics_)
+    topic_info_df = topic_model.get_topic_info().set_index("Topic")
+    topic_ids = topic_info_df.index.to_numpy()
+    order = np.argsort(topic_ids)
+    positions = order[np.searchsorted(topic_ids, topics, sorter=order)]
+    doc_info_df = pd.DataFrame({"Document": text_data, "Topic": topics})
+    for column in topic_info_df.columns:
+        if column not in ("Count", "Name"):
+            doc_info_df[column] = topic_info_df[column].to_numpy()[positions]
+    probabilities = topic_model.probabilities_
+    if sp.issparse(probabilities):  # Approximate probabilities keep the top clusters of each document
+        doc_info_df["Probability"] = probabilities.max(axis=1).toarray().ravel()
+    elif probabilities is not None:
+        doc_info_df["Probability"] = probabilities.max(axis=1) if np.ndim(probabilities) == 2 else probabilities
+    doc_info_df['doc_id'] = doc_ids['doc_id'].tolist()  # The doc_id allows merging with the original documents later
+    return doc_info_df
+
+# Function to place each topic in 2-D, as BERTopic's intertopic distance map does: topic embeddings
+# reduced with cosine UMAP, or scaled c-TF-IDF rows with Hellinger UMAP when there are no embeddings
+def compute_topic_positions(topic_model):
+    order = sorted(set(topic_model.topics_))
+    topics = [topic for topic in order if topic != -1]
+    rows = [order.index(topic) for topic in topics]
+    if len(topics) < 4:  # Too few topics for UMAP; spread them on a circle
+        angles = 2 * np.pi * np.arange(len(topics)) / max(len(topics), 1)
+        return {topic: (float(np.cos(angle)), float(np.sin(angle))) for topic, angle in zip(topics, angles)}
+    from umap import UMAP
+    embeddings = topic_model.topic_embeddings_
+    if embeddings is not None and len(embeddings) == len(order):
+        reduced = UMAP(n_neighbors=2, n_components=2, metric='cosine', random_state=42).fit_transform(np.asarray(embeddings)[rows])
+    else:
+        from sklearn.preprocessing import MinMaxScaler
+        features = MinMaxScaler().fit_transform(topic_model.c_tf_idf_[rows].toarray())
+        reduced = UMAP(n_neighbors=2, n_components=2, metric='hellinger', random_state=42).fit_transform(features)
+    return {topic: (float(x), float(y)) for topic, (x, y) in zip(topics, reduced)}
+
+# Function to get the map positions of every topic: kept on the model and updated by merges (see
+# topic_merging), and cached on disk by the topic embeddings so reloaded models skip the projection
+def get_topic_positions(topic_model):
+    positions = getattr(topic_model, "topic_positions_", None)
+    topics = sorted(set(topic_model.topics_) - {-1})
+    if positions is not None and sorted(positions) == topics:
+        return positions
+    cache = get_stage_cache()
+    embeddings = topic_model.topic_embeddings_ if topic_model.topic_embeddings_ is not None else topic_model.c_tf_idf_.toarray()
+    key = stage_key(hash_embeddings(np.asarray(embeddings, dtype=np.float32)), "topic_map", {"topics": topics})
+    arrays = cache.load_arrays("topic_map", key)
+    if arrays is None:
+        positions = compute_topic_positions(topic_model)
+        cache.save("topic_map", key, {"topics": np.array(topics), "positions": np.array([positions[topic] for topic in topics]).reshape(-1, 2)})
+    else:
+        positions = {int(topic): (float(x), float(y)) for topic, (x, y) in zip(arrays["topics"], arrays["positions"])}
+    topic_model.topic_positions_ = positions
+    return positions
+
+# Function to draw the intertopic distance map from the cached topic positions
+def intertopic_map(topic_model):
+    import plotly.graph_objects as go
+    positions = get_topic_positions(topic_model)
+    topics = sorted(positions)
+    sizes = np.array([topic_model.topic_sizes_.get(topic, 0) for topic in topics], dtype=float)
+    hover_text = [f"Topic {topic}<br>" + " | ".join(word for word, _ in (topic_model.get_topic(topic) or [])[:5] if word)
+                  + f"<br>Size: {int(size)}" for topic, size in zip(topics, sizes)]
+    figure = go.Figure(go.Scattergl(
+        x=[positions[topic][0] for topic in topics],
+        y=[positions[topic][1] for topic in topics],
+        mode="markers",
+        marker=dict(size=np.clip(np.sqrt(sizes / max(sizes.max(initial=0), 1)) * 60, 6, 60),
+                    color="#B0BEC5", line=dict(width=2, color="DarkSlateGrey")),
+        hovertext=hover_text,
+        hoverinfo="text"
+    ))
+    figure.update_layout(template="simple_white", width=650, height=650, showlegend=False,
+                         xaxis=dict(visible=False), yaxis=dict(visible=False))
+    return figure
+
+# Function to pick at most max_points documents, stratified by topic: each topic gets a share of the budget
+# proportional to its size, but at least min_per_topic documents (or all of them), so small topics stay visible
+def stratified_sample(topics, max_points=MAX_DOCUMENT_POINTS, min_per_topic=MIN_POINTS_PER_TOPIC, seed=42):
+    topics = np.asarray(topics)
+    if len(topics) <= max_points:
+        return np.arange(len(topics))
+    rng = np.random.default_rng(seed)
+    labels, counts = np.unique(topics, return_counts=True)
+    quotas = np.minimum(counts, np.maximum(np.floor(counts * max_points / len(topics)).astype(int), min_per_topic))
+    sample = [rng.choice(np.flatnonzero(topics == label), size=quota, replace=False) for label, quota in zip(labels, quotas)]
+    return np.sort(np.concatenate(sample))
+
+# Function to get 2-D coordinates of documents from the reduced embeddings of the model's UMAP stage,
+# projected with PCA; documents added after the fit (online updates) have no reduced embedding and
+# are left out. Returns the document positions and their coordinates, or None without a cached reduction
+def document_coordinates(topic_model, max_points=MAX_DOCUMENT_POINTS):
+    cached = getattr(topic_model, "document_map_", None)
+    if cached is not None and cached[0] == (id(topic_model.topics_), max_points):
+        return cached[1], cached[2]
+    reduced = getattr(topic_model.umap_model, "embedding_", None)
+    umap_key = (getattr(topic_model, "stage_keys_", None) or {}).get("umap")
+    if reduced is None and umap_key:
+        arrays = get_stage_cache().load_arrays("umap", umap_key)
+        reduced = arrays["embedding"] if arrays is not None else None
+    if reduced is None:
+        return None
+    reduced = np.asarray(reduced)[:len(topic_model.topics_)]
+    positions = stratified_sample(np.asarray(topic_model.topics_)[:len(reduced)], max_points)
+    points = reduced[positions] - reduced[positions].mean(axis=0)
+    _, _, components = np.linalg.svd(points, full_matrices=False)  # PCA to 2-D
+    coordinates = points @ components[:2].T
+    topic_model.document_map_ = ((id(topic_model.topics_), max_points), positions, coordinates)
+    return positions, coordinates
+
+# Function to draw the document map: one WebGL trace per topic, at most max_points documents in total
+def document_map(topic_model, text_data, max_points=MAX_DOCUMENT_POINTS):
+    import plotly.graph_objects as go
+    result = document_coordinates(topic_model, max_points)
+    if result is None:
+        return None
+    positions, coordinates = result
+    topics = np.asarray(topic_model.topics_)[positions]
+    figure = go.Figure()
+    for topic in np.unique(topics):
+        in_topic = topics == topic
+        name = topic_model.topic_labels_.get(int(topic), str(topic)) if topic_model.topic_labels_ else str(topic)
+        figure.add_trace(go.Scattergl(
+            x=coordinates[in_topic, 0],
+            y=coordinates[in_topic, 1],
+            mode="markers",
+            name=name,
+            marker=dict(size=4, opacity=0.3 if topic == -1 else 0.7, color="#CFD8DC" if topic == -1 else None),
+            hovertext=[text_data[position][:100] for position in positions[in_topic]],
+            hoverinfo="text"
+        ))
+    figure.update_layout(template="simple_white", width=1200, height=700,
+                         xaxis=dict(visible=False), yaxis=dict(visible=False))
+    return figure
@@ -0,0 +1,404 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import scipy.sparse as sp
+from apps.common.cache_dir import cache_path
+from apps.common.tracing import span
+
+# Size budget of the on-disk cache of UMAP and HDBSCAN results (override with an environment variable)
+MAX_STAGE_CACHE_MB = int(os.environ.get("TEXTVIZ_STAGE_CACHE_MB", "2048"))
+
+# Size budget of the saved topic models, each holding a copy of its documents (override with an environment variable)
+MAX_MODEL_CACHE_MB = int(os.environ.get("TEXTVIZ_MODEL_CACHE_MB", "4096"))
+
+# Parameters of each stage, as used by the Text2Topics page
+UMAP_PARAMS = {"n_neighbors": 10, "n_components": 5, "min_dist": 0.0, "metric": "cosine"}
+HDBSCAN_PARAMS = {"min_cluster_size": 10, "metric": "euclidean", "cluster_selection_method": "eom", "prediction_data": True}
+
+# Probability modes of the HDBSCAN stage, and the clusters kept per document by the approximate mode
+PROBABILITY_MODES = {"exact": "Exact (HDBSCAN soft clustering)", "approximate": "Approximate (top clusters by centroid distance)",
+                     "top1": "Assigned topic only"}
+APPROXIMATE_TOP_K = 5
+EXACT_PROBABILITY_MAX_DOCS = 50000  # Above this, exact probabilities take longer than the rest of the fit
+
+# Function to hash an embedding matrix; identical embeddings always give the same key
+def hash_embeddings(embeddings):
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    digest = hashlib.md5(str(embeddings.shape).encode())
+    digest.update(memoryview(embeddings).cast("B"))
+    return digest.hexdigest()
+
+# Function to build the cache key of a stage from the key of its input and the stage parameters
+def stage_key(input_key, stage, params):
+    payload = json.dumps({"input": input_key, "stage": stage, "params": params}, sort_keys=True, default=str)
+    return hashlib.md5(payload.encode()).hexdigest()
+
+# Size-bounded LRU cache of stage results stored on disk: one directory per entry holding
+# the result arrays and, separately, the fitted estimator (only loaded when new documents are transformed)
+class StageCache:
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or cache_path("topic_stages")
+        self.max_bytes = max_bytes if max_bytes is not None else MAX_STAGE_CACHE_MB * 1024 * 1024
+
+    def path(self, stage, key):
+        return os.path.join(self.directory, stage, key)
+
+    # Return the cached arrays as a dict, or None on a miss; a hit refreshes the entry's LRU position
+    def load_arrays(self, stage, key):
+        path = self.path(stage, key)
+        try:
+            with np.load(os.path.join(path, "arrays.npz")) as arrays:
+                result = {name: arrays[name] for name in arrays.files}
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return result
+
+    # Return the cached fitted estimator, or None when it was not stored
+    def load_model(self, stage, key):
+        import joblib
+        try:
+            return joblib.load(os.path.join(self.path(stage, key), "model.joblib"))
+        except (FileNotFoundError, EOFError, OSError):
+            return None
+
+    # Store a stage result atomically; a concurrent session storing the same key first wins
+    def save(self, stage, key, arrays, model=None):
+        path = self.path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = tempfile.mkdtemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            np.savez(os.path.join(temp_path, "arrays.npz"), **arrays)
+            if model is not None:
+                import joblib
+                joblib.dump(model, os.path.join(temp_path, "model.joblib"))
+            os.replace(temp_path, path)
+        except OSError:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+        self.evict()
+
+    # Delete least recently used entries until the cache fits in its budget
+    def evict(self):
+        entries = []
+        total = 0
+        for stage in os.listdir(self.directory):
+            stage_path = os.path.join(self.directory, stage)
+            for key in os.listdir(stage_path) if os.path.isdir(stage_path) else []:
+                if key.endswith(".tmp"):
+                    continue
+                path = os.path.join(stage_path, key)
+                try:
+                    size = sum(entry.stat().st_size for entry in os.scandir(path))
+                    entries.append((os.stat(path).st_mtime, size, path))
+                except OSError:
+                    continue
+                total += size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+_stage_cache = None
+
+# Function to get the process-wide stage cache
+def get_stage_cache():
+    global _stage_cache
+    if _stage_cache is None:
+        _stage_cache = StageCache()
+    return _stage_cache
+
+# UMAP stage for BERTopic that reuses reduced embeddings cached under the embeddings hash and the
+# UMAP parameters; the fitted UMAP itself is only loaded when new documents need transforming
+class CachedUMAP:
+    def __init__(self, params=None, random_state=None, cache=None):
+        self.params = dict(params or UMAP_PARAMS, random_state=random_state)
+        self.cache = cache or get_stage_cache()
+        self.key = None
+        self.input_key = None
+        self.embedding_ = None
+        self.cache_hit = False
+        self._model = None
+
+    def fit(self, X, y=None):
+        with span("UMAP", documents=len(X)):
+            self.input_key = hash_embeddings(X)
+            self.key = stage_key(self.input_key, "umap", self.params)
+            arrays = self.cache.load_arrays("umap", self.key)
+            self.cache_hit = arrays is not None
+            if self.cache_hit:
+                self.embedding_ = arrays["embedding"]
+            else:
+                from umap import UMAP
+                self._model = UMAP(**self.params).fit(X)
+                self.embedding_ = np.asarray(self._model.embedding_, dtype=np.float32)
+                self.cache.save("umap", self.key, {"embedding": self.embedding_}, self._model)
+        return self
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self.cache.load_model("umap", self.key)
+            if self._model is None:
+                raise RuntimeError("The fitted UMAP model is no longer cached; fit the topic model again.")
+        return self._model
+
+    # The fitted documents map to the cached reduction; other documents go through the fitted UMAP
+    def transform(self, X):
+        if len(X) == len(self.embedding_) and hash_embeddings(X) == self.input_key:
+            return self.embedding_
+        return self.model.transform(X)
+
+# Function to approximate soft cluster membership: a softmax over the negative distances of each document
+# to the cluster centroids in the reduced space, keeping the top_k clusters per document as a sparse matrix.
+# The softmax temperature is the median distance of a document to its nearest centroid
+def approximate_membership(X, labels, top_k=APPROXIMATE_TOP_K, chunk_rows=50000, seed=42):
+    X = np.asarray(X, dtype=np.float32)
+    n_clusters = int(labels.max()) + 1 if len(labels) else 0
+    if n_clusters == 0:
+        return sp.csr_matrix((len(X), 0), dtype=np.float32)
+    clustered = labels >= 0
+    centroids = np.zeros((n_clusters, X.shape[1]), dtype=np.float64)
+    np.add.at(centroids, labels[clustered], X[clustered])
+    centroids /= np.maximum(np.bincount(labels[clustered], minlength=n_clusters), 1)[:, None]
+
+    def distances(rows):
+        squared = (rows ** 2).sum(axis=1)[:, None] - 2 * rows @ centroids.T + (centroids ** 2).sum(axis=1)[None, :]
+        return np.sqrt(np.maximum(squared, 0))
+
+    sample = np.random.default_rng(seed).choice(len(X), size=min(len(X), 10000), replace=False)
+    temperature = max(float(np.median(distances(X[sample]).min(axis=1))), 1e-6)
+    top_k = min(top_k, n_clusters)
+    data, indices = [], []
+    for start in range(0, len(X), chunk_rows):
+        logits = -distances(X[start:start + chunk_rows]) / temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        weights = np.exp(logits)
+        weights /= weights.sum(axis=1, keepdims=True)
+        top = np.argpartition(-weights, top_k - 1, axis=1)[:, :top_k]
+        data.append(np.take_along_axis(weights, top, axis=1).astype(np.float32))
+        indices.append(top)
+    data = np.concatenate(data).ravel()
+    indices = np.concatenate(indices).ravel()
+    indptr = np.arange(0, len(data) + 1, top_k)
+    return sp.csr_matrix((data, indices, indptr), shape=(len(X), n_clusters))
+
+# HDBSCAN stage for BERTopic that reuses cluster labels cached under the hash of the reduced embeddings
+# and the HDBSCAN parameters. Document x topic probabilities depend on probability_mode:
+# "exact" is HDBSCAN's soft membership (cached separately, slow on large corpora), "approximate" is
+# approximate_membership (sparse top-k) and "top1" keeps only the probability of the assigned cluster
+class CachedHDBSCAN:
+    def __init__(self, params=None, probability_mode="exact", top_k=APPROXIMATE_TOP_K, cache=None):
+        self.params = dict(params or HDBSCAN_PARAMS)
+        self.probability_mode = probability_mode
+        self.top_k = top_k
+        self.cache = cache or get_stage_cache()
+        self.key = None
+        self.labels_ = None
+        self.probabilities_ = None
+        self.membership_ = None
+        self.cache_hit = False
+        self._model = None
+
+    def fit(self, X, y=None):
+        with span("clustering", documents=len(X), probabilities=self.probability_mode):
+            self.key = stage_key(hash_embeddings(X), "hdbscan", self.params)
+            arrays = self.cache.load_arrays("hdbscan", self.key)
+            self.cache_hit = arrays is not None
+            if not self.cache_hit:
+                import hdbscan
+                self._model = hdbscan.HDBSCAN(**self.params).fit(X)
+                arrays = {"labels": self._model.labels_, "probabilities": self._model.probabilities_}
+                self.cache.save("hdbscan", self.key, arrays, self._model)
+            self.labels_ = arrays["labels"]
+            self.probabilities_ = arrays["probabilities"]
+            self.membership_ = None
+            if self.probability_mode == "exact":
+                self.membership_ = self.exact_membership()
+            elif self.probability_mode == "approximate":
+                self.membership_ = approximate_membership(X, self.labels_, self.top_k)
+        return self
+
+    # HDBSCAN's full soft membership matrix, cached like the stage itself
+    def exact_membership(self):
+        arrays = self.cache.load_arrays("membership", self.key)
+        if arrays is None:
+            import hdbscan
+            membership = hdbscan.all_points_membership_vectors(self.model)
+            if membership.ndim == 1:  # A single cluster gives one column
+                membership = membership.reshape(-1, 1)
+            arrays = {"membership": membership}
+            self.cache.save("membership", self.key, arrays)
+        return arrays["membership"]
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self.cache.load_model("hdbscan", self.key)
+            if self._model is None:
+                raise RuntimeError("The fitted HDBSCAN model is no longer cached; fit the topic model again.")
+        return self._model
+
+    # Assign new documents to the fitted clusters
+    def predict(self, X):
+        import hdbscan
+        labels, _ = hdbscan.approximate_predict(self.model, X)
+        return labels
+
+# Function to map probability columns (one per topic, outliers excluded) through an old -> new topic
+# mapping; columns of topics mapped to the same topic are summed. Works on dense and sparse matrices
+def map_probability_columns(probabilities, mapping):
+    columns = sorted(topic for topic in mapping if topic != -1)
+    new_columns = {topic: column for column, topic in enumerate(sorted(set(mapping.values()) - {-1}))}
+    kept = [column for column, topic in enumerate(columns) if mapping[topic] != -1]  # Topics mapped to outliers drop out
+    column_map = sp.csr_matrix((np.ones(len(kept)), (kept, [new_columns[mapping[columns[column]]] for column in kept])),
+                               shape=(len(columns), len(new_columns)))
+    if sp.issparse(probabilities):
+        return sp.csr_matrix(probabilities @ column_map)
+    return np.asarray(column_map.T.dot(np.asarray(probabilities).T).T)
+
+# Function to fit a BERTopic model built with CachedUMAP and CachedHDBSCAN; BERTopic only computes
+# membership probabilities for a plain HDBSCAN, so the stage's ones are mapped onto the final topics here
+def fit_staged_topic_model(topic_model, documents, embeddings):
+    # Time BERTopic's topic representation step (c-TF-IDF and the aspect models) as a stage of its own
+    extract_topics = topic_model._extract_topics
+
+    def traced_extract_topics(*args, **kwargs):
+        with span("representation"):
+            return extract_topics(*args, **kwargs)
+
+    topic_model._extract_topics = traced_extract_topics
+    try:
+        topics, _ = topic_model.fit_transform(documents, embeddings=embeddings)
+    finally:
+        del topic_model._extract_topics  # Not saved with the model
+    membership = topic_model.hdbscan_model.membership_
+    if membership is not None:
+        mapping = topic_model.topic_mapper_.get_mappings(original_topics=True)
+        topic_model.probabilities_ = map_probability_columns(membership, mapping)
+    return topics, topic_model.probabilities_
+
+# Function to build the ID of a fitted model from its embeddings and every setting that shapes it
+def pipeline_model_id(embeddings_key, settings):
+    payload = json.dumps({"embeddings": embeddings_key, "settings": settings}, sort_keys=True, default=str)
+    return hashlib.md5(payload.encode()).hexdigest()[:12]
+
+# Function to get the directory of a saved model
+def saved_model_path(model_id):
+    return os.path.join(cache_path("topic_models"), model_id)
+
+def saved_model_exists(model_id):
+    return os.path.exists(os.path.join(saved_model_path(model_id), "meta.json"))
+
+# Function to save a fitted model with BERTopic's safetensors serialization, together with its
+# documents and probabilities so it can be reloaded without the original upload
+def save_topic_model(model_id, topic_model, documents_df, metadata):
+    path = saved_model_path(model_id)
+    temp_path = tempfile.mkdtemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        topic_model.save(os.path.join(temp_path, "bertopic"), serialization="safetensors", save_ctfidf=True,
+                         save_embedding_model=False)
+        documents_df[["doc_id", "text"]].to_csv(os.path.join(temp_path, "documents.csv"), index=False)
+        topic_term_counts = getattr(topic_model.ctfidf_model, "topic_term_counts_", None)
+        if topic_term_counts is not None:  # Lets merges and online updates skip re-vectorizing the corpus
+            sp.save_npz(os.path.join(temp_path, "topic_term_counts.npz"), sp.csr_matrix(topic_term_counts))
+        if sp.issparse(topic_model.probabilities_):
+            sp.save_npz(os.path.join(temp_path, "probabilities.npz"), sp.csr_matrix(topic_model.probabilities_))
+        elif topic_model.probabilities_ is not None:
+            np.save(os.path.join(temp_path, "probabilities.npy"), topic_model.probabilities_)
+        metadata = dict(metadata, model_id=model_id, created=time.time(), n_docs=len(documents_df),
+                        n_topics=len(set(topic_model.topics_)) - (1 if -1 in topic_model.topics_ else 0))
+        with open(os.path.join(temp_path, "meta.json"), "w", encoding="utf-8") as meta_file:
+            json.dump(metadata, meta_file)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(temp_path, path)
+    except Exception:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        raise
+    evict_saved_models(keep=(model_id,))
+    return metadata
+
+# Function to delete a saved model with its documents
+def delete_topic_model(model_id):
+    shutil.rmtree(saved_model_path(model_id), ignore_errors=True)
+
+# Function to delete the least recently saved or loaded models until the saved models fit in their
+# budget; the models in keep are never deleted
+def evict_saved_models(max_bytes=None, keep=()):
+    max_bytes = max_bytes if max_bytes is not None else MAX_MODEL_CACHE_MB * 1024 * 1024
+    directory = cache_path("topic_models")
+    entries = []
+    total = 0
+    for model_id in os.listdir(directory):
+        path = os.path.join(directory, model_id)
+        if model_id.endswith(".tmp") or not os.path.isdir(path):
+            continue
+        try:
+            size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+            entries.append((os.stat(path).st_mtime, size, model_id))
+        except OSError:
+            continue
+        total += size
+    for _, size, model_id in sorted(entries):
+        if total <= max_bytes:
+            break
+        if model_id in keep:
+            continue
+        delete_topic_model(model_id)
+        total -= size
+
+# Function to read the metadata (settings, stage keys, sizes) of a saved model
+def read_model_metadata(model_id):
+    with open(os.path.join(saved_model_path(model_id), "meta.json"), "r", encoding="utf-8") as meta_file:
+        return json.load(meta_file)
+
+# Function to list the saved models, newest first
+def list_saved_models():
+    models = []
+    directory = cache_path("topic_models")
+    for model_id in os.listdir(directory):
+        try:
+            with open(os.path.join(directory, model_id, "meta.json"), "r", encoding="utf-8") as meta_file:
+                models.append(json.load(meta_file))
+        except (OSError, ValueError):
+            continue
+    return sorted(models, key=lambda metadata: metadata.get("created", 0), reverse=True)
+
+# Function to reload a saved model by ID; returns the model, its documents (doc_id, text) and metadata.
+# Safetensors serialization keeps neither the embedding model nor the representation models, so they are
+# attached again here when given
+def load_topic_model(model_id, embedding_model=None, representation_model=None):
+    import pandas as pd
+    from bertopic import BERTopic
+    from bertopic.backend._utils import select_backend
+    path = saved_model_path(model_id)
+    if not saved_model_exists(model_id):
+        raise FileNotFoundError(f"No saved topic model with ID '{model_id}'")
+    metadata = read_model_metadata(model_id)
+    try:
+        os.utime(path)  # Refreshes the model's position in the eviction order
+    except OSError:
+        pass
+    topic_model = BERTopic.load(os.path.join(path, "bertopic"))
+    if embedding_model is not None:
+        topic_model.embedding_model = select_backend(embedding_model)
+    if representation_model is not None:
+        topic_model.representation_model = representation_model
+    if os.path.exists(os.path.join(path, "topic_term_counts.npz")):
+        topic_model.ctfidf_model.topic_term_counts_ = sp.load_npz(os.path.join(path, "topic_term_counts.npz"))
+    if os.path.exists(os.path.join(path, "probabilities.npz")):
+        topic_model.probabilities_ = sp.load_npz(os.path.join(path, "probabilities.npz"))
+    elif os.path.exists(os.path.join(path, "probabilities.npy")):
+        topic_model.probabilities_ = np.load(os.path.join(path, "probabilities.npy"))
+    topic_model.stage_keys_ = metadata.get("stage_keys", {})  # Locates the cached reductions of the fit
+    documents_df = pd.read_csv(os.path.join(path, "documents.csv"), dtype={"doc_id": str, "text": str}, keep_default_na=False)
+    return topic_model, documents_df, metadata
@@ -0,0 +1,184 @@
+import hashlib
+import os
+from apps.common.tracing import span
+from apps.topic_modelling.embedding_backends import embedding_store_name
+from apps.topic_modelling.embedding_pipeline import encode_documents
+from apps.topic_modelling.embedding_store import get_embedding_store
+from apps.topic_modelling.local_labeling import LOCAL_LABEL_MODEL, label_topics_locally
+from apps.topic_modelling.online_updates import deduplicate_batch, update_topic_model
+from apps.topic_modelling.openai_labeling import label_topics_with_openai
+from apps.topic_modelling.topic_merging import TermCountingClassTfidfTransformer
+from apps.topic_modelling.topic_pipeline import (HDBSCAN_PARAMS, UMAP_PARAMS, CachedHDBSCAN, CachedUMAP, fit_staged_topic_model,
+                                                 hash_embeddings, load_topic_model, pipeline_model_id, read_model_metadata,
+                                                 save_topic_model, saved_model_exists)
+
+# Documents encoded between two writes to the embedding store, so an interrupted run keeps its progress
+EMBED_CHUNK_DOCS = int(os.environ.get("TEXTVIZ_EMBED_CHUNK_DOCS", "20000"))
+VECTORIZER_PARAMS = {"stop_words": "english", "min_df": 5, "ngram_range": [1, 3]}
+
+# Function to collect every setting that shapes a fitted model; a run with the same embeddings and
+# settings reloads the saved model instead of fitting it again
+def topic_model_settings(embedding_backend_id, random_state, probability_mode="exact", nr_topics=None, language="english",
+                         outlier_threshold=None, topic_labels=LOCAL_LABEL_MODEL.split("/")[-1]):
+    return {
+        "embedding_backend": embedding_backend_id,
+        "umap": dict(UMAP_PARAMS, random_state=random_state),
+        "hdbscan": HDBSCAN_PARAMS,
+        "probabilities": probability_mode,
+        "vectorizer": VECTORIZER_PARAMS,
+        "nr_topics": nr_topics,
+        "language": language,
+        "outlier_threshold": outlier_threshold,
+        "topic_labels": topic_labels,
+    }
+
+# Function to get the aspect models run on every topic; topic labels are generated after fitting
+def topic_representation_models():
+    from bertopic.representation import KeyBERTInspired
+    return {"Unique Keywords": KeyBERTInspired()}
+
+# Function to get the embeddings of every document from the backend's store, encoding the documents not
+# stored yet chunk by chunk; progress_callback(done, total) counts newly encoded documents
+def embed_documents(embedding_backend_id, model, doc_ids, texts, progress_callback=None, chunk_docs=EMBED_CHUNK_DOCS):
+    doc_ids = list(doc_ids)
+    store = get_embedding_store(embedding_store_name(embedding_backend_id))
+    missing = {}
+    for doc_id, text in zip(doc_ids, texts):
+        if doc_id not in store and doc_id not in missing:
+            missing[doc_id] = text
+    missing_ids = list(missing)
+    with span("embedding", documents=len(doc_ids), encoded=len(missing_ids)):
+        for start in range(0, len(missing_ids), chunk_docs):
+            chunk_ids = missing_ids[start:start + chunk_docs]
+            chunk_progress = None
+            if progress_callback is not None:
+                chunk_progress = lambda done, _, start=start: progress_callback(start + done, len(missing_ids))
+            store.add(chunk_ids, encode_documents(model, [missing[doc_id] for doc_id in chunk_ids], chunk_progress))
+        return store.read(doc_ids)
+
+# Function to build an unfitted BERTopic whose UMAP and HDBSCAN stages are cached by embeddings hash
+# and stage parameters, so changing only later settings (number of topics, outliers, labels) skips both
+def build_topic_model(settings, embedding_model):
+    from bertopic import BERTopic
+    from sklearn.feature_extraction.text import CountVectorizer
+    umap_params = {name: value for name, value in settings["umap"].items() if name != "random_state"}
+    vectorizer_params = dict(settings["vectorizer"], ngram_range=tuple(settings["vectorizer"]["ngram_range"]))
+    return BERTopic(
+        representation_model=topic_representation_models(),
+        umap_model=CachedUMAP(umap_params, random_state=settings["umap"]["random_state"]),
+        hdbscan_model=CachedHDBSCAN(settings["hdbscan"], probability_mode=settings["probabilities"]),
+        embedding_model=embedding_model,
+        vectorizer_model=CountVectorizer(**vectorizer_params),
+        ctfidf_model=TermCountingClassTfidfTransformer(),  # Keeps per-topic term counts for merges
+        top_n_words=10,  # Set top_n_words to avoid issues
+        nr_topics=settings["nr_topics"],
+        language=settings["language"],
+        calculate_probabilities=True,
+        verbose=True
+    )
+
+# Function to label every topic with OpenAI when an API key is given, otherwise with the local text2text
+# model. Returns the topics that could not be labeled, with their errors
+def label_topics(topic_model, api_key=None, base_url=None):
+    if api_key:
+        _, errors = label_topics_with_openai(topic_model, api_key, base_url=base_url)
+        return errors
+    label_topics_locally(topic_model)
+    return {}
+
+# Function to fit a topic model on documents_df (doc_id and text columns) and save it, or reload the model
+# saved earlier for the same embeddings and settings. labeler(topic_model), e.g. label_topics, runs before
+# the model is saved and returns the topics it could not label; such a model is saved under the ID of
+# "<topic_labels>-incomplete" labels, which later runs never ask for, so they label the topics again.
+# log(message) reports progress. Returns the model and its ID
+def fit_topic_model(settings, documents_df, embeddings, embedding_model, labeler=None, log=None):
+    log = log or (lambda message: None)
+    text_data = documents_df['text'].tolist()
+    embeddings_key = hash_embeddings(embeddings)
+    model_id = pipeline_model_id(embeddings_key, settings)
+    if saved_model_exists(model_id):
+        topic_model, _, _ = load_topic_model(model_id, embedding_model=embedding_model,
+                                             representation_model=topic_representation_models())
+        log(f"Reloaded saved model `{model_id}`, fitted earlier with the same data and settings.")
+        return topic_model, model_id
+
+    topic_model = build_topic_model(settings, embedding_model)
+    with span("topic model fit", documents=len(text_data)):
+        topics, _ = fit_staged_topic_model(topic_model, text_data, embeddings)
+    reused_stages = [stage for stage, hit in (("UMAP reduction", topic_model.umap_model.cache_hit),
+                                              ("HDBSCAN clusters", topic_model.hdbscan_model.cache_hit)) if hit]
+    if reused_stages:
+        log(f"Reused cached {' and '.join(reused_stages)}.")
+
+    threshold = settings["outlier_threshold"]
+    if threshold is not None:
+        # First, reduce outliers using the "c-tf-idf" strategy with the chosen threshold, then reduce
+        # remaining outliers with the "distributions" strategy
+        with span("outlier reduction"):
+            new_topics = topic_model.reduce_outliers(text_data, topics, strategy="c-tf-idf", threshold=threshold)
+            new_topics = topic_model.reduce_outliers(text_data, new_topics, strategy="distributions")
+        log(f"Outliers reduced using c-TF-IDF threshold {threshold} and distributions strategy.")
+
+        # Update topic representations based on the new topics
+        with span("representation"):
+            topic_model.update_topics(text_data, topics=new_topics)
+        log("Topics and their representations have been updated based on the new outlier-free documents.")
+
+    if labeler is not None:
+        with span("labeling"):
+            label_errors = labeler(topic_model)
+        if label_errors:
+            settings = dict(settings, topic_labels=f"{settings['topic_labels']}-incomplete")
+            model_id = pipeline_model_id(embeddings_key, settings)
+
+    # Persist the fitted model so it can be reloaded by ID
+    topic_model.stage_keys_ = {"umap": topic_model.umap_model.key, "hdbscan": topic_model.hdbscan_model.key}
+    save_topic_model(model_id, topic_model, documents_df, {"settings": settings, "stage_keys": topic_model.stage_keys_})
+    log(f"Model saved with ID `{model_id}`.")
+    return topic_model, model_id
+
+# Function to add the new documents of batch_df (doc_id and text columns) to a saved model without refitting
+# it (see apps.topic_modelling.online_updates), and save the result under an ID derived from the parent
+# model and the batch. labeler, log and progress_callback work as in fit_topic_model and embed_documents.
+# Returns the updated model, its documents and its ID, or None for each when every document of the batch
+# is already in the model
+def update_saved_model(model_id, batch_df, embedding_model, labeler=None, log=None, progress_callback=None):
+    log = log or (lambda message: None)
+    metadata = read_model_metadata(model_id)
+    settings = metadata["settings"]
+    stage_keys = metadata.get("stage_keys", {})
+    topic_model, documents_df, _ = load_topic_model(model_id, embedding_model=embedding_model,
+                                                    representation_model=topic_representation_models())
+    new_df = deduplicate_batch(documents_df, batch_df)
+    if new_df.empty:
+        log("All documents in the uploaded CSV are already in the saved model.")
+        return None, None, None
+    embeddings = embed_documents(settings["embedding_backend"], embedding_model, new_df['doc_id'].tolist(), new_df['text'].tolist(),
+                                 progress_callback)
+    with span("topic update", documents=len(new_df)):
+        documents_df, changed_topics = update_topic_model(topic_model, documents_df, new_df, embeddings, stage_keys,
+                                                          settings.get("outlier_threshold"))
+    log(f"Added {len(new_df):,} new documents ({len(batch_df) - len(new_df):,} already in the model or repeated); "
+        f"{len(changed_topics)} topics refreshed.")
+
+    if labeler is not None:
+        with span("labeling"):
+            label_errors = labeler(topic_model)
+        if label_errors:
+            settings = dict(settings, topic_labels=f"{settings['topic_labels']}-incomplete")
+
+    batch_key = hashlib.md5("\n".join(new_df['doc_id']).encode()).hexdigest()
+    updated_model_id = pipeline_model_id(f"{model_id}+{batch_key}", settings)
+    save_topic_model(updated_model_id, topic_model, documents_df, {"settings": settings, "stage_keys": stage_keys, "parent": model_id})
+    log(f"The updated model is saved with ID `{updated_model_id}`.")
+    return topic_model, documents_df, updated_model_id
+
+# Function to write the topic table and the document-topic table of a fitted model; returns the file names
+def write_topic_outputs(topic_model, documents_df, output_dir):
+    from apps.topic_modelling.document_browser import write_document_table_csv
+    from apps.topic_modelling.topic_outputs import document_info_table, topic_info_table
+    with span("writing tables"):
+        topic_info_table(topic_model).to_csv(os.path.join(output_dir, "topic_info.csv"), index=False)
+        doc_info_df = document_info_table(topic_model, documents_df['text'].tolist(), documents_df[['doc_id']])
+        write_document_table_csv(doc_info_df, os.path.join(output_dir, "document_topics.csv"))
+    return ["topic_info.csv", "document_topics.csv"]
@@ -11,54 +11,49 @@ from sklearn.feature_extraction.text import CountVectorizer
 import ast  # To safely evaluate string input to list format
 import hashlib  # To create unique identifiers
 from transformers import pipeline
+from apps.common.csv_reader import read_csv_columns, read_texts_with_ids
+from apps.common.tracing import span
+from apps.topic_modelling.document_browser import display_document_browser
+from apps.topic_modelling.topic_outputs import document_info_table, document_map, intertopic_map, topic_info_table
 
 # Function to create unique identifiers for each document
 def create_unique_id(text):
     return hashlib.md5(text.encode()).hexdigest()
 
-# Function to extract text from CSV file and add unique identifiers (doc_id)
+# Function to extract text from CSV file and add unique identifiers (doc_id), reading only the
+# 'text' column in chunks
 def extract_topic_text_from_csv(file):
-    df = pd.read_csv(file)
-    if 'text' in df.columns:
-        df = df.dropna(subset=['text'])
-        df['doc_id'] = df['text'].apply(create_unique_id)  # Create unique doc_id for each text
-        return df[['doc_id', 'text']].reset_index(drop=True), df
+    if 'text' in read_csv_columns(file):
+        return read_texts_with_ids(file)
     else:
         st.error("The CSV file must contain a 'text' column.")
-        return None, None
+        return None
 
 # Define function to display outputs (reused after both model fitting and topic merging)
 def display_outputs(BERTmodel, text_data, doc_ids):
-    # Use the built-in method to fetch topic info
-    topic_info_df = BERTmodel.get_topic_info()  # This will include topic numbers, counts, and possibly labels
-    
-    # Remove "Name" column if it exists
-    columns_to_remove = ['Name', 'Representation']
-    topic_info_df = topic_info_df.drop(columns=[col for col in columns_to_remove if col in topic_info_df.columns], errors='ignore')
-    
     # Show the identified topics and intertopic distance map
     topic_col, map_col = st.columns([1, 1])
     with topic_col:
         st.write("Identified Topics:")
-        st.dataframe(topic_info_df)
+        st.dataframe(topic_info_table(BERTmodel))
 
     with map_col:
         st.write("Intertopic Distance Map:")
-        intertopic_map = BERTmodel.visualize_topics()
-        st.plotly_chart(intertopic_map)
+        with span("visualization", figure="intertopic map"):
+            st.plotly_chart(intertopic_map(BERTmodel))  # Topic positions are computed once and kept up to date by merges
+
+    # Show the documents on the reduced embeddings of the fit, downsampled per topic to a fixed point budget
+    st.write("Document Map:")
+    with span("visualization", figure="document map"):
+        document_figure = document_map(BERTmodel, text_data)
+    if document_figure is not None:
+        st.plotly_chart(document_figure)
+    else:
+        st.caption("The document map needs the cached UMAP reduction of this model's fit.")
 
-    # Show document-topic probabilities with doc_id
+    # Show document-topic probabilities with doc_id, one page at a time
     st.write("Document-Topic Probabilities:")
-    doc_info_df = BERTmodel.get_document_info(text_data)
-
-    # Add the doc_id to document-topic probabilities for easy merging later
-    doc_info_df['doc_id'] = doc_ids['doc_id'].tolist()
-
-    # Remove unnecessary columns
-    columns_to_remove = ['Name', 'Top_n_words', 'Representative Docs', 'Representative_document']
-    doc_info_df = doc_info_df.drop(columns=[col for col in columns_to_remove if col in doc_info_df.columns])
-
-    st.dataframe(doc_info_df)
+    display_document_browser(document_info_table(BERTmodel, text_data, doc_ids))
 
 # Function to create download link for DataFrame as CSV
 def create_download_link(df, filename, link_text):
@@ -0,0 +1,150 @@
+import argparse
+import copy
+import os
+import sys
+
+# Check of apps.topic_modelling.topic_merging against BERTopic's own merge_topics, on a small seeded
+# corpus. merge_topics_incrementally re-implements the merge on BERTopic's fitted attributes, so run this
+# after upgrading BERTopic:
+#
+#   python benchmarks/check_topic_merging.py
+#
+# Both merges start from copies of the same fitted model. Assignments, sizes, topic embeddings and the
+# shape of the probabilities must match exactly (up to the numbering of equally sized topics, which
+# BERTopic leaves unordered). Representations only need to share most of their words: the incremental
+# merge keeps the idf weights of the fit, while BERTopic refits them on the merged topics
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED = 1234
+N_DOCS = 600
+N_CLUSTERS = 8
+TOPICS_TO_MERGE = [[1, 2], [3, 4, 5]]
+MIN_WORD_OVERLAP = 0.6  # Share of the top words each topic's representation must have in common
+
+# Function to fit the fixture: hashed bag-of-words embeddings clustered by k-means, with no reduction,
+# so the fit is fast and deterministic. Probabilities are seeded random rows, as KMeans has none
+def fit_fixture():
+    import numpy as np
+    from bertopic import BERTopic
+    from bertopic.dimensionality import BaseDimensionalityReduction
+    from bertopic.representation import KeyBERTInspired
+    from sklearn.cluster import KMeans
+    from sklearn.feature_extraction.text import CountVectorizer
+    from apps.topic_modelling.topic_merging import TermCountingClassTfidfTransformer
+    from run_benchmarks import stub_embedder, synthetic_documents
+
+    documents = synthetic_documents(N_DOCS, seed=SEED, n_topics=6)
+    embedder = stub_embedder()
+    embeddings = embedder.embed(documents)
+    topic_model = BERTopic(
+        embedding_model=embedder,
+        umap_model=BaseDimensionalityReduction(),
+        hdbscan_model=KMeans(n_clusters=N_CLUSTERS, random_state=SEED, n_init=10),
+        vectorizer_model=CountVectorizer(),  # min_df=1, so refitting it on merged topics keeps the vocabulary
+        ctfidf_model=TermCountingClassTfidfTransformer(),
+        representation_model={"Unique Keywords": KeyBERTInspired()},
+        top_n_words=10,
+    )
+    topic_model.fit(documents, embeddings=embeddings)
+    n_topics = len(set(topic_model.topics_) - {-1})
+    topic_model.probabilities_ = np.random.default_rng(SEED).dirichlet(np.ones(n_topics), size=len(documents))
+    return topic_model, documents
+
+# Function to pair each topic of the incremental merge with BERTopic's topic holding the same documents;
+# returns None when the two merges assign documents differently
+def topic_correspondence(ours, theirs):
+    pairs = {}
+    for our_topic, their_topic in zip(ours, theirs):
+        if pairs.setdefault(our_topic, their_topic) != their_topic:
+            return None
+    return pairs if len(set(pairs.values())) == len(pairs) else None
+
+def word_overlap(ours, theirs):
+    our_words = {word for word, _ in ours if word}
+    their_words = {word for word, _ in theirs if word}
+    return len(our_words & their_words) / max(len(our_words | their_words), 1)
+
+# Function to compare the two merged models; returns the failed checks and informational notes
+def compare(incremental, reference, documents, probabilities):
+    import numpy as np
+    failures = []
+    notes = []
+    pairs = topic_correspondence(incremental.topics_, reference.topics_)
+    if pairs is None:
+        return ["Documents are assigned to different topics"], notes
+
+    sizes = [incremental.topic_sizes_[topic] for topic in sorted(set(incremental.topics_) - {-1})]
+    if sizes != sorted(sizes, reverse=True):
+        failures.append(f"Topics are not numbered by size: {sizes}")
+    for topic, their_topic in pairs.items():
+        if incremental.topic_sizes_[topic] != reference.topic_sizes_[their_topic]:
+            failures.append(f"Topic {topic} has {incremental.topic_sizes_[topic]} documents, BERTopic's {their_topic} has "
+                            f"{reference.topic_sizes_[their_topic]}")
+
+    if set(incremental.topic_representations_) != set(pairs):
+        failures.append("Representations are not keyed by the merged topics")
+    for topic, their_topic in sorted(pairs.items()):
+        overlap = word_overlap(incremental.topic_representations_.get(topic, []), reference.topic_representations_[their_topic])
+        notes.append(f"topic {topic}: {overlap:.0%} of top words shared")
+        if overlap < MIN_WORD_OVERLAP:
+            failures.append(f"Topic {topic} shares {overlap:.0%} of its top words with BERTopic's topic {their_topic}")
+
+    for aspect, values in reference.topic_aspects_.items():
+        our_values = incremental.topic_aspects_.get(aspect, {})
+        if set(our_values) != set(pairs):
+            failures.append(f"Aspect '{aspect}' is not keyed by the merged topics")
+            continue
+        for topic, their_topic in sorted(pairs.items()):
+            notes.append(f"topic {topic} aspect '{aspect}': {word_overlap(our_values[topic], values[their_topic]):.0%} shared")
+
+    for topic, docs in (incremental.representative_docs_ or {}).items():
+        members = {documents[position] for position, assigned in enumerate(incremental.topics_) if assigned == topic}
+        if not set(docs) <= members:
+            failures.append(f"Representative documents of topic {topic} are not in the topic")
+
+    outliers = 1 if -1 in incremental.topics_ else 0
+    our_rows = np.asarray(incremental.topic_embeddings_)
+    their_rows = np.asarray(reference.topic_embeddings_)
+    if our_rows.shape != their_rows.shape:
+        failures.append(f"Topic embeddings have shape {our_rows.shape}, BERTopic's {their_rows.shape}")
+    elif not all(np.allclose(our_rows[topic + outliers], their_rows[their_topic + outliers], atol=1e-5)
+                 for topic, their_topic in pairs.items()):
+        failures.append("Topic embeddings differ from BERTopic's size-weighted means")
+
+    our_probabilities = np.asarray(incremental.probabilities_)
+    if our_probabilities.shape != np.shape(reference.probabilities_):
+        failures.append(f"Probabilities have shape {our_probabilities.shape}, BERTopic's {np.shape(reference.probabilities_)}")
+    if not np.allclose(our_probabilities.sum(axis=1), probabilities.sum(axis=1)):
+        failures.append("Merging lost probability mass")
+
+    # The mapper takes the topics of the fit to the current ones, e.g. to map new documents' predictions
+    our_mappings = incremental.topic_mapper_.get_mappings()
+    their_mappings = reference.topic_mapper_.get_mappings()
+    if any(pairs.get(topic, topic) != their_mappings.get(original) for original, topic in our_mappings.items()):
+        failures.append("The topic mapper does not map the fitted topics like BERTopic's")
+    return failures, notes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the incremental topic merge with BERTopic.merge_topics.")
+    parser.add_argument("--verbose", action="store_true", help="Print the word overlap of every topic")
+    args = parser.parse_args(argv)
+    sys.path.insert(0, REPO_ROOT)
+    from apps.topic_modelling.topic_merging import merge_topics_incrementally
+
+    topic_model, documents = fit_fixture()
+    probabilities = topic_model.probabilities_.copy()
+    incremental, reference = copy.deepcopy(topic_model), copy.deepcopy(topic_model)
+    merge_topics_incrementally(incremental, documents, TOPICS_TO_MERGE)
+    reference.merge_topics(documents, TOPICS_TO_MERGE)
+
+    failures, notes = compare(incremental, reference, documents, probabilities)
+    if args.verbose:
+        for note in notes:
+            print(note)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print(f"{len(failures)} checks failed." if failures else "The incremental merge matches BERTopic.merge_topics.")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Benchmarks of the hot stages of the keyword and topic pipelines, on the bundled files and on seeded
+# synthetic corpora. Every stage runs in a fresh process with an empty cache directory, so the numbers
+# are cold-cache and the peak memory is the stage's own:
+#
+#   python benchmarks/run_benchmarks.py                      # quick sizes
+#   python benchmarks/run_benchmarks.py --full               # up to 1M rows
+#   python benchmarks/run_benchmarks.py --stages csv_ingest keyword_counting --repeat 3
+#
+# Results are written as JSON (throughput, wall and CPU time, peak RSS) to compare runs over time.
+# Nothing is downloaded: the topic model fit uses a hashing stub instead of a sentence-transformer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+BUNDLED_PDFS = ("CASE OF POPOV v. FRANCE.pdf", "CASE OF TARAKHEL v. SWITZERLAND.pdf")
+RESPONSES_CSV = "responses.csv"
+SEED = 1234
+
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "pe", "da", "gu", "ho", "ji", "ze", "bra", "cor", "fen",
+             "gal", "mon", "pra", "ste", "tur", "ver", "qui", "lan", "dor", "ser", "xin", "pol", "rem")
+FOREIGN_WORDS = ("été", "garçon", "niño", "mañana", "città", "perché", "coração", "não", "数据", "分析", "البيانات", "تحليل")
+PUNCTUATION = (".", ",", ";", "!", "?", " -", " (1)", " 2024")
+
+# Function to build a seeded vocabulary of pseudo-words
+def synthetic_vocabulary(size=20000, seed=SEED):
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words) + list(FOREIGN_WORDS)
+
+# Function to generate a seeded corpus with topic structure: each document draws most of its words from
+# the vocabulary slice of one of n_topics topics and the rest from a Zipf-like background distribution
+def synthetic_documents(n_docs, seed=SEED, n_topics=20, words_per_doc=(8, 40)):
+    rng = random.Random(seed)
+    vocabulary = synthetic_vocabulary(seed=seed)
+    weights = [1.0 / rank for rank in range(1, len(vocabulary) + 1)]
+    background = rng.choices(vocabulary, weights=weights, k=200000)
+    slice_size = len(vocabulary) // n_topics
+    topic_words = [vocabulary[topic * slice_size:(topic + 1) * slice_size][:300] for topic in range(n_topics)]
+    documents = []
+    for _ in range(n_docs):
+        own_words = topic_words[rng.randrange(n_topics)]
+        words = [rng.choice(own_words) if rng.random() < 0.7 else background[rng.randrange(len(background))]
+                 for _ in range(rng.randint(*words_per_doc))]
+        words[0] = words[0].capitalize()
+        documents.append(" ".join(words) + rng.choice(PUNCTUATION))
+    return documents
+
+# Function to get the current resident set size of this process in MB
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return peak_rss_mb(resource.RUSAGE_SELF)
+
+# Function to get the peak resident set size of this process (or of its largest child) in MB
+def peak_rss_mb(who):
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, KB elsewhere
+
+# Each stage takes its size and a scratch directory, prepares its inputs (not timed) and returns
+# (run, items, unit), where run() is the timed part and items / second is its throughput
+
+def stage_pdf_extraction(copies, workdir, workers):
+    from PyPDF2 import PdfReader
+    from apps.keywords.pdf_extraction import extract_text_from_pdfs
+    files = [os.path.join(REPO_ROOT, name) for name in BUNDLED_PDFS] * copies
+    pages = sum(len(PdfReader(path).pages) for path in files)
+    return lambda: extract_text_from_pdfs(files, max_workers=workers), pages, "pages"
+
+def stage_clean_text(language):
+    def stage(n_docs, workdir, workers):
+        from apps.keywords.text_cleaning import clean_text
+        text = "\n".join(synthetic_documents(n_docs))
+        return lambda: clean_text(text, selected_language=language), len(text.encode()) / 2 ** 20, "MB"
+    return stage
+
+def stage_keyword_counting(size, workdir, workers):
+    from apps.keywords.keyword_counting import analyze_custom_keywords
+    documents = synthetic_documents(size["documents"])
+    files = 10  # The documents are split over a few large files, as uploads usually are
+    text_data = [(f"file_{index}.csv", " ".join(documents[index::files])) for index in range(files)]
+    rng = random.Random(SEED)
+    vocabulary = synthetic_vocabulary()
+    keywords = [rng.choice(vocabulary) for _ in range(size["keywords"])]
+    for position in range(0, len(keywords), 5):  # One keyword in five is a regular expression
+        keywords[position] = f"{keywords[position]}(s|ing|ed)?"
+    megabytes = sum(len(text.encode()) for _, text in text_data) / 2 ** 20
+    return lambda: analyze_custom_keywords(text_data, keywords), megabytes, "MB"
+
+def stage_wordcloud(n_words, workdir, workers):
+    from apps.keywords.wordcloud_rendering import build_and_draw_wordcloud, FULL_SIZE
+    rng = random.Random(SEED)
+    frequencies = {word: float(rng.randint(1, 1000)) for word in synthetic_vocabulary()[:n_words]}
+    return lambda: build_and_draw_wordcloud(frequencies, None, FULL_SIZE), 1, "clouds"
+
+def stage_zip_export(n_files, workdir, workers):
+    import pandas as pd
+    from apps.keywords.wordcloud_rendering import build_and_draw_wordcloud, PREVIEW_SIZE
+    from apps.keywords.zip_export import csv_payload, write_zip_archive
+    rng = random.Random(SEED)
+    features = synthetic_vocabulary()[:500]
+    result_df = pd.DataFrame({"Features": features, **{f"file_{index}.pdf": [rng.randint(0, 50) for _ in features]
+                                                       for index in range(n_files)}})
+    _, png = build_and_draw_wordcloud({word: 1.0 + rank for rank, word in enumerate(features[:100])}, None, PREVIEW_SIZE)
+
+    # Same entries as the keyword page's archive, with one pre-rendered word cloud per file
+    def artifacts():
+        yield "analysis_results.csv", csv_payload(result_df)
+        for column in result_df.columns[1:]:
+            yield f"tables/{column}.csv", csv_payload(result_df[["Features", column]])
+            yield f"wordclouds/{column}_wordcloud.png", png
+
+    def run():
+        os.remove(write_zip_archive(artifacts(), directory=workdir))
+    return run, 1 + 2 * n_files, "entries"
+
+def stage_csv_ingest(n_rows, workdir, workers):
+    import pandas as pd
+    from apps.common.csv_reader import read_texts_with_ids
+    responses = pd.read_csv(os.path.join(REPO_ROOT, RESPONSES_CSV), dtype={"text": str})["text"].dropna().tolist()
+    path = os.path.join(workdir, "responses_scaled.csv")
+    # Scaled-up responses.csv: the bundled answers repeated, numbered so every row gets its own doc_id
+    pd.DataFrame({"text": [f"{responses[row % len(responses)]} ({row // len(responses)})" for row in range(n_rows)]}).to_csv(path, index=False)
+    return lambda: read_texts_with_ids(path), n_rows, "rows"
+
+# Offline stand-in for a sentence-transformer: L2-normalized hashed bag of words
+def stub_embedder(dimension=256):
+    from bertopic.backend import BaseEmbedder
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    class HashingEmbedder(BaseEmbedder):
+        def __init__(self):
+            super().__init__()
+            self.vectorizer = HashingVectorizer(n_features=dimension, norm="l2")
+
+        def embed(self, documents, verbose=False):
+            return self.vectorizer.transform(documents).toarray().astype("float32")
+
+    return HashingEmbedder()
+
+def stage_bertopic_fit(n_docs, workdir, workers):
+    from apps.topic_modelling.topic_pipeline import fit_staged_topic_model
+    from apps.topic_modelling.topic_runner import build_topic_model, topic_model_settings
+    documents = synthetic_documents(n_docs)
+    embedder = stub_embedder()
+    embeddings = embedder.embed(documents)
+    settings = topic_model_settings("hashing-stub", SEED, probability_mode="approximate", topic_labels=None)
+    topic_model = build_topic_model(settings, embedder)
+    return lambda: fit_staged_topic_model(topic_model, documents, embeddings), n_docs, "documents"
+
+# Stages with their quick sizes and the sizes added by --full
+STAGES = {
+    "pdf_extraction": (stage_pdf_extraction, [1, 4], [16]),
+    **{f"clean_text[{language}]": (stage_clean_text(language), [10_000, 100_000], [1_000_000])
+       for language in ("English", "French", "Spanish", "Italian", "Portuguese", "Chinese", "Arabic")},
+    "keyword_counting": (stage_keyword_counting, [{"documents": 10_000, "keywords": 50}, {"documents": 100_000, "keywords": 500}],
+                         [{"documents": 1_000_000, "keywords": 5_000}]),
+    "wordcloud": (stage_wordcloud, [100, 1000], [10_000]),
+    "zip_export": (stage_zip_export, [10, 100], [1000]),
+    "csv_ingest": (stage_csv_ingest, [10_000, 100_000], [1_000_000]),
+    "bertopic_fit": (stage_bertopic_fit, [2_000], [20_000, 100_000]),
+}
+
+# Function to run one stage at one size in this process and return its measurements
+def measure(stage_name, size, workdir, workers):
+    stage, _, _ = STAGES[stage_name]
+    run, items, unit = stage(size, workdir, workers)
+    rss_before = current_rss_mb()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    run()
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    return {
+        "stage": stage_name,
+        "size": size,
+        "items": items,
+        "unit": unit,
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,  # This process only; worker processes are not included
+        "throughput": items / wall if wall > 0 else None,
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF),
+        "worker_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+# Function to run one stage at one size in a fresh interpreter with its own empty cache directory
+def run_isolated(stage_name, size, workers):
+    with tempfile.TemporaryDirectory(prefix="textviz_bench_") as workdir:
+        env = dict(os.environ, TEXTVIZ_CACHE_DIR=os.path.join(workdir, "cache"), PYTHONHASHSEED=str(SEED))
+        command = [sys.executable, os.path.abspath(__file__), "--child", stage_name, json.dumps(size), "--workdir", workdir]
+        if workers:
+            command += ["--workers", str(workers)]
+        completed = subprocess.run(command, env=env, cwd=REPO_ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"stage": stage_name, "size": size, "error": completed.stderr.strip().splitlines()[-1:] or ["failed"]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+# Function to describe the machine and code the results were measured on
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"git_commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+            "processor": platform.processor(), "cpu_count": os.cpu_count(), "seed": SEED}
+
+# Function to keep the runs of a stage and size, summarized by the median (and best) wall time
+def summarize(runs):
+    measured = [run for run in runs if "error" not in run]
+    if not measured:
+        return runs[0]
+    walls = [run["wall_seconds"] for run in measured]
+    summary = dict(measured[0], wall_seconds=statistics.median(walls), best_wall_seconds=min(walls), repeats=len(measured),
+                   peak_rss_mb=max(run["peak_rss_mb"] for run in measured),
+                   worker_peak_rss_mb=max(run["worker_peak_rss_mb"] for run in measured))
+    summary["throughput"] = summary["items"] / summary["wall_seconds"] if summary["wall_seconds"] > 0 else None
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the hot stages of the TextViz Studio pipelines.")
+    parser.add_argument("--stages", nargs="+", help="Stages to run (prefixes match, e.g. clean_text); all by default")
+    parser.add_argument("--full", action="store_true", help="Add the large sizes, up to 1M rows")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs of each stage and size; the median is reported")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for the stages that use a pool")
+    parser.add_argument("--output", default=None, help="JSON file for the results; benchmarks/results/<time>.json by default")
+    parser.add_argument("--child", nargs=2, metavar=("STAGE", "SIZE"), help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        sys.path.insert(0, REPO_ROOT)
+        print(json.dumps(measure(args.child[0], json.loads(args.child[1]), args.workdir, args.workers)))
+        return
+
+    selected = [name for name in STAGES if not args.stages or any(name.startswith(prefix) for prefix in args.stages)]
+    results = []
+    for stage_name in selected:
+        _, sizes, full_sizes = STAGES[stage_name]
+        for size in sizes + (full_sizes if args.full else []):
+            result = summarize([run_isolated(stage_name, size, args.workers) for _ in range(args.repeat)])
+            results.append(result)
+            if "error" in result:
+                print(f"{stage_name:28} {json.dumps(size):42} failed: {result['error'][0]}", flush=True)
+            else:
+                print(f"{stage_name:28} {json.dumps(size):42} {result['wall_seconds']:9.3f} s "
+                      f"{result['throughput']:12,.1f} {result['unit']}/s {result['peak_rss_mb']:9.1f} MB peak", flush=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "environment": environment(), "results": results}, output_file, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+from apps.common import csv_reader
+
+CSV_TEXT = 'text,score\nfirst document,1\nNone,2\nNA,3\n,4\n"null",5\nn/a text,6\nnan,7\nlast document,8\n'
+
+def read_with(monkeypatch, tmp_path, use_pyarrow):
+    if not use_pyarrow:
+        monkeypatch.setattr(csv_reader, "pa_csv", None)
+    path = tmp_path / "documents.csv"
+    path.write_text(CSV_TEXT, encoding="utf-8")
+    texts = csv_reader.read_texts_with_ids(str(path))
+    chunks = list(csv_reader.iter_csv_text_chunks(str(path)))
+    written = csv_reader.write_csv_with_ids(str(path), str(tmp_path / f"with_ids_{use_pyarrow}.csv"))
+    with open(written, encoding="utf-8") as written_file:
+        return texts[["doc_id", "text"]].values.tolist(), chunks, written_file.read()
+
+# The pyarrow reader and the pandas fallback keep the same documents, with the same doc_ids
+def test_pyarrow_and_pandas_readers_agree(monkeypatch, tmp_path):
+    with_pyarrow = read_with(monkeypatch, tmp_path, True)
+    with_pandas = read_with(monkeypatch, tmp_path, False)
+    assert with_pyarrow == with_pandas
+    assert [text for _, text in with_pandas[0]] == ["first document", "n/a text", "last document"]
@@ -0,0 +1,31 @@
+import random
+import re
+import pytest
+
+pytest.importorskip("pandas")
+from apps.keywords.keyword_counting import KeywordCounter
+
+# Patterns that can match the empty string also match once at the very end of the text
+EMPTY_MATCHING = [r"\w*", "x?", "b*"]
+
+@pytest.mark.parametrize("pattern", EMPTY_MATCHING)
+def test_empty_match_at_end_is_counted(pattern):
+    text = "ab x ba xx"
+    counter = KeywordCounter([pattern])
+    assert counter.count(text) == [len(re.findall(pattern, text))]
+    chunks = [text[start:start + 3] for start in range(0, len(text), 3)]
+    assert counter.count_document(chunks, overlap_chars=100) == [len(re.findall(pattern, text))]
+
+# Counts must match re.findall on the whole text, however the document is split into chunks
+def test_counts_match_findall():
+    rng = random.Random(1)
+    patterns = [r"\w*", "x?", "a", "ab", "a+b", r"\bab", "(?=a)", "b*", "ba|ab", "a.b"]
+    for _ in range(500):
+        text = "".join(rng.choice("ab x") for _ in range(rng.randint(0, 60)))
+        keywords = rng.sample(patterns, rng.randint(1, 4))
+        expected = [len(re.findall(keyword, text)) for keyword in keywords]
+        chunk_chars = rng.randint(1, 10)
+        chunks = [text[start:start + chunk_chars] for start in range(0, len(text), chunk_chars)]
+        counter = KeywordCounter(keywords)
+        assert counter.count(text) == expected
+        assert counter.count_document(chunks, overlap_chars=100) == expected
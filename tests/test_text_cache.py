@@ -0,0 +1,51 @@
+import os
+import pytest
+from apps.keywords import text_cache
+from apps.keywords.text_cache import PINS_DIRECTORY, TextCache
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_pinned_entries_survive_eviction(tmp_path):
+    cache = TextCache(str(tmp_path), max_bytes=1000)
+    documents = {}
+    with cache.pinned() as pins:
+        for number in range(5):
+            key = f"{number:02d}" * 16
+            documents[key] = " ".join(f"word{number}" for _ in range(100))
+            cache.put(key, documents[key], "clean", pins=pins)
+        for key, text in documents.items():
+            assert "".join(pins.document(key, "clean")) == text
+        pins_directory = pins.directory
+    assert not os.path.exists(pins_directory)
+    assert len(os.listdir(os.path.join(str(tmp_path), PINS_DIRECTORY))) == 0
+
+def test_streamed_entry_larger_than_cache(tmp_path):
+    cache = TextCache(str(tmp_path), max_bytes=100)
+    with cache.pinned() as pins:
+        with cache.writer("ab" * 16, "clean", pins) as writer:
+            for _ in range(50):
+                writer.write("some cleaned text")
+        assert not cache.contains("ab" * 16, "clean")  # Evicted, as it is over the budget on its own
+        assert "".join(pins.document("ab" * 16, "clean")) == " ".join(["some cleaned text"] * 50)
+
+def test_missing_entry_is_not_pinned(tmp_path):
+    cache = TextCache(str(tmp_path))
+    with cache.pinned() as pins:
+        assert pins.document("cd" * 16, "clean") is None
+
+# A batch whose raw and cleaned text is larger than the cache must still be readable while it is counted
+def test_corpus_larger_than_cache(tmp_path, monkeypatch):
+    keyword_pipeline = pytest.importorskip("apps.keywords.keyword_pipeline")
+    corpus = [os.path.join(REPO_ROOT, "responses.csv")]
+    results = []
+    for directory, max_bytes in (("large", 2 ** 30), ("small", 150_000), ("small", 150_000)):
+        cache = TextCache(str(tmp_path / directory), max_bytes=max_bytes)
+        monkeypatch.setattr(text_cache, "_text_cache", cache)
+        with cache.pinned() as pins:
+            documents = keyword_pipeline.load_cleaned_documents(corpus, "English", pins)
+            cleaned = "".join(text_cache.iter_document_chunks(documents[0][1]))
+            result_df = keyword_pipeline.run_keyword_analysis(documents, "English", keywords=["the", "and"])
+        results.append((cleaned, result_df.iloc[:, 1].tolist()))
+    assert len(results[0][0]) + os.path.getsize(corpus[0]) > 150_000
+    assert results[1] == results[0]
+    assert results[2] == results[0]